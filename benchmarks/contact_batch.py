@@ -0,0 +1,66 @@
+"""Micro-benchmark: montagem das linhas da sincronização e da pré-visualização com DataFrame.iterrows()
+versus o ContactBatch (listas de colunas).
+
+Uso: python -m benchmarks.contact_batch [--rows 100000] [--repeat 3]
+"""
+import argparse
+import timeit
+from typing import Any, Callable, List
+
+import pandas as pd
+
+from src.contacts import ContactBatch
+
+
+def _contacts_frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({'First name': [f"Contato {i}" for i in range(rows)],
+                         'Recipient': [f"contato{i}@exemplo.com" for i in range(rows)]}, dtype=object)
+
+
+def _payload_iterrows(df: pd.DataFrame) -> List[List[Any]]:
+    return [[row['First name'], '', row['Recipient']] for _, row in df.iterrows()]
+
+
+def _payload_batch(df: pd.DataFrame) -> List[List[Any]]:
+    return ContactBatch.from_frame(df).rows()
+
+
+def _preview_iterrows(df: pd.DataFrame) -> List[Any]:
+    return [(index, f"{index + 1}. {row['First name']}", row['Recipient']) for index, row in df.iterrows()]
+
+
+def _preview_batch(batch: ContactBatch) -> List[Any]:
+    # Todas as linhas, para comparar com o iterrows; a VirtualPreview lê apenas a janela visível
+    return [(row_id, f"{row_id + 1}. {name}", email)
+            for row_id, name, email in zip(batch.row_ids, batch.names, batch.emails)]
+
+
+def _best(function: Callable[[], Any], repeat: int) -> float:
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = _contacts_frame(args.rows)
+    batch = ContactBatch.from_frame(df)
+    assert _payload_iterrows(df) == _payload_batch(df)
+    assert _preview_iterrows(df) == _preview_batch(batch)
+
+    results = [
+        ("linhas da sincronização", _best(lambda: _payload_iterrows(df), args.repeat),
+         _best(lambda: _payload_batch(df), args.repeat)),
+        ("pré-visualização", _best(lambda: _preview_iterrows(df), args.repeat),
+         _best(lambda: _preview_batch(batch), args.repeat)),
+    ]
+    print(f"{args.rows} contatos (melhor de {args.repeat} execuções)")
+    for name, before, after in results:
+        print(f"  {name:<24} iterrows/DataFrame {before * 1000:9.1f} ms | ContactBatch {after * 1000:8.1f} ms "
+              f"| {before / after if after else float('inf'):7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Micro-benchmark: memória e consulta do HashedMembership versus um set de str para listas grandes de destinatários.
+
+Uso: python -m benchmarks.membership [--keys 2000000]
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Any, Callable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.membership import HashedMembership
+
+
+def _measure(build: Callable[[], Any]) -> Tuple[Any, int, float]:
+    """Constrói a estrutura e retorna (estrutura, bytes alocados que ela mantém, segundos)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    structure = build()
+    elapsed = time.perf_counter() - started
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return structure, retained, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    # As chaves são geradas dentro da medição, como acontece ao ler a coluna Recipient do destino
+    def keys() -> Any:
+        return (f"contato{i}@dominio{i % 1000}.com.br" for i in range(args.keys))
+
+    as_set, set_bytes, set_seconds = _measure(lambda: set(keys()))
+    hashed, hashed_bytes, hashed_seconds = _measure(lambda: HashedMembership(keys()))
+    queries = np.asarray([f"contato{i}@dominio{i % 1000}.com.br" for i in range(0, 2 * args.keys, 2)], dtype=object)
+
+    started = time.perf_counter()
+    expected = pd.Index(list(as_set), dtype=object).get_indexer(queries) >= 0
+    set_lookup = time.perf_counter() - started
+    started = time.perf_counter()
+    found = hashed.contains_many(queries)
+    hashed_lookup = time.perf_counter() - started
+    assert (found == expected).all()
+
+    print(f"{args.keys} chaves, {len(queries)} consultas ({int(found.sum())} presentes)")
+    print(f"  set de str          {set_bytes / 2 ** 20:8.1f} MB | criação {set_seconds:5.2f}s | "
+          f"consulta (pd.Index) {set_lookup:5.2f}s")
+    print(f"  HashedMembership    {hashed_bytes / 2 ** 20:8.1f} MB | criação {hashed_seconds:5.2f}s | "
+          f"consulta {hashed_lookup:5.2f}s")
+    print(f"  memória {set_bytes / hashed_bytes:.1f}x menor")
+
+
+if __name__ == "__main__":
+    main()
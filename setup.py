@@ -4,6 +4,7 @@ from cx_Freeze import setup, Executable
 
 # --- CAMINHOS E CONFIGURAÇÕES ---
 main_script = os.path.join("src", "main.py")
+cli_script = os.path.join("src", "cli.py")
 
 # O ícone está dentro de src/assets.
 icon_path = os.path.join("src", "assets", "rbc_logo.ico")
@@ -34,5 +35,9 @@ setup(
     version="1.0",
     description="Sincronizador de Contatos com Google Sheets",
     options={"build_exe": build_exe_options},
-    executables=[Executable(main_script, base=base, icon=icon_path)]
+    executables=[
+        Executable(main_script, base=base, icon=icon_path),
+        # Versão de linha de comando, sem janela, para execuções agendadas
+        Executable(cli_script, base=None, icon=icon_path, target_name="SincronizadorRBC-cli")
+    ]
 )
\ No newline at end of file
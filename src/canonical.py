@@ -0,0 +1,150 @@
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from src.membership import HashedMembership
+
+DEFAULT_OPTIONS: Dict[str, Any] = {
+    "strip": True,
+    "lowercase": True,
+    "unicode_form": "NFKC",
+    "strip_plus_tags": False,
+    # Provedores que ignoram pontos na parte local, por exemplo ["gmail.com", "googlemail.com"]
+    "dot_insensitive_domains": [],
+}
+
+
+def _resolve(options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {**DEFAULT_OPTIONS, **(options or {})}
+
+
+def canonicalize_emails(emails: pd.Series, options: Optional[Dict[str, Any]] = None) -> pd.Series:
+    """Converte uma coluna de e-mails na chave canônica usada para comparar contatos.
+
+    Todas as etapas são operações vetorizadas do pandas. Valores vazios viram ``<NA>``.
+    """
+    opts = _resolve(options)
+    keys = emails.astype("string")
+    if opts["unicode_form"]:
+        keys = keys.str.normalize(opts["unicode_form"])
+    if opts["strip"]:
+        keys = keys.str.strip()
+    if opts["lowercase"]:
+        keys = keys.str.lower()
+
+    dot_domains = [d.lower() for d in opts["dot_insensitive_domains"]]
+    if opts["strip_plus_tags"] or dot_domains:
+        parts = keys.str.rpartition("@")
+        local, domain = parts[0], parts[2]
+        if opts["strip_plus_tags"]:
+            local = local.str.replace(r"\+.*$", "", regex=True)
+        if dot_domains:
+            local = local.mask(domain.str.lower().isin(dot_domains), local.str.replace(".", "", regex=False))
+        keys = keys.mask(parts[1] == "@", local + "@" + domain)
+
+    return keys.mask(keys == "")
+
+
+def canonicalize_email(email: Any, options: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Versão para um único e-mail de ``canonicalize_emails`` (mesmas etapas); vazio vira ``None``."""
+    if email is None or (isinstance(email, float) and np.isnan(email)) or email is pd.NA:
+        return None
+    opts = _resolve(options)
+    key = str(email)
+    if opts["unicode_form"]:
+        key = unicodedata.normalize(opts["unicode_form"], key)
+    if opts["strip"]:
+        key = key.strip()
+    if opts["lowercase"]:
+        key = key.lower()
+
+    dot_domains = [d.lower() for d in opts["dot_insensitive_domains"]]
+    local, at, domain = key.rpartition("@")
+    if at and (opts["strip_plus_tags"] or dot_domains):
+        if opts["strip_plus_tags"]:
+            local = re.sub(r"\+.*$", "", local)
+        if domain.lower() in dot_domains:
+            local = local.replace(".", "")
+        key = local + "@" + domain
+
+    return key or None
+
+
+def canonical_key_set(emails: Iterable[Any], options: Optional[Dict[str, Any]] = None) -> HashedMembership:
+    """Retorna o conjunto compacto de chaves canônicas de uma lista de e-mails (por exemplo, a coluna Recipient)."""
+    keys = canonicalize_emails(pd.Series(list(emails), dtype=object), options)
+    return HashedMembership(keys.dropna().to_numpy(dtype=object))
+
+
+class RecipientDeduper:
+    """Remove, em uma única passada, contatos repetidos no arquivo e contatos que já estão na planilha.
+
+    Pode ser alimentado bloco a bloco; as chaves já vistas em blocos anteriores são lembradas.
+    """
+
+    def __init__(self, existing_keys: HashedMembership, options: Optional[Dict[str, Any]] = None) -> None:
+        self.options = _resolve(options)
+        self.existing_keys = existing_keys
+        self._seen: Set[str] = set()
+        self.empty_rows = 0
+        self.duplicates_in_file = 0
+        self.already_in_sheet = 0
+
+    def filter(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Retorna apenas os contatos novos do bloco, com o e-mail sem espaços nas bordas."""
+        keys = canonicalize_emails(chunk['Recipient'], self.options)
+        valid = keys.notna() & chunk['First name'].notna()
+        self.empty_rows += int((~valid).sum())
+        chunk, keys = chunk[valid], keys[valid]
+
+        in_sheet = self.existing_keys.contains_many(keys.to_numpy(dtype=object))
+        seen_before = np.fromiter(map(self._seen.__contains__, keys), dtype=bool, count=len(keys))
+        repeated = keys.duplicated().to_numpy() | seen_before
+        keep = ~(in_sheet | repeated)
+        self.already_in_sheet += int(in_sheet.sum())
+        self.duplicates_in_file += int((repeated & ~in_sheet).sum())
+
+        self._seen.update(keys[keep])
+        novos = chunk[keep].copy()
+        novos['Recipient'] = novos['Recipient'].astype(str).str.strip()
+        return novos
+
+
+class RecipientKeys:
+    """Chaves dos destinatários já presentes no destino e dos contatos pendentes, para conferir edições.
+
+    Ao editar um contato da pré-visualização, apenas a chave do novo e-mail é calculada e procurada nos
+    dois conjuntos (tempo constante), sem refazer a análise.
+    """
+
+    def __init__(self, existing_keys: HashedMembership, pending_emails: Iterable[Any],
+                 options: Optional[Dict[str, Any]] = None) -> None:
+        self.options = _resolve(options)
+        self.existing = existing_keys
+        keys = canonicalize_emails(pd.Series(list(pending_emails), dtype=object), self.options)
+        self.keys: List[Optional[str]] = [key if isinstance(key, str) else None for key in keys]
+        self.positions: Dict[str, int] = {key: pos for pos, key in enumerate(self.keys) if key is not None}
+
+    def conflict(self, position: int, email: Any) -> Optional[str]:
+        """Motivo pelo qual o contato em ``position`` não pode passar a ter ``email``, ou None se puder."""
+        key = canonicalize_email(email, self.options)
+        if key is None:
+            return "o e-mail está vazio"
+        if key in self.existing:
+            return "o e-mail já está na planilha de destino"
+        other = self.positions.get(key)
+        if other is not None and other != position:
+            return f"o e-mail repete o contato Nº {other + 1}"
+        return None
+
+    def replace(self, position: int, email: Any) -> None:
+        old = self.keys[position]
+        if old is not None and self.positions.get(old) == position:
+            del self.positions[old]
+        key = canonicalize_email(email, self.options)
+        self.keys[position] = key
+        if key is not None:
+            self.positions[key] = position
@@ -0,0 +1,89 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from src import metrics
+from src.storage import DestinationStore
+
+
+class ChunkedAppender:
+    """Envia linhas ao destino em lotes, montando o próximo lote enquanto o anterior está em trânsito.
+
+    O tamanho do lote é ajustado a partir da latência observada de cada requisição (alvo de
+    ``target_seconds``) e do tamanho médio de cada linha (limite de ``max_payload_bytes``).
+    """
+
+    def __init__(self, store: DestinationStore, initial_size: int = 500, min_size: int = 50,
+                 max_size: int = 10000, target_seconds: float = 2.0, max_payload_bytes: int = 2_000_000) -> None:
+        self.store = store
+        self.chunk_size = initial_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_seconds = target_seconds
+        self.max_payload_bytes = max_payload_bytes
+        self.rows_written = 0
+        self.chunks_written = 0
+
+    def _send(self, chunk: List[List[Any]]) -> Tuple[float, str]:
+        started = time.perf_counter()
+        with metrics.span("enviar lote"):
+            updated_range = self.store.append_rows(chunk)
+        return time.perf_counter() - started, updated_range
+
+    def _adjust_size(self, chunk: List[List[Any]], elapsed: float) -> None:
+        bytes_per_row = max(1, len(json.dumps(chunk, ensure_ascii=False)) // len(chunk))
+        factor = min(2.0, max(0.5, self.target_seconds / elapsed)) if elapsed > 0 else 2.0
+        new_size = int(len(chunk) * factor)
+        new_size = min(new_size, self.max_payload_bytes // bytes_per_row, self.max_size)
+        self.chunk_size = max(self.min_size, new_size)
+
+    def _next_chunk(self, rows: Iterator[List[Any]]) -> List[List[Any]]:
+        with metrics.span("montar lote"):
+            return list(islice(rows, self.chunk_size))
+
+    def _fit_chunk(self, chunk: List[List[Any]],
+                   rows: Iterator[List[Any]]) -> Tuple[List[List[Any]], Iterator[List[Any]]]:
+        """Ajusta ao tamanho atual um lote montado antes do último ajuste.
+
+        O excesso volta para o início das linhas restantes e a falta é completada com elas.
+        """
+        if len(chunk) > self.chunk_size:
+            return chunk[:self.chunk_size], chain(chunk[self.chunk_size:], rows)
+        if len(chunk) < self.chunk_size:
+            with metrics.span("montar lote"):
+                chunk = chunk + list(islice(rows, self.chunk_size - len(chunk)))
+        return chunk, rows
+
+    def write(self, rows: Iterable[List[Any]],
+              on_chunk: Optional[Callable[[int, int, float], None]] = None,
+              on_send: Optional[Callable[[int, int], None]] = None,
+              on_confirm: Optional[Callable[[int, int, str], None]] = None) -> int:
+        """Escreve todas as linhas e retorna quantas foram adicionadas.
+
+        ``on_chunk(linhas_no_lote, total_escrito, segundos)`` é chamado após cada lote confirmado.
+        ``on_send(posição, linhas)`` e ``on_confirm(posição, linhas, intervalo)`` delimitam cada envio, com a
+        posição da primeira linha do lote na sequência recebida e o intervalo escrito retornado pelo destino.
+        """
+        rows = iter(rows)
+        send = metrics.propagate(self._send)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="append") as executor:
+            chunk = self._next_chunk(rows)
+            while chunk:
+                position = self.rows_written
+                if on_send:
+                    on_send(position, len(chunk))
+                in_flight = executor.submit(send, chunk)
+                next_chunk = self._next_chunk(rows)
+                elapsed, updated_range = in_flight.result()
+                self.rows_written += len(chunk)
+                self.chunks_written += 1
+                if on_confirm:
+                    on_confirm(position, len(chunk), updated_range)
+                if on_chunk:
+                    on_chunk(len(chunk), self.rows_written, elapsed)
+                # O próximo lote foi montado durante o envio; o novo tamanho já vale para ele
+                self._adjust_size(chunk, elapsed)
+                chunk, rows = self._fit_chunk(next_chunk, rows)
+        return self.rows_written
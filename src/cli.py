@@ -0,0 +1,189 @@
+"""Modo de linha de comando: executa as operações sem interface gráfica, para rodadas agendadas ou em servidores.
+
+Exemplos:
+    python -m src.cli analyze --source contatos.xlsx
+    python -m src.cli sync --dry-run --format text
+    python -m src.cli clear --yes
+    python -m src.cli update-names --yes
+    python -m src.cli sync --all-saved
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import threading
+from queue import Queue, Empty
+from typing import Any, Callable, Dict, List, Optional
+
+from src import config, logic, quota
+
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_PERMISSION = 3
+
+
+class _Runner:
+    """Executa uma função ``*_thread`` da lógica e traduz as mensagens da fila para a saída do terminal."""
+
+    def __init__(self, output_format: str) -> None:
+        self.output_format = output_format
+        self.failed = False
+        self.permission_denied = False
+        self.new_contacts = None
+        self.destinations = None
+
+    def run(self, target: Callable[[Queue], None]) -> None:
+        """Roda ``target(fila)`` numa thread e processa as mensagens até ela terminar."""
+        queue: Queue = Queue()
+        worker = threading.Thread(target=target, args=(queue,), daemon=True)
+        worker.start()
+        while worker.is_alive() or not queue.empty():
+            try:
+                msg_type, data = queue.get(timeout=0.1)
+            except Empty:
+                continue
+            self._handle(msg_type, data)
+
+    def _handle(self, msg_type: str, data: Any) -> None:
+        if msg_type == "log":
+            message, level = data
+            if level == "ERROR":
+                self.failed = True
+            self.emit({"event": "log", "level": level, "message": message})
+        elif msg_type == "dialog":
+            kind, title, message = data
+            if kind in ("error", "warning"):
+                self.failed = True
+            if self.output_format == "json":
+                self.emit({"event": "dialog", "kind": kind, "title": title, "message": message})
+        elif msg_type == "permission_error":
+            self.failed = self.permission_denied = True
+            self.emit({"event": "permission_error", "service_account_email": data})
+        elif msg_type == "update_analysis":
+            contacts, result_text = data[0], data[1]
+            if contacts is not None:
+                self.new_contacts = contacts
+                self.emit({"event": "analysis", "summary": result_text, "new_contacts": len(contacts),
+                           "flagged_contacts": len(contacts.flagged) if contacts.flagged is not None else 0})
+        elif msg_type == "update_multi_analysis":
+            destinations, contacts, result_text = data[0], data[1], data[2]
+            self.new_contacts, self.destinations = contacts, destinations
+            self.emit({"event": "analysis", "summary": result_text, "new_contacts": len(contacts),
+                       "flagged_contacts": len(contacts.flagged) if contacts.flagged is not None else 0,
+                       "destinations": [{"url": url, "title": title, "new_contacts": len(positions)}
+                                        for url, title, positions in destinations]})
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        if self.output_format == "json":
+            print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+        elif record["event"] == "log":
+            print(f"[{record['level']}] {record['message']}", flush=True)
+        elif record["event"] == "analysis":
+            print(record["summary"], flush=True)
+        elif record["event"] == "permission_error":
+            print(f"Permissão negada. Compartilhe a planilha com: {record['service_account_email']}", flush=True)
+
+    def exit_code(self) -> int:
+        if self.permission_denied:
+            return EXIT_PERMISSION
+        return EXIT_FAILURE if self.failed else EXIT_OK
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="sincronizador", description="Sincronizador de contatos sem interface.")
+    parser.add_argument("command", choices=["validate", "analyze", "sync", "clear", "update-names"],
+                        help="Operação a executar.")
+    parser.add_argument("--config", default=config.CONFIG_FILE, help="Caminho do config.json.")
+    parser.add_argument("--json-key", help="Arquivo de chave JSON da Conta de Serviço (padrão: config.json).")
+    parser.add_argument("--url", help="URL da planilha MailMerge (padrão: config.json).")
+    parser.add_argument("--urls", nargs="+", metavar="URL",
+                        help="Analisa/sincroniza várias planilhas de destino em paralelo.")
+    parser.add_argument("--all-saved", action="store_true",
+                        help="Usa como destinos todos os links salvos em config.json.")
+    parser.add_argument("--source", help="Arquivo de contatos .xlsx/.csv (padrão: config.json).")
+    parser.add_argument("--start", type=int, help="Primeiro contato novo a sincronizar (a partir de 1).")
+    parser.add_argument("--end", type=int, help="Último contato novo a sincronizar.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Simula a sincronização (ou a correção de nomes) sem escrever na planilha.")
+    parser.add_argument("--yes", action="store_true",
+                        help="Confirma a limpeza da planilha no comando 'clear' e a correção dos nomes no comando "
+                             "'update-names'.")
+    parser.add_argument("--export", help="Salva os contatos novos encontrados na análise em um CSV.")
+    parser.add_argument("--export-flagged", help="Salva em um CSV os contatos separados pela triagem de e-mails, "
+                                                 "com o motivo.")
+    parser.add_argument("--format", choices=["json", "text"], default="json",
+                        help="Formato da saída: uma linha JSON por evento (padrão) ou texto.")
+    return parser
+
+
+def _export(runner: _Runner, args: argparse.Namespace) -> None:
+    if runner.new_contacts is None:
+        return
+    if args.export:
+        runner.new_contacts.to_csv(args.export)
+    if args.export_flagged and runner.new_contacts.flagged is not None:
+        runner.new_contacts.flagged.to_csv(args.export_flagged)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _build_parser().parse_args(argv)
+    try:
+        config_data = config.load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"event": "error", "message": f"Não foi possível ler {args.config}: {e}"}), file=sys.stderr)
+        return EXIT_USAGE
+    user_cfg, app_cfg = config_data["user_settings"], config_data["app_settings"]
+    quota.configure(app_cfg.get("quota"))
+    json_path = args.json_key or user_cfg.get("json_path", "")
+    mailmerge_url = args.url or user_cfg.get("mailmerge_url", "")
+    mailmerge_urls = args.urls or (user_cfg.get("saved_mailmerge_urls", []) if args.all_saved else [])
+    source_file = args.source or user_cfg.get("source_file", "")
+    name_cols, email_cols = app_cfg.get("possible_name_cols", []), app_cfg.get("possible_email_cols", [])
+
+    runner = _Runner(args.format)
+    if args.command == "validate":
+        if not source_file:
+            runner.emit({"event": "log", "level": "ERROR", "message": "Informe o arquivo de contatos (--source)."})
+            return EXIT_USAGE
+        runner.run(lambda q: logic.validate_source_file_headers_thread(source_file, name_cols, email_cols, q))
+    elif args.command == "clear":
+        runner.run(lambda q: logic.check_and_clear_sheet_thread(json_path, mailmerge_url, q,
+                                                                lambda title, message: args.yes))
+    elif args.command == "update-names":
+        runner.run(lambda q: logic.update_names_thread(
+            json_path, mailmerge_url, source_file, name_cols, email_cols, args.dry_run, q,
+            lambda title, message: args.yes, app_cfg.get("email_canonicalization"), app_cfg.get("source_cache")))
+    elif mailmerge_urls:
+        runner.run(lambda q: logic.analyze_multi_thread(
+            json_path, mailmerge_urls, source_file, name_cols, email_cols, q,
+            app_cfg.get("email_canonicalization"), app_cfg.get("recipient_index"), app_cfg.get("source_cache"),
+            app_cfg.get("email_screening")))
+        _export(runner, args)
+        # O intervalo --start/--end não se aplica: cada destino recebe os contatos que faltam nele. Um destino
+        # inacessível já marcou a falha no código de saída, mas não impede a sincronização dos que responderam;
+        # ``destinations`` só chega se ao menos um deles foi consultado
+        if args.command == "sync" and runner.destinations and not runner.new_contacts.empty:
+            runner.run(lambda q: logic.sync_multi_thread(json_path, runner.destinations, args.dry_run,
+                                                         runner.new_contacts, q, app_cfg.get("sharding")))
+    else:
+        runner.run(lambda q: logic.analyze_data_thread(
+            json_path, mailmerge_url, source_file, name_cols, email_cols, q,
+            app_cfg.get("email_canonicalization"), app_cfg.get("recipient_index"), app_cfg.get("source_cache"),
+            app_cfg.get("email_screening")))
+        _export(runner, args)
+        if args.command == "sync" and not runner.failed and runner.new_contacts is not None \
+                and not runner.new_contacts.empty:
+            start = (args.start or 1) - 1
+            contacts = runner.new_contacts.slice(start, args.end)
+            runner.run(lambda q: logic.sync_data_thread(json_path, mailmerge_url, args.dry_run, contacts, q,
+                                                        app_cfg.get("sharding")))
+
+    exit_code = runner.exit_code()
+    runner.emit({"event": "result", "command": args.command, "exit_code": exit_code})
+    return exit_code
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
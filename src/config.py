@@ -0,0 +1,57 @@
+import copy
+import json
+import os
+from typing import Any, Dict
+
+CONFIG_FILE = "config.json"
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    # Adiciona 'saved_mailmerge_urls' à configuração padrão
+    "user_settings": {"json_path": "", "mailmerge_url": "", "source_file": "", "theme": "superhero",
+                      "saved_mailmerge_urls": [], "multi_destination_urls": []},
+    "app_settings": {
+        "template_url": "https://docs.google.com/spreadsheets/d/1w8bnEEei0U5fYcOJXfA7ItdyXxnUGnQGJ4vFZrZE04Q/copy?hl=pt-br",
+        "possible_name_cols": ["NOME", "First name", "Name", "Nome"],
+        "possible_email_cols": ["EMAIL", "Last name", "Email", "E-mail", "E-MAIL", "EMAIL(MINUSCULOS)"],
+        "email_canonicalization": {"strip": True, "lowercase": True, "unicode_form": "NFKC",
+                                   "strip_plus_tags": False, "dot_insensitive_domains": []},
+        "recipient_index": {"enabled": True, "max_age_hours": 24},
+        "source_cache": {"enabled": True, "max_megabytes": 500},
+        # Triagem dos e-mails novos antes da sincronização; "domains_file" aceita um domínio bloqueado por linha
+        "email_screening": {"enabled": True, "block_disposable_domains": True, "blocked_domains": [],
+                            "domains_file": ""},
+        # A partir deste número de linhas a sincronização continua numa nova aba com o mesmo cabeçalho
+        "sharding": {"enabled": True, "max_rows_per_shard": 100000},
+        # Limite de chamadas à API por minuto compartilhado por todas as operações (0 desativa o limite)
+        "quota": {"read_requests_per_minute": 55, "write_requests_per_minute": 55, "max_retries": 6,
+                  "base_backoff_seconds": 1, "max_backoff_seconds": 64}
+    }
+}
+
+
+def default_config() -> Dict[str, Any]:
+    return copy.deepcopy(DEFAULT_CONFIG)
+
+
+def apply_defaults(config_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Garante que as novas chaves existam ao carregar configurações antigas."""
+    defaults = default_config()
+    if "user_settings" not in config_data:
+        config_data["user_settings"] = defaults["user_settings"]
+    # Adiciona 'saved_mailmerge_urls' (e as demais chaves novas) se não existirem nas configurações carregadas
+    for key, value in defaults["user_settings"].items():
+        config_data["user_settings"].setdefault(key, value)
+    if "app_settings" not in config_data:
+        config_data["app_settings"] = defaults["app_settings"]
+    # Adiciona as chaves de app_settings criadas em versões mais novas
+    for key, value in defaults["app_settings"].items():
+        config_data["app_settings"].setdefault(key, value)
+    return config_data
+
+
+def load_config(config_file: str = CONFIG_FILE) -> Dict[str, Any]:
+    """Lê o config.json sem criá-lo; retorna a configuração padrão se o arquivo não existir."""
+    if not os.path.exists(config_file):
+        return default_config()
+    with open(config_file, 'r', encoding='utf-8') as f:
+        return apply_defaults(json.load(f))
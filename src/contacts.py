@@ -0,0 +1,111 @@
+import csv
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from src.membership import HashedMembership
+
+# Mesmos nomes de src.source_reader.OUTPUT_COLUMNS, sem importar o pandas (este módulo também é usado pela interface)
+NAME_COLUMN = 'First name'
+EMAIL_COLUMN = 'Recipient'
+# Motivo pelo qual a triagem de e-mails separou o contato (ver src.email_screening)
+REASON_COLUMN = 'Motivo'
+
+
+class ContactBatch:
+    """Contatos novos guardados em duas listas de colunas (nomes e e-mails), sem DataFrame.
+
+    É o que a análise envia pela fila: a sincronização monta as linhas da planilha com ``rows`` e a
+    pré-visualização lê ``names``/``emails`` diretamente, sem criar um objeto por linha. ``row_ids``
+    guarda a numeração original de cada contato, preservada em recortes (``slice``/``take``). ``keys``
+    (um ``src.canonical.RecipientKeys``, opcional) permite conferir a edição de um contato sem refazer a análise.
+    Os contatos separados pela triagem de e-mails ficam em ``flagged``, outro lote com o motivo em ``reasons``;
+    com ``screener`` (um ``src.email_screening.EmailScreener``), um e-mail editado passa pela mesma triagem.
+    """
+
+    __slots__ = ("names", "emails", "row_ids", "keys", "reasons", "flagged", "screener", "_positions")
+
+    def __init__(self, names: List[Any], emails: List[Any], row_ids: Optional[Sequence[int]] = None,
+                 keys: Any = None, reasons: Optional[List[str]] = None) -> None:
+        if len(names) != len(emails):
+            raise ValueError("As colunas de nomes e e-mails precisam ter o mesmo tamanho.")
+        self.names = names
+        self.emails = emails
+        self.row_ids = range(len(names)) if row_ids is None else row_ids
+        self.keys = keys
+        self.reasons = reasons
+        self.flagged: Optional[ContactBatch] = None
+        self.screener: Any = None
+        # Posição de cada ``row_id`` quando não é um ``range``, montada na primeira consulta
+        self._positions: Optional[Dict[int, int]] = None
+
+    @classmethod
+    def from_frame(cls, df: Any, existing_keys: Optional['HashedMembership'] = None,
+                   options: Optional[Dict[str, Any]] = None) -> 'ContactBatch':
+        """Converte um DataFrame com as colunas 'First name' e 'Recipient' (uma cópia por coluna, não por linha).
+
+        Com ``existing_keys`` (as chaves canônicas já presentes no destino), o lote também guarda as chaves
+        dos seus contatos para conferir edições.
+        """
+        batch = cls(df[NAME_COLUMN].tolist(), df[EMAIL_COLUMN].tolist(),
+                    reasons=df[REASON_COLUMN].tolist() if REASON_COLUMN in df.columns else None)
+        if existing_keys is not None:
+            from src.canonical import RecipientKeys
+            batch.keys = RecipientKeys(existing_keys, batch.emails, options)
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def empty(self) -> bool:
+        return not self.names
+
+    def slice(self, start: int, end: int) -> 'ContactBatch':
+        return ContactBatch(self.names[start:end], self.emails[start:end], self.row_ids[start:end],
+                            reasons=self.reasons[start:end] if self.reasons is not None else None)
+
+    def take(self, positions: Iterable[int]) -> 'ContactBatch':
+        positions = list(positions)
+        return ContactBatch([self.names[i] for i in positions], [self.emails[i] for i in positions],
+                            [self.row_ids[i] for i in positions],
+                            reasons=[self.reasons[i] for i in positions] if self.reasons is not None else None)
+
+    def position_of(self, row_id: int) -> int:
+        """Posição no lote do contato com a numeração original ``row_id``."""
+        if isinstance(self.row_ids, range):
+            if row_id not in self.row_ids:
+                raise KeyError(row_id)
+            return self.row_ids.index(row_id)
+        if self._positions is None:
+            self._positions = {rid: position for position, rid in enumerate(self.row_ids)}
+        return self._positions[row_id]
+
+    def conflict(self, position: int, email: Any) -> Optional[str]:
+        """Motivo pelo qual o contato não pode receber ``email`` (vazio, já no destino, repetido ou recusado pela
+        triagem de e-mails), ou None."""
+        conflict = self.keys.conflict(position, email) if self.keys is not None else None
+        if conflict is None and self.screener is not None:
+            reason = self.screener.screen_one(email)
+            if reason:
+                conflict = f"e-mail recusado pela triagem ({reason})"
+        return conflict
+
+    def update(self, position: int, name: Any, email: Any) -> None:
+        self.names[position] = name
+        self.emails[position] = email
+        if self.keys is not None:
+            self.keys.replace(position, email)
+
+    def rows(self) -> List[List[Any]]:
+        """Linhas no formato da planilha (First name, Last name, Recipient)."""
+        return [[name, '', email] for name, email in zip(self.names, self.emails)]
+
+    def to_csv(self, path: str) -> None:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if self.reasons is None:
+                writer.writerow([NAME_COLUMN, EMAIL_COLUMN])
+                writer.writerows(zip(self.names, self.emails))
+            else:
+                writer.writerow([NAME_COLUMN, EMAIL_COLUMN, REASON_COLUMN])
+                writer.writerows(zip(self.names, self.emails, self.reasons))
@@ -0,0 +1,91 @@
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# Domínios de e-mail temporário mais comuns, bloqueados quando "block_disposable_domains" está ativo
+DISPOSABLE_DOMAINS = frozenset({
+    "10minutemail.com", "33mail.com", "discard.email", "dispostable.com", "emailondeck.com", "fakeinbox.com",
+    "getnada.com", "guerrillamail.com", "guerrillamail.net", "maildrop.cc", "mailinator.com", "mailnesia.com",
+    "mintemail.com", "mohmal.com", "sharklasers.com", "spamgourmet.com", "temp-mail.org", "tempmail.com",
+    "tempmailo.com", "throwawaymail.com", "trashmail.com", "yopmail.com", "yopmail.fr",
+})
+
+REASON_CHARACTERS = "caracteres inválidos"
+REASON_SYNTAX = "sintaxe inválida"
+REASON_TLD = "domínio sem TLD"
+REASON_BLOCKED = "domínio bloqueado"
+
+# Caracteres aceitos em qualquer posição; o resto (espaços, acentos, vírgulas...) é um erro de digitação
+_ALLOWED_CHARS = r"[A-Za-z0-9.@!#$%&'*+/=?^_`{|}~-]"
+_LOCAL_ATOM = r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+"
+_DOMAIN_LABEL = r"[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?"
+_EMAIL_PATTERN = rf"{_LOCAL_ATOM}(?:\.{_LOCAL_ATOM})*@(?:{_DOMAIN_LABEL}\.)+[A-Za-z]{{2,63}}"
+
+
+def _read_domains_file(path: str) -> Iterable[str]:
+    """Um domínio por linha; linhas vazias e comentários (#) são ignorados."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+class EmailScreener:
+    """Triagem offline dos e-mails antes da sincronização, com operações vetorizadas do pandas.
+
+    Aponta erros de sintaxe, caracteres inválidos, domínios sem TLD e domínios da lista de bloqueio
+    (``blocked_domains``, ``domains_file`` e, opcionalmente, os domínios temporários conhecidos). A lista é
+    compilada uma única vez num índice do pandas; subdomínios de um domínio bloqueado também são bloqueados.
+    """
+
+    def __init__(self, options: Optional[Dict[str, Any]] = None) -> None:
+        options = options or {}
+        domains = set(options.get("blocked_domains", []))
+        if options.get("block_disposable_domains", True):
+            domains |= DISPOSABLE_DOMAINS
+        if options.get("domains_file"):
+            domains.update(_read_domains_file(options["domains_file"]))
+        self.blocked = pd.Index(sorted({d.strip().lower().lstrip('@') for d in domains if d.strip()}), dtype=object)
+
+    def _is_blocked(self, domains: np.ndarray) -> np.ndarray:
+        """Confere cada domínio e seus domínios pais (a.b.exemplo.com -> b.exemplo.com -> exemplo.com)."""
+        blocked = np.zeros(len(domains), dtype=bool)
+        pending, current = np.arange(len(domains)), list(domains)
+        while current and not self.blocked.empty:
+            blocked[pending[self.blocked.get_indexer(current) >= 0]] = True
+            parents = [domain.partition('.')[2] for domain in current]
+            has_parent = np.fromiter(('.' in parent for parent in parents), dtype=bool, count=len(parents))
+            pending = pending[has_parent]
+            current = [parent for parent, keep in zip(parents, has_parent) if keep]
+        return blocked
+
+    def screen(self, emails: pd.Series) -> pd.Series:
+        """Retorna, para cada e-mail, o motivo do bloqueio ou ``<NA>`` se ele passou na triagem."""
+        emails = emails.astype("string").str.strip()
+        reasons = pd.Series(pd.NA, index=emails.index, dtype="string")
+        valid = emails.str.fullmatch(_EMAIL_PATTERN).fillna(False).to_numpy(dtype=bool)
+
+        # Só os inválidos (normalmente poucos) passam pela classificação do motivo
+        invalid = emails[~valid]
+        if len(invalid):
+            bad_chars = ~invalid.str.fullmatch(rf"{_ALLOWED_CHARS}*").fillna(True).astype(bool)
+            parts = invalid.str.rpartition('@')
+            no_tld = (invalid.str.count('@') == 1) & ~parts[2].str.contains(r"\.[A-Za-z]{2,63}$", regex=True)
+            detail = np.select([bad_chars.to_numpy(dtype=bool), no_tld.fillna(False).to_numpy(dtype=bool)],
+                               [REASON_CHARACTERS, REASON_TLD], default=REASON_SYNTAX)
+            reasons.iloc[~valid] = detail
+
+        if valid.any() and not self.blocked.empty:
+            # Os e-mails válidos têm exatamente um '@'; os domínios se repetem muito, então cada domínio
+            # distinto é conferido uma única vez
+            domains = [email[email.index('@') + 1:].lower() for email in emails[valid].to_numpy(dtype=object)]
+            codes, unique_domains = pd.factorize(np.asarray(domains, dtype=object))
+            blocked = self._is_blocked(np.asarray(unique_domains, dtype=object))[codes]
+            reasons.iloc[np.flatnonzero(valid)[blocked]] = REASON_BLOCKED
+        return reasons
+
+    def screen_one(self, email: Any) -> Optional[str]:
+        """Motivo do bloqueio de um único e-mail (ex.: editado na pré-visualização), ou None se passou."""
+        if email is None or not str(email).strip():
+            return REASON_SYNTAX
+        reason = self.screen(pd.Series([str(email)], dtype=object)).iloc[0]
+        return None if pd.isna(reason) else str(reason)
@@ -3,13 +3,30 @@ import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from tkinter import filedialog, messagebox, scrolledtext, font
 import threading
-from src import logic
+from src import config, metrics, quota, startup_profile
+from src.contacts import ContactBatch
 import webbrowser
 import json
 import os
 from queue import Queue, Empty
-from typing import Dict, Any, List, Optional, Callable
-import pandas as pd
+from typing import Dict, Any, List, Optional, Callable, Sequence, Tuple
+import time
+
+# Separador de vários arquivos de origem no mesmo campo (o mesmo de src.source_reader, sem importar o pandas)
+SOURCE_SEPARATOR = ";"
+# Intervalos de consulta da fila: curto enquanto há mensagens, longo quando ociosa
+QUEUE_BUSY_INTERVAL_MS = 20
+QUEUE_IDLE_INTERVAL_MS = 200
+# Tempo máximo (em segundos) gasto por rodada, para não travar a interface
+QUEUE_TIME_BUDGET = 0.05
+# Intervalo de atualização da folga de cota da API exibida abaixo do log
+QUOTA_REFRESH_INTERVAL_MS = 1000
+
+
+def _logic() -> Any:
+    """Importa a camada de lógica (pandas, gspread, google-auth) apenas quando ela é usada pela primeira vez."""
+    from src import logic
+    return logic
 
 
 class HelpWindow(ttk.Toplevel):
@@ -60,7 +77,7 @@ class HelpWindow(ttk.Toplevel):
 class EditContactWindow(ttk.Toplevel):
     """Uma janela pop-up para editar um contato selecionado."""
 
-    def __init__(self, parent: tk.Widget, item_id: int, contact_data: pd.Series, save_callback: Callable):
+    def __init__(self, parent: tk.Widget, item_id: int, name: str, email: str, save_callback: Callable):
         super().__init__(parent)
         self.title("Editar Contato")
         self.geometry("450x200")
@@ -74,13 +91,13 @@ class EditContactWindow(ttk.Toplevel):
         main_frame.pack(fill=BOTH, expand=True)
 
         ttk.Label(main_frame, text="Nome:").grid(row=0, column=0, sticky=W, padx=5, pady=5)
-        self.name_var = tk.StringVar(value=contact_data['First name'])
+        self.name_var = tk.StringVar(value=name)
         self.name_entry = ttk.Entry(main_frame, textvariable=self.name_var, width=50)
         self.name_entry.grid(row=0, column=1, sticky=EW, padx=5, pady=5)
         self.name_entry.focus_set()
 
         ttk.Label(main_frame, text="Email:").grid(row=1, column=0, sticky=W, padx=5, pady=5)
-        self.email_var = tk.StringVar(value=contact_data['Recipient'])
+        self.email_var = tk.StringVar(value=email)
         self.email_entry = ttk.Entry(main_frame, textvariable=self.email_var, width=50)
         self.email_entry.grid(row=1, column=1, sticky=EW, padx=5, pady=5)
 
@@ -107,13 +124,129 @@ class EditContactWindow(ttk.Toplevel):
         self.destroy()
 
 
+class DestinationsWindow(ttk.Toplevel):
+    """Janela para escolher, entre os links salvos, as planilhas que serão analisadas e sincronizadas juntas."""
+
+    def __init__(self, parent: tk.Widget, saved_urls: Sequence[str], selected: Sequence[str],
+                 save_callback: Callable[[List[str]], None]) -> None:
+        super().__init__(parent)
+        self.title("Vários Destinos")
+        self.geometry("650x400")
+        self.transient(parent)
+        self.grab_set()
+        self.save_callback = save_callback
+
+        main_frame = ttk.Frame(self, padding=20)
+        main_frame.pack(fill=BOTH, expand=True)
+        ttk.Label(main_frame, text="Marque as planilhas que devem receber os mesmos contatos. Com nenhuma marcada, "
+                                   "apenas a URL selecionada na tela principal é usada.",
+                  wraplength=600, justify=LEFT).pack(anchor=W, pady=(0, 10))
+        self.url_vars: List[Tuple[str, tk.BooleanVar]] = []
+        for url in saved_urls:
+            var = tk.BooleanVar(value=url in selected)
+            ttk.Checkbutton(main_frame, text=url, variable=var).pack(anchor=W, pady=2)
+            self.url_vars.append((url, var))
+        if not saved_urls:
+            ttk.Label(main_frame, text="Nenhum link salvo. Use o botão 'Salvar Link' primeiro.",
+                      bootstyle="warning").pack(anchor=W)
+
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(side=BOTTOM, anchor=E, pady=(15, 0))
+        ttk.Button(button_frame, text="Salvar", command=self._on_save, bootstyle="success").pack(side=LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancelar", command=self.destroy,
+                   bootstyle="secondary-outline").pack(side=LEFT, padx=5)
+        self.bind("<Escape>", lambda e: self.destroy())
+
+    def _on_save(self) -> None:
+        self.save_callback([url for url, var in self.url_vars if var.get()])
+        self.destroy()
+
+
+class VirtualPreview:
+    """Exibe um grande conjunto de contatos numa Treeview criando apenas as linhas visíveis (mais uma folga).
+
+    Os valores vêm direto de arrays de colunas; a barra de rolagem e a roda do mouse deslocam a janela
+    exibida, que é recriada a cada movimento.
+    """
+
+    BUFFER = 10
+
+    def __init__(self, tree: ttk.Treeview, scrollbar: ttk.Scrollbar) -> None:
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_ids: Sequence[Any] = ()
+        self.names: Sequence[Any] = ()
+        self.emails: Sequence[Any] = ()
+        self.offset = 0
+        self.scrollbar.config(command=self._on_scrollbar)
+        self.tree.bind("<MouseWheel>", lambda e: self._scroll_by(-1 if e.delta > 0 else 1, "units"))
+        self.tree.bind("<Button-4>", lambda e: self._scroll_by(-1, "units"))
+        self.tree.bind("<Button-5>", lambda e: self._scroll_by(1, "units"))
+        self.tree.bind("<Configure>", lambda e: self._render())
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    def set_data(self, row_ids: Sequence[Any], names: Sequence[Any], emails: Sequence[Any],
+                 keep_position: bool = False) -> None:
+        self.row_ids, self.names, self.emails = row_ids, names, emails
+        if not keep_position:
+            self.offset = 0
+        self._render()
+
+    def update_row(self, row_id: int, name: Any, email: Any) -> None:
+        """Atualiza só a linha exibida do contato ``row_id`` (os arrays de colunas já devem ter o novo valor)."""
+        iid = str(row_id)
+        if self.tree.exists(iid):
+            self.tree.item(iid, values=(f"{row_id + 1}. {name}", email))
+
+    def _visible_rows(self) -> int:
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        return max(int(self.tree.cget("height")), self.tree.winfo_height() // row_height)
+
+    def _render(self) -> None:
+        total = len(self.row_ids)
+        visible = self._visible_rows()
+        self.offset = max(0, min(self.offset, total - visible))
+        end = min(total, self.offset + visible + self.BUFFER)
+        self.tree.delete(*self.tree.get_children())
+        for pos in range(self.offset, end):
+            row_id = self.row_ids[pos]
+            self.tree.insert('', END, iid=str(row_id), values=(f"{row_id + 1}. {self.names[pos]}", self.emails[pos]))
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _scroll_by(self, amount: int, what: str) -> str:
+        step = self._visible_rows() if what == "pages" else 1
+        self.offset += amount * step
+        self._render()
+        return "break"
+
+    def _on_scrollbar(self, action: str, *args: str) -> None:
+        if action == "moveto":
+            self.offset = int(float(args[0]) * len(self.row_ids))
+            self._render()
+        elif action == "scroll":
+            self._scroll_by(int(args[0]), args[1])
+
+
 class AppGUI:
     def __init__(self, root: ttk.Window) -> None:
         self.root = root
-        self.global_new_contacts_df: Optional[pd.DataFrame] = None
+        self.new_contacts: Optional[ContactBatch] = None
+        # Contatos exibidos na pré-visualização: todos os novos ou o recorte do intervalo escolhido
+        self.previewed_contacts: Optional[ContactBatch] = None
+        # Planilhas marcadas para análise conjunta e, após a análise, o que falta em cada uma
+        self.multi_destination_urls: List[str] = []
+        self.multi_destinations: Optional[List[Any]] = None
 
         self.queue: Queue = Queue()
-        self.config_file: str = "config.json"
+        self.queue_stats: Dict[str, float] = {"total_messages": 0, "window_messages": 0,
+                                              "window_handler_seconds": 0.0, "window_started": time.monotonic(),
+                                              "messages_per_second": 0.0, "handler_load": 0.0}
+        self.config_file: str = config.CONFIG_FILE
         self.config_data: Dict[str, Any] = {}
 
         self.style = ttk.Style()
@@ -122,42 +255,26 @@ class AppGUI:
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
         self.load_or_create_config()
+        startup_profile.mark("configuração")
         self._setup_menubar()
         self._setup_widgets()
+        startup_profile.mark("widgets")
         self.process_queue()
+        self._refresh_quota_headroom()
         self.apply_loaded_config()
 
     def load_or_create_config(self) -> None:
-        default_config = {
-            # Adiciona 'saved_mailmerge_urls' à configuração padrão
-            "user_settings": {"json_path": "", "mailmerge_url": "", "source_file": "", "theme": "superhero",
-                              "saved_mailmerge_urls": []},
-            "app_settings": {
-                "template_url": "https://docs.google.com/spreadsheets/d/1w8bnEEei0U5fYcOJXfA7ItdyXxnUGnQGJ4vFZrZE04Q/copy?hl=pt-br",
-                "possible_name_cols": ["NOME", "First name", "Name", "Nome"],
-                "possible_email_cols": ["EMAIL", "Last name", "Email", "E-mail", "E-MAIL", "EMAIL(MINUSCULOS)"]
-            }
-        }
         try:
             if not os.path.exists(self.config_file):
-                self.config_data = default_config
+                self.config_data = config.default_config()
                 with open(self.config_file, 'w', encoding='utf-8') as f:
                     json.dump(self.config_data, f, indent=4, ensure_ascii=False)
             else:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    self.config_data = json.load(f)
-                # Garante que as novas chaves existam ao carregar configurações antigas
-                if "user_settings" not in self.config_data:
-                    self.config_data["user_settings"] = default_config["user_settings"]
-                # Adiciona 'saved_mailmerge_urls' se não existir nas configurações carregadas
-                if "saved_mailmerge_urls" not in self.config_data["user_settings"]:
-                    self.config_data["user_settings"]["saved_mailmerge_urls"] = default_config["user_settings"][
-                        "saved_mailmerge_urls"]
-                if "app_settings" not in self.config_data:
-                    self.config_data["app_settings"] = default_config["app_settings"]
+                self.config_data = config.load_config(self.config_file)
         except Exception as e:
-            self.config_data = default_config
+            self.config_data = config.default_config()
             messagebox.showerror("Erro de Configuração", f"Não foi possível ler ou criar o config.json: {e}")
+        quota.configure(self.config_data.get("app_settings", {}).get("quota"))
 
     def apply_loaded_config(self) -> None:
         user_cfg = self.config_data.get("user_settings", {})
@@ -176,18 +293,43 @@ class AppGUI:
         self.mailmerge_url_combobox['values'] = tuple(saved_urls)  # Define as opções do combobox como uma tupla
 
         self.entry_source_file.insert(0, user_cfg.get("source_file", ""))
+        self._set_multi_destinations([url for url in user_cfg.get("multi_destination_urls", []) if url in saved_urls])
         saved_theme = user_cfg.get("theme", "superhero")
         self.theme_var.set(saved_theme)
         self.change_theme(saved_theme)
         self.log("Configurações carregadas.", "SUCCESS")
 
+        # Após a primeira pintura, carrega os módulos pesados e pré-aquece a conexão em segundo plano
+        self.root.after_idle(self._on_first_paint)
+
+    def _on_first_paint(self) -> None:
+        startup_profile.mark("primeira pintura")
+        self.log(startup_profile.report(), "DEFAULT")
+        self._start_worker("prewarm_connection_thread", self.entry_json.get(), self.mailmerge_url_combobox.get(),
+                           self.queue)
+
+    def _start_worker(self, function_name: str, *args: Any) -> None:
+        """Executa uma função da camada de lógica numa thread, importando-a ali se ainda não foi carregada."""
+        threading.Thread(target=lambda: getattr(_logic(), function_name)(*args), daemon=True).start()
+
+    def _confirm_from_worker(self, title: str, message: str) -> bool:
+        """``confirm`` entregue às threads de trabalho: a pergunta é feita pela thread do Tk, via fila.
+
+        A thread de trabalho fica bloqueada em ``reply`` até o usuário responder; o Tk nunca é chamado fora da
+        sua própria thread.
+        """
+        reply: Queue = Queue(maxsize=1)
+        self.queue.put(("confirm", (title, message, reply)))
+        return reply.get()
+
     def save_config(self) -> None:
         user_cfg = {
             "json_path": self.entry_json.get(),
             "mailmerge_url": self.mailmerge_url_combobox.get(),  # Salva a URL atualmente selecionada/digitada
             "source_file": self.entry_source_file.get(),
             "theme": self.theme_var.get(),
-            "saved_mailmerge_urls": list(self.mailmerge_url_combobox['values'])  # Salva a lista de URLs do combobox
+            "saved_mailmerge_urls": list(self.mailmerge_url_combobox['values']),  # Salva a lista de URLs do combobox
+            "multi_destination_urls": self.multi_destination_urls
         }
         self.config_data["user_settings"] = user_cfg
         try:
@@ -213,6 +355,7 @@ class AppGUI:
         # Adiciona a nova opção de limpar informações
         options_menu.add_separator()
         options_menu.add_command(label="Limpar Todas as Informações", command=self.clear_all_information)
+        options_menu.add_command(label="Diagnóstico da Fila de Eventos", command=self.show_queue_stats)
         self.root.config(menu=menubar)
 
     def change_theme(self, theme_name: str) -> None:
@@ -248,6 +391,10 @@ class AppGUI:
                                                      bootstyle="outline-primary",
                                                      command=self._on_save_mailmerge_link)
         self.save_mailmerge_link_button.pack(side=LEFT)
+        self.multi_destinations_button = ttk.Button(mailmerge_url_frame, text="Vários Destinos...",
+                                                    bootstyle="outline-primary",
+                                                    command=self._on_choose_destinations_click)
+        self.multi_destinations_button.pack(side=LEFT, padx=(5, 0))
 
         mailmerge_url_frame.columnconfigure(1, weight=1)  # Faz o combobox expandir
 
@@ -262,24 +409,33 @@ class AppGUI:
         self.check_clear_button = ttk.Button(action_frame1, text="Verificar / Limpar Planilha",
                                              bootstyle="outline-danger", command=self.start_check_and_clear_thread)
         self.check_clear_button.pack(side=LEFT, padx=(10, 5))
+        self.update_names_button = ttk.Button(action_frame1, text="Corrigir Nomes", bootstyle="outline-warning",
+                                              command=self.start_update_names_thread)
+        self.update_names_button.pack(side=LEFT, padx=5)
         self.help_button = ttk.Button(action_frame1, text="Ajuda com Permissões", bootstyle="outline-info",
                                       command=self._on_help_button_click)
         self.help_button.pack(side=LEFT, padx=(10, 10))
+        self.multi_destinations_var = tk.StringVar()
+        self.multi_destinations_label = ttk.Label(frame1, textvariable=self.multi_destinations_var, bootstyle="info")
+        self.multi_destinations_label.grid(row=3, column=0, columnspan=3, sticky=W, padx=5)
         frame1.columnconfigure(1, weight=1)
 
         # Seção 2
         frame2 = ttk.Labelframe(main_frame, text="2. Fonte dos Novos Contatos (para Sincronização)", padding="10")
         frame2.pack(fill=X, pady=5)
-        ttk.Label(frame2, text="Arquivo (.xlsx, .csv):").grid(row=0, column=0, sticky=W, padx=5, pady=5)
+        ttk.Label(frame2, text="Arquivo(s) ou pasta (.xlsx, .csv):").grid(row=0, column=0, sticky=W, padx=5, pady=5)
         self.entry_source_file = ttk.Entry(frame2)
         self.entry_source_file.grid(row=0, column=1, sticky=EW, padx=5)
         self.browse_source_button = ttk.Button(frame2, text="Procurar...", bootstyle="info-outline",
                                                command=self._on_browse_source_click)
         self.browse_source_button.grid(row=0, column=2, padx=5)
+        self.browse_source_folder_button = ttk.Button(frame2, text="Pasta...", bootstyle="info-outline",
+                                                      command=self._on_browse_source_folder_click)
+        self.browse_source_folder_button.grid(row=0, column=3, padx=5)
         info_label = ttk.Label(frame2,
                                text='Atenção: O arquivo de contatos DEVE conter as colunas "NOME" e "EMAIL".',
                                bootstyle="warning", font=("Segoe UI", 8, "italic"), wraplength=500, justify=LEFT)
-        info_label.grid(row=1, column=1, columnspan=2, sticky=W, padx=5, pady=(5, 0))
+        info_label.grid(row=1, column=1, columnspan=3, sticky=W, padx=5, pady=(5, 0))
         frame2.columnconfigure(1, weight=1)
 
         # Seção 3
@@ -303,8 +459,8 @@ class AppGUI:
         self.preview_table.column('first_name', width=250)
         self.preview_table.column('recipient', width=400)
         self.preview_table.bind("<Double-1>", self._open_edit_dialog)
-        scrollbar = ttk.Scrollbar(preview_frame, orient=VERTICAL, command=self.preview_table.yview)
-        self.preview_table.configure(yscroll=scrollbar.set)
+        scrollbar = ttk.Scrollbar(preview_frame, orient=VERTICAL)
+        self.preview = VirtualPreview(self.preview_table, scrollbar)
         self.preview_table.grid(row=0, column=0, sticky='nsew')
         scrollbar.grid(row=0, column=1, sticky='ns')
         preview_frame.grid_columnconfigure(0, weight=1)
@@ -341,6 +497,9 @@ class AppGUI:
         status_label.pack(side=LEFT, padx=(0, 10))
         self.progress_bar = ttk.Progressbar(self.status_frame, mode='indeterminate')
         self.progress_bar.pack(side=LEFT, fill=X, expand=True)
+        self.quota_label_var = tk.StringVar()
+        ttk.Label(frame4, textvariable=self.quota_label_var, bootstyle="secondary").pack(side=BOTTOM, anchor=W,
+                                                                                         pady=(5, 0))
         self.log_text = scrolledtext.ScrolledText(frame4, height=5, wrap=WORD, font=("Consolas", 10))
         self.log_text.pack(fill=BOTH, expand=True)
         self.log_text.config(state=DISABLED)
@@ -351,41 +510,116 @@ class AppGUI:
         self.log_text.tag_config("DEFAULT", foreground="#d8d8d8")
 
     def log(self, message: str, level: str = "DEFAULT") -> None:
+        self._log_many([(message, level)])
+
+    def _log_many(self, entries: List[Tuple[str, str]]) -> None:
+        """Insere várias mensagens no log com uma única alteração do widget."""
+        if not entries:
+            return
+        chunks: List[Any] = []
+        for message, level in entries:
+            chunks.extend((f"> {message}\n", (level.upper(),)))
         try:
             self.log_text.config(state=NORMAL)
-            self.log_text.insert(tk.END, f"> {message}\n", (level.upper(),))
+            self.log_text.insert(tk.END, *chunks)
             self.log_text.config(state=DISABLED)
             self.log_text.see(tk.END)
         except tk.TclError:
             pass
 
     def process_queue(self) -> None:
+        """Consome as mensagens das threads de trabalho.
+
+        Logs consecutivos são agrupados numa única inserção e atualizações de progresso superadas são
+        descartadas. O intervalo de consulta encurta enquanto há mensagens e volta a crescer quando a fila esvazia.
+        """
+        started = time.perf_counter()
+        handled = 0
+        pending_logs: List[Tuple[str, str]] = []
+        latest_progress: Optional[str] = None
         try:
-            while True:
+            while time.perf_counter() - started < QUEUE_TIME_BUDGET:
                 msg_type, data = self.queue.get_nowait()
+                handled += 1
                 if msg_type == "log":
-                    self.log(data[0], data[1])
-                elif msg_type == "progress_start":
-                    self.status_label_var.set(data)
-                    self.status_frame.pack(fill=X, pady=(0, 5), before=self.log_text)
-                    self.progress_bar.start(10)
-                elif msg_type == "progress_stop":
-                    self.progress_bar.stop()
-                    self.status_frame.pack_forget()
-                elif msg_type == "buttons_state":
-                    self.set_buttons_state(data)
-                elif msg_type == "update_analysis":
-                    df, result_text, spin_config, sync_config = data
-                    if df is not None: df.reset_index(drop=True, inplace=True)
-                    self.global_new_contacts_df = df
-                    self.update_analysis_results(result_text, spin_config, sync_config)
-                    if df is not None: self.populate_preview_table(df)
-                elif msg_type == "permission_error":
-                    self.show_permission_error_dialog(data)
+                    pending_logs.append(data)
+                    continue
+                if msg_type == "progress_update":
+                    latest_progress = data
+                    continue
+                # Qualquer outra mensagem respeita a ordem: o que foi acumulado antes dela é aplicado primeiro
+                self._log_many(pending_logs)
+                pending_logs = []
+                if latest_progress is not None:
+                    self.status_label_var.set(latest_progress)
+                    latest_progress = None
+                self._handle_queue_message(msg_type, data)
         except Empty:
             pass
         finally:
-            self.root.after(100, self.process_queue)
+            self._log_many(pending_logs)
+            if latest_progress is not None:
+                self.status_label_var.set(latest_progress)
+            self._record_queue_stats(handled, time.perf_counter() - started)
+            busy = handled > 0 or not self.queue.empty()
+            self.root.after(QUEUE_BUSY_INTERVAL_MS if busy else QUEUE_IDLE_INTERVAL_MS, self.process_queue)
+
+    def _refresh_quota_headroom(self) -> None:
+        # O limite é compartilhado pelas threads de trabalho; a leitura da folga não chama a API
+        self.quota_label_var.set(quota.governor.describe())
+        self.root.after(QUOTA_REFRESH_INTERVAL_MS, self._refresh_quota_headroom)
+
+    def _handle_queue_message(self, msg_type: str, data: Any) -> None:
+        if msg_type == "progress_start":
+            self.status_label_var.set(data)
+            self.status_frame.pack(fill=X, pady=(0, 5), before=self.log_text)
+            self.progress_bar.start(10)
+        elif msg_type == "progress_stop":
+            self.progress_bar.stop()
+            self.status_frame.pack_forget()
+        elif msg_type == "buttons_state":
+            self.set_buttons_state(data)
+        elif msg_type == "update_analysis":
+            contacts, result_text, spin_config, sync_config = data
+            self.new_contacts = contacts
+            self.multi_destinations = None
+            self.update_analysis_results(result_text, spin_config, sync_config)
+            if contacts is not None:
+                started = time.perf_counter()
+                self.populate_preview_table(contacts)
+                self.log(metrics.record("pré-visualização", {"renderizar": time.perf_counter() - started}),
+                         "DEFAULT")
+        elif msg_type == "update_multi_analysis":
+            destinations, *analysis = data
+            self._handle_queue_message("update_analysis", tuple(analysis))
+            self.multi_destinations = destinations
+        elif msg_type == "permission_error":
+            self.show_permission_error_dialog(data)
+        elif msg_type == "dialog":
+            kind, title, message = data
+            {"info": messagebox.showinfo, "warning": messagebox.showwarning,
+             "error": messagebox.showerror}[kind](title, message)
+        elif msg_type == "confirm":
+            title, message, reply = data
+            reply.put(messagebox.askyesno(title, message))
+
+    def _record_queue_stats(self, handled: int, elapsed: float) -> None:
+        stats = self.queue_stats
+        stats["total_messages"] += handled
+        stats["window_messages"] += handled
+        stats["window_handler_seconds"] += elapsed
+        window = time.monotonic() - stats["window_started"]
+        if window >= 1.0:
+            stats["messages_per_second"] = stats["window_messages"] / window
+            stats["handler_load"] = stats["window_handler_seconds"] / window
+            stats["window_messages"], stats["window_handler_seconds"] = 0, 0.0
+            stats["window_started"] = time.monotonic()
+
+    def show_queue_stats(self) -> None:
+        stats = self.queue_stats
+        self.log(f"Fila de eventos: {stats['messages_per_second']:.1f} mensagens/s, "
+                 f"{stats['handler_load'] * 100:.1f}% do tempo no processamento, "
+                 f"{stats['total_messages']} mensagens no total.", "INFO")
 
     def _on_browse_json_click(self) -> None:
         filename = filedialog.askopenfilename(title="Selecione o arquivo JSON da Conta de Serviço",
@@ -396,41 +630,68 @@ class AppGUI:
             self.log(f"Arquivo de chave selecionado: {os.path.basename(filename)}", "INFO")
 
     def _on_browse_source_click(self) -> None:
-        filename = filedialog.askopenfilename(title="Selecione o arquivo de contatos",
-                                              filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv")])
-        if filename:
-            self.entry_source_file.delete(0, tk.END)
-            self.entry_source_file.insert(0, filename)
-            self.log(f"Arquivo de contatos selecionado: {os.path.basename(filename)}", "INFO")
-            self.log("Validando cabeçalhos do arquivo...", "INFO")
-            app_cfg = self.config_data.get("app_settings", {})
-            threading.Thread(target=logic.validate_source_file_headers_thread, args=(
-                filename, app_cfg.get("possible_name_cols", []), app_cfg.get("possible_email_cols", []), self.queue
-            ), daemon=True).start()
+        filenames = filedialog.askopenfilenames(title="Selecione o(s) arquivo(s) de contatos",
+                                                filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv")])
+        if filenames:
+            self._set_source(SOURCE_SEPARATOR.join(filenames),
+                             ", ".join(os.path.basename(f) for f in filenames))
+
+    def _on_browse_source_folder_click(self) -> None:
+        folder = filedialog.askdirectory(title="Selecione a pasta com as planilhas de contatos")
+        if folder:
+            self._set_source(folder, f"pasta {os.path.basename(folder)}")
+
+    def _set_source(self, source: str, description: str) -> None:
+        self.entry_source_file.delete(0, tk.END)
+        self.entry_source_file.insert(0, source)
+        self.log(f"Arquivo de contatos selecionado: {description}", "INFO")
+        self.log("Validando cabeçalhos do arquivo...", "INFO")
+        app_cfg = self.config_data.get("app_settings", {})
+        self._start_worker("validate_source_file_headers_thread", source, app_cfg.get("possible_name_cols", []),
+                           app_cfg.get("possible_email_cols", []), self.queue)
 
     def start_check_and_clear_thread(self) -> None:
         # Pega a URL do combobox agora
         mailmerge_url = self.mailmerge_url_combobox.get()
-        threading.Thread(target=logic.check_and_clear_sheet_thread,
-                         args=(self.entry_json.get(), mailmerge_url, self.queue), daemon=True).start()
+        self._start_worker("check_and_clear_sheet_thread", self.entry_json.get(), mailmerge_url, self.queue,
+                           self._confirm_from_worker)
+
+    def start_update_names_thread(self) -> None:
+        # Corrige, na planilha da URL selecionada, os nomes que mudaram no arquivo de origem
+        app_cfg = self.config_data.get("app_settings", {})
+        self._start_worker("update_names_thread", self.entry_json.get(), self.mailmerge_url_combobox.get(),
+                           self.entry_source_file.get(), app_cfg.get("possible_name_cols", []),
+                           app_cfg.get("possible_email_cols", []), self.dry_run_var.get(), self.queue,
+                           self._confirm_from_worker, app_cfg.get("email_canonicalization"),
+                           app_cfg.get("source_cache"))
 
     def start_analysis_thread(self) -> None:
         self.populate_preview_table(None)
         app_cfg = self.config_data.get("app_settings", {})
         # Pega a URL do combobox agora
+        if self.multi_destination_urls:
+            self._start_worker("analyze_multi_thread", self.entry_json.get(), list(self.multi_destination_urls),
+                               self.entry_source_file.get(), app_cfg.get("possible_name_cols", []),
+                               app_cfg.get("possible_email_cols", []), self.queue,
+                               app_cfg.get("email_canonicalization"), app_cfg.get("recipient_index"),
+                               app_cfg.get("source_cache"), app_cfg.get("email_screening"))
+            return
         mailmerge_url = self.mailmerge_url_combobox.get()
-        threading.Thread(target=logic.analyze_data_thread, args=(
-            self.entry_json.get(), mailmerge_url, self.entry_source_file.get(),
-            app_cfg.get("possible_name_cols", []), app_cfg.get("possible_email_cols", []), self.queue
-        ), daemon=True).start()
+        self._start_worker("analyze_data_thread", self.entry_json.get(), mailmerge_url, self.entry_source_file.get(),
+                           app_cfg.get("possible_name_cols", []), app_cfg.get("possible_email_cols", []), self.queue,
+                           app_cfg.get("email_canonicalization"), app_cfg.get("recipient_index"),
+                           app_cfg.get("source_cache"), app_cfg.get("email_screening"))
 
     def start_sync_thread(self) -> None:
+        if self.multi_destinations is not None:
+            self._start_multi_sync()
+            return
         try:
             start_val, end_val = int(self.spinbox_start_var.get()), int(self.spinbox_end_var.get())
             if start_val > end_val:
                 self.log("O número inicial não pode ser maior que o final.", "ERROR");
                 return
-            contacts_to_sync = self.global_new_contacts_df.iloc[start_val - 1:end_val]
+            contacts_to_sync = self.new_contacts.slice(start_val - 1, end_val)
             if not self.dry_run_var.get():
                 if not messagebox.askyesno("Confirmar Sincronização",
                                            f"Você tem certeza que deseja adicionar {len(contacts_to_sync)} contatos à planilha?"):
@@ -438,15 +699,44 @@ class AppGUI:
                     return
             # Pega a URL do combobox agora
             mailmerge_url = self.mailmerge_url_combobox.get()
-            threading.Thread(target=logic.sync_data_thread, args=(
-                self.entry_json.get(), mailmerge_url, self.dry_run_var.get(), contacts_to_sync,
-                self.queue
-            ), daemon=True).start()
+            self._start_worker("sync_data_thread", self.entry_json.get(), mailmerge_url, self.dry_run_var.get(),
+                               contacts_to_sync, self.queue, self.config_data.get("app_settings", {}).get("sharding"))
         except (ValueError, TypeError):
             self.log("Valores de intervalo inválidos para sincronização.", "ERROR")
         except Exception as e:
             self.log(f"Erro ao preparar sincronização: {e}", "ERROR")
 
+    def _start_multi_sync(self) -> None:
+        # Cada planilha recebe apenas os contatos que faltam nela; o intervalo do spinbox não se aplica
+        total = sum(len(positions) for _, _, positions in self.multi_destinations)
+        if not self.dry_run_var.get():
+            details = "\n".join(f"- {title}: {len(positions)}" for _, title, positions in self.multi_destinations)
+            if not messagebox.askyesno("Confirmar Sincronização",
+                                       f"Você tem certeza que deseja adicionar {total} linhas em "
+                                       f"{len(self.multi_destinations)} planilhas?\n\n{details}"):
+                self.log("Sincronização cancelada pelo usuário.", "WARNING")
+                return
+        self._start_worker("sync_multi_thread", self.entry_json.get(), self.multi_destinations,
+                           self.dry_run_var.get(), self.new_contacts, self.queue,
+                           self.config_data.get("app_settings", {}).get("sharding"))
+
+    def _on_choose_destinations_click(self) -> None:
+        DestinationsWindow(self.root, list(self.mailmerge_url_combobox['values']), self.multi_destination_urls,
+                           self._on_destinations_chosen)
+
+    def _on_destinations_chosen(self, urls: List[str]) -> None:
+        self._set_multi_destinations(urls)
+        self.save_config()
+        if urls:
+            self.log(f"{len(urls)} planilhas marcadas para análise e sincronização conjuntas.", "INFO")
+        else:
+            self.log("Vários destinos desativado: será usada apenas a URL selecionada.", "INFO")
+
+    def _set_multi_destinations(self, urls: List[str]) -> None:
+        self.multi_destination_urls = urls
+        self.multi_destinations_var.set(f"Vários destinos ativo: {len(urls)} planilhas marcadas "
+                                        f"(a URL acima é ignorada na análise)." if urls else "")
+
     def _on_help_button_click(self) -> None:
         json_path = self.entry_json.get()
         service_account_email = "[Selecione um arquivo JSON para ver o e-mail]"
@@ -471,43 +761,55 @@ class AppGUI:
         if not selected_item_id_str: return
         try:
             item_id = int(selected_item_id_str)
-            contact_data = self.global_new_contacts_df.loc[item_id]
-            EditContactWindow(self.root, item_id, contact_data, self._save_edited_contact)
+            position = self.new_contacts.position_of(item_id)
+            EditContactWindow(self.root, item_id, self.new_contacts.names[position],
+                              self.new_contacts.emails[position], self._save_edited_contact)
         except (ValueError, KeyError):
             self.log(f"Não foi possível encontrar os dados para o item selecionado.", "ERROR")
 
     def _save_edited_contact(self, item_id: int, new_data: Dict[str, str]) -> None:
         try:
-            self.global_new_contacts_df.loc[item_id, 'First name'] = new_data['name']
-            self.global_new_contacts_df.loc[item_id, 'Recipient'] = new_data['email']
-            self.populate_preview_table(self.global_new_contacts_df)
+            position = self.new_contacts.position_of(item_id)
+            email = new_data['email'].strip()
+            conflict = self.new_contacts.conflict(position, email)
+            if conflict:
+                self.log(f"Edição do contato Nº {item_id + 1} não aplicada: {conflict}.", "WARNING")
+                messagebox.showwarning("Edição Não Aplicada", f"Contato Nº {item_id + 1}: {conflict}.")
+                return
+            self.new_contacts.update(position, new_data['name'], email)
+            previewed = self.previewed_contacts
+            if previewed is not None and previewed is not self.new_contacts:
+                # Recorte do intervalo: as colunas exibidas são cópias e também precisam do novo valor
+                previewed.update(previewed.position_of(item_id), new_data['name'], email)
+            self.preview.update_row(item_id, new_data['name'], email)
             self.log(f"Contato Nº {item_id + 1} atualizado.", "SUCCESS")
         except Exception as e:
             self.log(f"Erro ao salvar a edição do contato: {e}", "ERROR")
 
-    def populate_preview_table(self, dataframe: Optional[pd.DataFrame]) -> None:
-        for item in self.preview_table.get_children(): self.preview_table.delete(item)
-        if dataframe is not None:
-            for index, row in dataframe.iterrows():
-                display_name = f"{index + 1}. {row['First name']}"
-                self.preview_table.insert('', END, iid=str(index), values=(display_name, row['Recipient']))
+    def populate_preview_table(self, contacts: Optional[ContactBatch], keep_position: bool = False) -> None:
+        self.previewed_contacts = contacts
+        if contacts is None:
+            self.preview.set_data((), (), ())
+        else:
+            self.preview.set_data(contacts.row_ids, contacts.names, contacts.emails, keep_position=keep_position)
 
     def update_preview_table(self) -> None:
-        if self.global_new_contacts_df is None or self.global_new_contacts_df.empty: return
+        if self.new_contacts is None or self.new_contacts.empty: return
         try:
             start_val, end_val = int(self.spinbox_start_var.get()), int(self.spinbox_end_var.get())
             if start_val > end_val:
                 self.log("ERRO: O número inicial não pode ser maior que o final.", "ERROR");
                 return
-            df_slice = self.global_new_contacts_df.iloc[start_val - 1:end_val]
-            self.populate_preview_table(df_slice)
+            self.populate_preview_table(self.new_contacts.slice(start_val - 1, end_val))
             self.log(f"Pré-visualização atualizada para mostrar contatos de {start_val} a {end_val}.", "INFO")
         except (ValueError, TypeError):
             self.log("ERRO: Valores inválidos para o intervalo de pré-visualização.", "ERROR")
 
     def set_buttons_state(self, state: str) -> None:
         for btn in [self.check_clear_button, self.analyze_button, self.sync_button, self.browse_json_button,
-                    self.browse_source_button, self.update_button, self.help_button, self.save_mailmerge_link_button]:
+                    self.browse_source_button, self.browse_source_folder_button, self.update_button, self.help_button,
+                    self.save_mailmerge_link_button, self.multi_destinations_button,
+                    self.update_names_button]:
             if btn.winfo_exists(): btn.config(state=state)
 
     def update_analysis_results(self, result_text: str, spinbox_config: Dict[str, Any],
@@ -541,7 +843,8 @@ class AppGUI:
             self.save_config()  # Salva as configurações vazias, mas mantém saved_mailmerge_urls
 
             # Limpa os resultados da análise e pré-visualização
-            self.global_new_contacts_df = None
+            self.new_contacts = None
+            self.multi_destinations = None
             self.analysis_result_var.set("Aguardando análise...")
             self.populate_preview_table(None)
 
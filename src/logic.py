@@ -1,13 +1,28 @@
+import numpy as np
 import pandas as pd
 import gspread
-from google.oauth2.service_account import Credentials
+import hashlib
+import threading
 import time
-from tkinter import messagebox
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from requests.exceptions import RequestException
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, Callable
 from queue import Queue
-import pandas as pd
+from src import metrics, quota, session, storage
+from src.canonical import RecipientDeduper, canonical_key_set, canonicalize_emails
+from src.chunked_writer import ChunkedAppender
+from src.contacts import REASON_COLUMN, ContactBatch
+from src.email_screening import EmailScreener
+from src.membership import HashedMembership, merge
+from src.recipient_index import RecipientIndex
+from src.source_cache import SourceCache
+from src.sync_journal import SyncJournal
+from src.source_reader import OUTPUT_COLUMNS, SourceSet, expand_source_files, list_sheets, read_header
+
+# Blocos da origem guardados enquanto o destino não chega; além disso a leitura espera pelo destino
+MAX_PENDING_CHUNKS = 4
 
 
 def validate_source_file_headers_thread(source_file: str, possible_name_cols: List[str], possible_email_cols: List[str],
@@ -17,74 +32,217 @@ def validate_source_file_headers_thread(source_file: str, possible_name_cols: Li
         if not source_file:
             return
 
-        df_header = pd.read_excel(source_file, nrows=0) if source_file.endswith('.xlsx') else pd.read_csv(source_file,
-                                                                                                          nrows=0)
+        files = expand_source_files(source_file)
+        if not files:
+            raise ValueError("nenhum arquivo .xlsx, .xls ou .csv encontrado.")
 
-        has_name = any(col in df_header.columns for col in possible_name_cols)
-        has_email = any(col in df_header.columns for col in possible_email_cols)
+        invalid = []
+        for file in files:
+            # Um arquivo é válido se ao menos uma de suas abas tiver as colunas de nome e e-mail
+            headers = [read_header(file, sheet) for sheet in list_sheets(file)]
+            has_name = any(col in header for header in headers for col in possible_name_cols)
+            has_email = any(col in header for header in headers for col in possible_email_cols)
+            if not (has_name and has_email):
+                missing = []
+                if not has_name: missing.append("NOME")
+                if not has_email: missing.append("EMAIL")
+                invalid.append((file, missing))
 
-        if has_name and has_email:
+        if not invalid:
             queue.put(("log", ("Arquivo de contatos validado com sucesso!", "SUCCESS")))
         else:
-            missing = []
-            if not has_name: missing.append("NOME")
-            if not has_email: missing.append("EMAIL")
-            msg = f"O arquivo parece não conter a(s) coluna(s) obrigatória(s): {', '.join(missing)}."
+            if len(files) == 1:
+                msg = f"O arquivo parece não conter a(s) coluna(s) obrigatória(s): {', '.join(invalid[0][1])}."
+            else:
+                details = "; ".join(f"{os.path.basename(f)} (sem {', '.join(m)})" for f, m in invalid)
+                msg = f"{len(invalid)} de {len(files)} arquivos não contêm as colunas obrigatórias: {details}."
             queue.put(("log", (msg, "WARNING")))
-            messagebox.showwarning("Cabeçalho Inválido", msg)
+            queue.put(("dialog", ("warning", "Cabeçalho Inválido", msg)))
     except Exception as e:
         msg = f"Não foi possível ler o arquivo de contatos: {e}"
         queue.put(("log", (msg, "ERROR")))
-        messagebox.showerror("Erro de Arquivo", msg)
+        queue.put(("dialog", ("error", "Erro de Arquivo", msg)))
+
+
+# Protege a criação preguiçosa do índice e do diário, que várias threads de destino podem pedir ao mesmo tempo
+_singletons_lock = threading.Lock()
+_recipient_index: Optional[RecipientIndex] = None
+
+
+def _get_recipient_index(index_cfg: Dict[str, Any]) -> RecipientIndex:
+    """Retorna o índice local de destinatários compartilhado pelo processo."""
+    global _recipient_index
+    with _singletons_lock:
+        if _recipient_index is None:
+            _recipient_index = RecipientIndex()
+    _recipient_index.max_age_seconds = float(index_cfg.get("max_age_hours", 24)) * 3600
+    return _recipient_index
+
+
+def _get_source_cache(cache_cfg: Optional[Dict[str, Any]]) -> Optional[SourceCache]:
+    """Cria o cache de origens conforme ``app_settings.source_cache`` (None se desativado)."""
+    cache_cfg = cache_cfg or {}
+    if not cache_cfg.get("enabled", True):
+        return None
+    return SourceCache(max_megabytes=float(cache_cfg.get("max_megabytes", 500)))
+
+
+_email_screener: Optional[Tuple[Any, EmailScreener]] = None
+
+
+def _get_email_screener(screening_cfg: Optional[Dict[str, Any]]) -> Optional[EmailScreener]:
+    """Cria (ou reaproveita, se a configuração não mudou) a triagem de e-mails; None se desativada."""
+    global _email_screener
+    screening_cfg = screening_cfg or {}
+    if not screening_cfg.get("enabled", True):
+        return None
+    domains_file = screening_cfg.get("domains_file")
+    identity = (json.dumps(screening_cfg, sort_keys=True),
+                os.path.getmtime(domains_file) if domains_file and os.path.exists(domains_file) else None)
+    if _email_screener is None or _email_screener[0] != identity:
+        _email_screener = (identity, EmailScreener(screening_cfg))
+    return _email_screener[1]
+
+
+def _screen_reasons(screener: Optional[EmailScreener], contacts: pd.DataFrame) -> pd.Series:
+    """Motivo da triagem para cada contato (``<NA>`` nos aprovados ou com a triagem desativada)."""
+    if screener is None or contacts.empty:
+        return pd.Series(pd.NA, index=contacts.index, dtype="string")
+    with metrics.span("triagem de e-mails"):
+        return screener.screen(contacts['Recipient'])
+
+
+def _split_flagged(contacts: pd.DataFrame, reasons: pd.Series) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Separa os contatos aprovados dos sinalizados pela triagem (estes com a coluna 'Motivo')."""
+    flagged = reasons.notna().to_numpy(dtype=bool)
+    return contacts[~flagged], contacts[flagged].assign(**{REASON_COLUMN: reasons[flagged].astype(object)})
+
+
+def _flagged_batch(blocks: List[pd.DataFrame], queue: Queue) -> ContactBatch:
+    """Junta os contatos sinalizados e registra no log quantos foram separados e por quê."""
+    flagged = ContactBatch.from_frame(pd.concat(blocks, ignore_index=True) if blocks else pd.DataFrame(
+        columns=OUTPUT_COLUMNS + [REASON_COLUMN]))
+    if len(flagged):
+        counts = pd.Series(flagged.reasons).value_counts()
+        details = ", ".join(f"{count} com {reason}" for reason, count in counts.items())
+        queue.put(("log", (f"Triagem de e-mails: {len(flagged)} contato(s) separado(s) e fora da sincronização "
+                           f"({details}).", "WARNING")))
+        for name, email, reason in list(zip(flagged.names, flagged.emails, flagged.reasons))[:10]:
+            queue.put(("log", (f"  {name} <{email}>: {reason}", "WARNING")))
+        if len(flagged) > 10:
+            queue.put(("log", (f"  ... e mais {len(flagged) - 10}.", "WARNING")))
+    return flagged
 
 
-def check_and_clear_sheet_thread(json_path: str, mailmerge_url: str, queue: Queue) -> None:
+def _read_existing_keys(store: storage.DestinationStore, mailmerge_url: str,
+                        canonicalization: Optional[Dict[str, Any]],
+                        recipient_index: Optional[Dict[str, Any]]) -> Tuple[HashedMembership, Optional[str]]:
+    """Retorna as chaves canônicas da coluna Recipient do destino e, se o índice local foi usado, o que ele fez."""
+    headers = store.read_header()
+    if 'Recipient' not in headers:
+        raise ValueError("A planilha de destino deve ter uma coluna de cabeçalho chamada 'Recipient'.")
+    recipient_col_index = headers.index('Recipient') + 1
+    index_cfg = recipient_index or {}
+    if index_cfg.get("enabled", True):
+        return _get_recipient_index(index_cfg).refresh(store, mailmerge_url, recipient_col_index, canonicalization)
+    columns = store.read_shards([recipient_col_index], {shard: 2 for shard in store.shards()})
+    return canonical_key_set([v for values in columns.values() for v in values[0]], canonicalization), None
+
+
+def _version_before_writes(store: storage.DestinationStore) -> Optional[str]:
+    """Marca de alteração do destino antes de uma sincronização, se o índice local estiver em uso."""
+    return store.modified_time() if _recipient_index is not None else None
+
+
+def _record_own_writes(store: storage.DestinationStore, mailmerge_url: str, before: Optional[str]) -> None:
+    """Avisa o índice local de que as alterações desde ``before`` foram só as linhas que acabamos de enviar."""
+    if before is not None and _recipient_index is not None:
+        _recipient_index.record_own_writes(mailmerge_url, before, store.modified_time())
+
+
+def _shard_limit(sharding: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Número de linhas a partir do qual a sincronização continua numa nova aba (None desativa a divisão)."""
+    sharding = sharding or {}
+    if not sharding.get("enabled", True) or not sharding.get("max_rows_per_shard"):
+        return None
+    return int(sharding["max_rows_per_shard"])
+
+
+def _log_created_shards(store: Optional[storage.DestinationStore], queue: Queue, label: str = "") -> None:
+    if store is not None and store.created_shards:
+        queue.put(("log", (f"{label}A última aba atingiu {store.max_rows_per_shard} linhas; os contatos seguintes "
+                           f"foram para: {', '.join(store.created_shards)}.", "INFO")))
+
+
+def prewarm_connection_thread(json_path: str, mailmerge_url: str, queue: Queue) -> None:
+    """Autentica e abre a planilha em segundo plano para que a primeira operação não pague essa latência."""
+    if storage.is_local_url(mailmerge_url) or not all([json_path, mailmerge_url]):
+        return
+    try:
+        session.get_worksheet(json_path, mailmerge_url)
+        queue.put(("log", ("Conexão com a planilha pré-carregada.", "INFO")))
+    except Exception as e:
+        queue.put(("log", (f"Não foi possível pré-carregar a conexão com a planilha: {type(e).__name__}", "WARNING")))
+
+
+def check_and_clear_sheet_thread(json_path: str, mailmerge_url: str, queue: Queue,
+                                 confirm: Callable[[str, str], bool] = lambda title, message: False) -> None:
+    """Verifica a planilha e, se ``confirm(título, mensagem)`` aprovar, apaga os dados mantendo o cabeçalho."""
     queue.put(("buttons_state", "disabled"))
     queue.put(("progress_start", "Verificando/Limpando planilha..."))
     queue.put(("log", ("Iniciando verificação/limpeza da planilha...", "INFO")))
+    metrics.start("verificar/limpar")
+    status = "ok"
     service_account_email = ''
     try:
-        if not all([json_path, mailmerge_url]):
+        is_local = storage.is_local_url(mailmerge_url)
+        if not mailmerge_url or not (json_path or is_local):
             raise ValueError("Os campos 'Arquivo de Chave JSON' e 'URL da Planilha' devem ser preenchidos.")
-        with open(json_path, 'r') as f:
-            sa_info = json.load(f)
-        service_account_email = sa_info.get('client_email')
-        if not service_account_email:
-            raise ValueError("Arquivo JSON inválido ou não contém o campo 'client_email'.")
-        queue.put(("log", ("Autenticando com Conta de Serviço...", "INFO")))
-        scopes_svc = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        credentials = Credentials.from_service_account_file(json_path, scopes=scopes_svc)
-        client = gspread.authorize(credentials)
+        if not is_local:
+            with open(json_path, 'r') as f:
+                sa_info = json.load(f)
+            service_account_email = sa_info.get('client_email')
+            if not service_account_email:
+                raise ValueError("Arquivo JSON inválido ou não contém o campo 'client_email'.")
+            queue.put(("log", ("Autenticando com Conta de Serviço...", "INFO")))
         queue.put(("log", ("Acessando a planilha...", "INFO")))
-        planilha_mailmerge = client.open_by_url(mailmerge_url)
-        aba_mailmerge = planilha_mailmerge.get_worksheet(0)
-        queue.put(("log", (f"Conexão bem-sucedida com a planilha: '{planilha_mailmerge.title}'", "SUCCESS")))
-        num_registros = len(aba_mailmerge.get_all_records())
+        aba_mailmerge = storage.open_store(json_path, mailmerge_url)
+        queue.put(("log", (f"Conexão bem-sucedida com a planilha: '{aba_mailmerge.title}'", "SUCCESS")))
+        started = time.perf_counter()
+        with metrics.span("contar registros"):
+            num_registros = aba_mailmerge.row_count()
+        queue.put(("log", (f"Contagem de registros concluída em {(time.perf_counter() - started) * 1000:.0f} ms.",
+                           "INFO")))
         if num_registros > 0:
             queue.put(("log", (f"A planilha contém {num_registros} registros.", "WARNING")))
-            if messagebox.askyesno("Planilha Contém Dados",
-                                   f"A planilha de destino contém {num_registros} registros.\n\nDeseja apagar TODOS os dados (mantendo o cabeçalho)?"):
+            with metrics.span("aguardar confirmação"):
+                confirmed = confirm("Planilha Contém Dados",
+                                    f"A planilha de destino contém {num_registros} registros.\n\nDeseja apagar TODOS os dados (mantendo o cabeçalho)?")
+            if confirmed:
                 queue.put(("log", ("Usuário confirmou a limpeza. Apagando dados...", "INFO")))
-                headers = aba_mailmerge.row_values(1) if aba_mailmerge.row_count > 0 else ['First name', 'Last name',
-                                                                                           'Recipient', 'Description',
-                                                                                           'Email Sent']
-                aba_mailmerge.clear()
-                time.sleep(1)
-                aba_mailmerge.append_row(headers, value_input_option="USER_ENTERED")
-                queue.put(("log", ("Planilha limpa com sucesso. Cabeçalhos mantidos.", "SUCCESS")))
-                messagebox.showinfo("Sucesso", "A planilha foi limpa com sucesso!")
+                started = time.perf_counter()
+                with metrics.span("limpar"):
+                    aba_mailmerge.clear_data()
+                queue.put(("log", (f"Planilha limpa com sucesso em {time.perf_counter() - started:.1f}s. "
+                                   f"Cabeçalhos mantidos.", "SUCCESS")))
+                queue.put(("dialog", ("info", "Sucesso", "A planilha foi limpa com sucesso!")))
             else:
                 queue.put(("log", ("Limpeza cancelada pelo usuário.", "WARNING")))
         else:
             queue.put(("log", ("A planilha de destino já está vazia.", "INFO")))
-            messagebox.showinfo("Informação", "A planilha já está vazia. Nenhuma ação de limpeza foi necessária.")
+            queue.put(("dialog", ("info", "Informação",
+                                  "A planilha já está vazia. Nenhuma ação de limpeza foi necessária.")))
 
     except RequestException:
+        status = "erro"
+        session.invalidate(json_path, mailmerge_url)
         msg = "Falha de rede ao contatar a API do Google. Verifique sua conexão com a internet."
         queue.put(("log", (msg, "ERROR")))
-        messagebox.showerror("Erro de Rede", msg)
+        queue.put(("dialog", ("error", "Erro de Rede", msg)))
 
     except Exception as e:
+        status = "erro"
+        session.invalidate(json_path, mailmerge_url)
         level = "ERROR"
         msg = f"{type(e).__name__} - {e}"
         if isinstance(e, gspread.exceptions.APIError) and e.response.json().get('error', {}).get(
@@ -93,65 +251,116 @@ def check_and_clear_sheet_thread(json_path: str, mailmerge_url: str, queue: Queu
             queue.put(("permission_error", service_account_email))
         else:
             queue.put(("log", (msg, level)))
-            messagebox.showerror("Erro na Operação", f"Não foi possível completar a operação.\n\nDetalhe: {msg}")
+            queue.put(("dialog", ("error", "Erro na Operação",
+                                  f"Não foi possível completar a operação.\n\nDetalhe: {msg}")))
     finally:
+        _log_metrics(queue, status)
         queue.put(("progress_stop", None))
         queue.put(("buttons_state", "normal"))
 
 
 def analyze_data_thread(json_path: str, mailmerge_url: str, source_file: str, possible_name_cols: List[str],
-                        possible_email_cols: List[str], queue: Queue) -> None:
+                        possible_email_cols: List[str], queue: Queue,
+                        canonicalization: Optional[Dict[str, Any]] = None,
+                        recipient_index: Optional[Dict[str, Any]] = None,
+                        source_cache: Optional[Dict[str, Any]] = None,
+                        email_screening: Optional[Dict[str, Any]] = None) -> None:
     queue.put(("buttons_state", "disabled"))
     queue.put(("progress_start", "Analisando contatos..."))
     queue.put(("log", ("Iniciando processo de análise...", "INFO")))
+    metrics.start("análise")
+    status = "ok"
     service_account_email = ''
     try:
-        if not all([json_path, mailmerge_url, source_file]):
+        is_local = storage.is_local_url(mailmerge_url)
+        if not all([mailmerge_url, source_file]) or not (json_path or is_local):
             raise ValueError("Todos os campos (JSON, URL e Arquivo de Origem) são obrigatórios.")
-        with open(json_path, 'r') as f:
-            sa_info = json.load(f)
-        service_account_email = sa_info.get('client_email')
+        if not is_local:
+            with open(json_path, 'r') as f:
+                sa_info = json.load(f)
+            service_account_email = sa_info.get('client_email')
+            queue.put(("log", ("Autenticando com Conta de Serviço...", "INFO")))
 
-        queue.put(("log", ("Autenticando com Conta de Serviço...", "INFO")))
-        scopes_svc = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        credentials = Credentials.from_service_account_file(json_path, scopes=scopes_svc)
-        client = gspread.authorize(credentials)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # A planilha de destino é baixada enquanto a origem é lida; as duas etapas só se encontram no filtro
+            queue.put(("log", ("Acessando a planilha e lendo apenas a coluna de e-mails existentes...", "INFO")))
+            destino = executor.submit(metrics.propagate(_timed_fetch), json_path, mailmerge_url, canonicalization,
+                                      recipient_index)
 
-        queue.put(("log", ("Acessando a planilha...", "INFO")))
-        planilha_mailmerge = client.open_by_url(mailmerge_url)
-        aba_mailmerge = planilha_mailmerge.get_worksheet(0)
-
-        queue.put(("log", ("Otimização: Lendo apenas a coluna de e-mails existentes...", "INFO")))
-        headers = aba_mailmerge.row_values(1)
-        if 'Recipient' not in headers:
-            raise ValueError("A planilha de destino deve ter uma coluna de cabeçalho chamada 'Recipient'.")
-        recipient_col_index = headers.index('Recipient') + 1
-        email_list = aba_mailmerge.col_values(recipient_col_index)[1:]
-        emails_existentes = set(
-            email.strip().lower() for email in email_list if isinstance(email, str) and email.strip())
-        num_existentes = len(emails_existentes)
-        queue.put(("log", (f"Encontrados {num_existentes} contatos únicos na planilha.", "INFO")))
+            queue.put(("log", ("Lendo arquivo de origem...", "INFO")))
+            sources = SourceSet(source_file, possible_name_cols, possible_email_cols,
+                                cache=_get_source_cache(source_cache))
+            if len(sources.tasks) > 1:
+                queue.put(("log", (f"Lendo {len(sources.tasks)} aba(s) de {len(sources.files)} arquivo(s) em "
+                                   f"paralelo...", "INFO")))
+            screener = _get_email_screener(email_screening)
+            deduper: Optional[RecipientDeduper] = None
+            # Blocos lidos antes de o destino chegar (no máximo MAX_PENDING_CHUNKS); são filtrados na ordem
+            # original assim que ele chega
+            pendentes: List[pd.DataFrame] = []
+            blocos_novos, blocos_sinalizados = [], []
 
-        queue.put(("log", ("Lendo arquivo de origem...", "INFO")))
-        agencias_df = pd.read_csv(source_file) if source_file.endswith('.csv') else pd.read_excel(source_file)
-        num_origem = len(agencias_df)
-        queue.put(("log", (f"Encontrados {num_origem} contatos no arquivo.", "INFO")))
+            def join_destination() -> RecipientDeduper:
+                with metrics.span("aguardar destino"):
+                    _, existentes, detalhe, fetch_seconds = destino.result()
+                if detalhe:
+                    queue.put(("log", (f"Índice local de destinatários: {detalhe}.", "INFO")))
+                queue.put(("log", (f"Encontrados {len(existentes)} contatos únicos na planilha "
+                                   f"(destino lido em {fetch_seconds:.1f}s).", "INFO")))
+                return RecipientDeduper(existentes, canonicalization)
+
+            def filter_chunk(bloco: pd.DataFrame) -> None:
+                with metrics.span("filtrar"):
+                    novos_bloco = deduper.filter(bloco)
+                aprovados, sinalizados = _split_flagged(novos_bloco, _screen_reasons(screener, novos_bloco))
+                blocos_novos.append(aprovados)
+                blocos_sinalizados.append(sinalizados)
 
-        actual_name_col = next((c for c in possible_name_cols if c in agencias_df.columns), None)
-        actual_email_col = next((c for c in possible_email_cols if c in agencias_df.columns), None)
-        if not all([actual_name_col, actual_email_col]):
-            raise ValueError(
-                "Colunas de nome/e-mail não encontradas no arquivo de origem. Verifique o arquivo de contatos ou as configurações em config.json.")
-
-        queue.put(("log", (f"Mapeando: '{actual_name_col}' -> First name, '{actual_email_col}' -> Recipient.", "INFO")))
-        novos_dados = agencias_df[[actual_name_col, actual_email_col]].copy()
-        novos_dados.columns = ['First name', 'Recipient']
-        novos_dados.dropna(inplace=True)
-        novos_filtrados = novos_dados[~novos_dados['Recipient'].str.lower().isin(emails_existentes)]
+            # Filtra bloco a bloco para que a memória dependa apenas dos contatos novos, não do tamanho do arquivo
+            parse_started = time.perf_counter()
+            for bloco in metrics.timed(sources.chunks(), "ler origem"):
+                if deduper is None and (destino.done() or len(pendentes) >= MAX_PENDING_CHUNKS):
+                    deduper = join_destination()
+                    for pendente in pendentes:
+                        filter_chunk(pendente)
+                    pendentes = []
+                if deduper is None:
+                    pendentes.append(bloco)
+                else:
+                    filter_chunk(bloco)
+            parse_seconds = time.perf_counter() - parse_started
+            if deduper is None:
+                deduper = join_destination()
+            for pendente in pendentes:
+                filter_chunk(pendente)
+        emails_existentes = deduper.existing_keys
+        num_existentes = len(emails_existentes)
+        queue.put(("log", (f"Etapas da análise: destino {destino.result()[3]:.1f}s e origem {parse_seconds:.1f}s "
+                           f"em paralelo; total {time.perf_counter() - started:.1f}s.", "INFO")))
+        for mapping in sources.mappings:
+            queue.put(("log", (f"Mapeando {mapping}.", "INFO")))
+        for skipped in sources.skipped:
+            queue.put(("log", (f"Aba ignorada: {skipped}.", "WARNING")))
+        if sources.cache_hits:
+            queue.put(("log", (f"{sources.cache_hits} de {len(sources.tasks)} aba(s) lida(s) do cache de origens.",
+                               "INFO")))
+        num_origem = sources.rows_read
+        queue.put(("log", (f"Encontrados {num_origem} contatos no arquivo.", "INFO")))
+        queue.put(("log", (f"Descartados: {deduper.empty_rows} sem nome/e-mail, {deduper.duplicates_in_file} "
+                           f"repetidos no arquivo, {deduper.already_in_sheet} já presentes na planilha.", "INFO")))
+        novos_filtrados = ContactBatch.from_frame(pd.concat(blocos_novos, ignore_index=True) if blocos_novos
+                                                  else pd.DataFrame(columns=OUTPUT_COLUMNS),
+                                                  emails_existentes, canonicalization)
+        novos_filtrados.flagged = _flagged_batch(blocos_sinalizados, queue)
+        # Edições feitas na pré-visualização passam pela mesma triagem
+        novos_filtrados.screener = screener
         num_novos = len(novos_filtrados)
         queue.put(("log", ("Análise concluída.", "SUCCESS")))
 
         analysis_result_text = f"Arquivo: {num_origem} contatos | Planilha: {num_existentes} contatos | NOVOS: {num_novos}"
+        if len(novos_filtrados.flagged):
+            analysis_result_text += f" | SINALIZADOS: {len(novos_filtrados.flagged)}"
         spinbox_config, sync_button_config = (
             {"state": "normal", "from_": 1, "to": num_novos, "start_value": 1, "end_value": num_novos},
             {"state": "normal"}) if num_novos > 0 else ({"state": "disabled"}, {"state": "disabled"})
@@ -162,13 +371,17 @@ def analyze_data_thread(json_path: str, mailmerge_url: str, source_file: str, po
         queue.put(("update_analysis", (novos_filtrados, analysis_result_text, spinbox_config, sync_button_config)))
 
     except RequestException:
+        status = "erro"
+        session.invalidate(json_path, mailmerge_url)
         msg = "Falha de rede ao contatar a API do Google. Verifique sua conexão com a internet."
         queue.put(("log", (msg, "ERROR")))
-        messagebox.showerror("Erro de Rede", msg)
+        queue.put(("dialog", ("error", "Erro de Rede", msg)))
         queue.put(("update_analysis",
                    (None, "Falha na análise. Verifique o log.", {"state": "disabled"}, {"state": "disabled"})))
 
     except Exception as e:
+        status = "erro"
+        session.invalidate(json_path, mailmerge_url)
         level = "ERROR"
         msg = f"{type(e).__name__} - {e}"
         if isinstance(e, gspread.exceptions.APIError) and e.response.json().get('error', {}).get(
@@ -177,56 +390,544 @@ def analyze_data_thread(json_path: str, mailmerge_url: str, source_file: str, po
             queue.put(("permission_error", service_account_email))
         else:
             queue.put(("log", (msg, level)))
-            messagebox.showerror("Erro na Análise", f"Não foi possível completar a análise.\n\nDetalhe: {msg}")
+            queue.put(("dialog", ("error", "Erro na Análise",
+                                  f"Não foi possível completar a análise.\n\nDetalhe: {msg}")))
         queue.put(("update_analysis",
                    (None, "Falha na análise. Verifique o log.", {"state": "disabled"}, {"state": "disabled"})))
     finally:
+        _log_metrics(queue, status)
         queue.put(("progress_stop", None))
         queue.put(("buttons_state", "normal"))
 
 
-def sync_data_thread(json_path: str, mailmerge_url: str, is_dry_run: bool, contacts_df_to_sync: pd.DataFrame,
-                     queue: Queue) -> None:
+def sync_data_thread(json_path: str, mailmerge_url: str, is_dry_run: bool, contacts_to_sync: ContactBatch,
+                     queue: Queue, sharding: Optional[Dict[str, Any]] = None) -> None:
     queue.put(("buttons_state", "disabled"))
     queue.put(("progress_start", "Sincronizando contatos..."))
     log_prefix = "SIMULAÇÃO" if is_dry_run else "SINCRONIZAÇÃO"
     queue.put(("log", (f"Iniciando processo de {log_prefix.lower()}...", "INFO")))
+    metrics.start(log_prefix.lower())
+    status = "ok"
+    appender = None
     try:
-        if contacts_df_to_sync is None or contacts_df_to_sync.empty:
+        if contacts_to_sync is None or contacts_to_sync.empty:
             raise ValueError("Nenhum novo parceiro para sincronizar.")
 
-        linhas_para_adicionar = [[row['First name'], '', row['Recipient']] for index, row in
-                                 contacts_df_to_sync.iterrows()]
-        num_linhas = len(linhas_para_adicionar)
+        num_linhas = len(contacts_to_sync)
         queue.put(("log", (f"Preparando para adicionar {num_linhas} contatos...", "INFO")))
 
         if is_dry_run:
             queue.put(("log", (f"MODO SIMULAÇÃO: {num_linhas} linhas seriam adicionadas.", "SUCCESS")))
-            messagebox.showinfo("Simulação Concluída", f"{num_linhas} novos contatos seriam processados.")
+            queue.put(("dialog", ("info", "Simulação Concluída", f"{num_linhas} novos contatos seriam processados.")))
         else:
             queue.put(("log", ("Conectando ao Google para escrever os dados...", "INFO")))
-            scopes_svc = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-            credentials = Credentials.from_service_account_file(json_path, scopes=scopes_svc)
-            client = gspread.authorize(credentials)
-            planilha_mailmerge = client.open_by_url(mailmerge_url)
-            aba_mailmerge = planilha_mailmerge.get_worksheet(0)
+            aba_mailmerge = storage.open_store(json_path, mailmerge_url, _shard_limit(sharding))
             queue.put(("log", ("Adicionando novas linhas à planilha...", "INFO")))
-            aba_mailmerge.append_rows(linhas_para_adicionar, value_input_option="USER_ENTERED")
-            queue.put(("log", (f"SUCESSO! {num_linhas} novas linhas adicionadas.", "SUCCESS")))
-            messagebox.showinfo("Sincronização Concluída", f"{num_linhas} novos contatos foram adicionados.")
+            appender = ChunkedAppender(aba_mailmerge)
+            versao_antes = _version_before_writes(aba_mailmerge)
+
+            def report_chunk(chunk_rows: int, total_written: int, elapsed: float, to_send: int) -> None:
+                # Numa retomada, ``to_send`` desconta as linhas que já estavam na planilha
+                queue.put(("log", (f"Lote de {chunk_rows} linhas enviado em {elapsed:.1f}s "
+                                   f"({total_written}/{to_send}).", "INFO")))
+                queue.put(("progress_update", f"Sincronizando contatos... {total_written}/{to_send}"))
+
+            enviadas = _write_journaled(appender, mailmerge_url, contacts_to_sync, queue, report_chunk)
+            _record_own_writes(aba_mailmerge, mailmerge_url, versao_antes)
+            _log_created_shards(aba_mailmerge, queue)
+            queue.put(("log", (f"SUCESSO! {enviadas} novas linhas adicionadas.", "SUCCESS")))
+            queue.put(("dialog", ("info", "Sincronização Concluída", f"{enviadas} novos contatos foram adicionados.")))
 
     except RequestException:
+        status = "erro"
+        session.invalidate(json_path, mailmerge_url)
         msg = f"Falha de rede durante a {log_prefix.lower()}. Verifique sua conexão com a internet."
         queue.put(("log", (msg, "ERROR")))
-        messagebox.showerror("Erro de Rede", msg)
+        _log_partial_sync(appender, queue)
+        queue.put(("dialog", ("error", "Erro de Rede", msg)))
 
     except Exception as e:
+        status = "erro"
+        session.invalidate(json_path, mailmerge_url)
         msg = f"ERRO NA {log_prefix}: {type(e).__name__} - {e}"
         queue.put(("log", (msg, "ERROR")))
-        messagebox.showerror(f"Erro na {log_prefix}", f"Não foi possível sincronizar os dados.\n\nDetalhe: {e}")
+        _log_partial_sync(appender, queue)
+        queue.put(("dialog", ("error", f"Erro na {log_prefix}",
+                              f"Não foi possível sincronizar os dados.\n\nDetalhe: {e}")))
     finally:
+        _log_metrics(queue, status)
         queue.put(("progress_stop", None))
         queue.put(("buttons_state", "normal"))
-        queue.put(("update_analysis",
-                   ("Execute uma nova análise para continuar.", {"state": "disabled"}, {"state": "disabled"})))
-        queue.put(("log", ("Processo finalizado.", "INFO")))
\ No newline at end of file
+        # Após uma falha no envio a análise é mantida, para que a próxima sincronização retome pelo diário
+        if status == "ok" or appender is None:
+            queue.put(("update_analysis",
+                       (None, "Execute uma nova análise para continuar.", {"state": "disabled"}, {"state": "disabled"})))
+        queue.put(("log", ("Processo finalizado.", "INFO")))
+
+
+# Aba e linha de cada contato da planilha de destino
+CellLocation = Tuple[str, int]
+
+
+def _read_destination_names(json_path: str, mailmerge_url: str) -> Tuple[storage.DestinationStore, int,
+                                                                          List[CellLocation], List[str], List[str]]:
+    """Abre o destino e lê First name e Recipient de todas as abas numa única chamada.
+
+    Retorna (destino, coluna do nome, aba e linha de cada contato, nomes, e-mails).
+    """
+    store = storage.open_store(json_path, mailmerge_url)
+    headers = store.read_header()
+    missing = [col for col in ('First name', 'Recipient') if col not in headers]
+    if missing:
+        raise ValueError(f"A planilha de destino deve ter as colunas de cabeçalho {', '.join(missing)}.")
+    name_col, recipient_col = headers.index('First name') + 1, headers.index('Recipient') + 1
+    with metrics.span("ler destino"):
+        columns = store.read_shards([name_col, recipient_col], {shard: 2 for shard in store.shards()})
+    locations: List[CellLocation] = []
+    names: List[str] = []
+    recipients: List[str] = []
+    for shard, (shard_names, shard_recipients) in columns.items():
+        count = len(shard_recipients)
+        locations.extend((shard, row) for row in range(2, count + 2))
+        names.extend((shard_names + [''] * count)[:count])
+        recipients.extend(shard_recipients)
+    return store, name_col, locations, names, recipients
+
+
+def _changed_names(source: pd.DataFrame, names: List[str], recipients: List[str],
+                   canonicalization: Optional[Dict[str, Any]]) -> List[Tuple[int, str, str]]:
+    """Compara os nomes do destino com os da origem e retorna (posição na lista do destino, nome atual, nome novo).
+
+    Como na análise, vale a primeira ocorrência de cada e-mail na origem; linhas repetidas no destino são
+    todas corrigidas.
+    """
+    source_names = source['First name'].astype("string").str.strip()
+    by_key = pd.DataFrame({'key': canonicalize_emails(source['Recipient'], canonicalization), 'name': source_names})
+    by_key = by_key[by_key['key'].notna() & by_key['name'].notna() & (by_key['name'] != '')]
+    by_key = by_key.drop_duplicates('key').set_index('key')['name']
+
+    current = pd.Series(names[:len(recipients)] + [''] * (len(recipients) - len(names)), dtype="string")
+    keys = canonicalize_emails(pd.Series(recipients, dtype=object), canonicalization)
+    new = keys.map(by_key).astype("string")
+    changed = (new.notna() & (new != current.fillna('').str.strip())).to_numpy(dtype=bool)
+    positions = np.flatnonzero(changed)
+    return list(zip(positions.tolist(), current[changed].fillna('').tolist(), new[changed].tolist()))
+
+
+def update_names_thread(json_path: str, mailmerge_url: str, source_file: str, possible_name_cols: List[str],
+                        possible_email_cols: List[str], is_dry_run: bool, queue: Queue,
+                        confirm: Callable[[str, str], bool] = lambda title, message: False,
+                        canonicalization: Optional[Dict[str, Any]] = None,
+                        source_cache: Optional[Dict[str, Any]] = None) -> None:
+    """Corrige na planilha o nome dos contatos já existentes que mudou no arquivo de origem.
+
+    First name e Recipient são lidos do destino numa única chamada (em paralelo com a leitura da origem) e
+    apenas as células diferentes são escritas, numa única atualização em lote com intervalos mínimos, em vez
+    de limpar e reenviar a planilha inteira.
+    """
+    queue.put(("buttons_state", "disabled"))
+    queue.put(("progress_start", "Comparando nomes..."))
+    log_prefix = "SIMULAÇÃO" if is_dry_run else "ATUALIZAÇÃO"
+    queue.put(("log", (f"Iniciando {'simulação da ' if is_dry_run else ''}atualização de nomes...", "INFO")))
+    metrics.start("atualizar nomes")
+    status = "ok"
+    service_account_email = ''
+    try:
+        is_local = storage.is_local_url(mailmerge_url)
+        if not all([mailmerge_url, source_file]) or not (json_path or is_local):
+            raise ValueError("Todos os campos (JSON, URL e Arquivo de Origem) são obrigatórios.")
+        if not is_local:
+            with open(json_path, 'r') as f:
+                sa_info = json.load(f)
+            service_account_email = sa_info.get('client_email')
+            queue.put(("log", ("Autenticando com Conta de Serviço...", "INFO")))
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            queue.put(("log", ("Lendo as colunas First name e Recipient da planilha...", "INFO")))
+            destino = executor.submit(metrics.propagate(_read_destination_names), json_path, mailmerge_url)
+            queue.put(("log", ("Lendo arquivo de origem...", "INFO")))
+            sources = SourceSet(source_file, possible_name_cols, possible_email_cols,
+                                cache=_get_source_cache(source_cache))
+            blocos = list(metrics.timed(sources.chunks(), "ler origem"))
+            for mapping in sources.mappings:
+                queue.put(("log", (f"Mapeando {mapping}.", "INFO")))
+            for skipped in sources.skipped:
+                queue.put(("log", (f"Aba ignorada: {skipped}.", "WARNING")))
+            with metrics.span("aguardar destino"):
+                aba_mailmerge, name_col, locais, nomes, emails = destino.result()
+        origem = pd.concat(blocos, ignore_index=True) if blocos else pd.DataFrame(columns=OUTPUT_COLUMNS)
+        queue.put(("log", (f"Planilha: {len(emails)} linhas | Arquivo: {sources.rows_read} contatos.", "INFO")))
+
+        with metrics.span("comparar"):
+            mudancas = _changed_names(origem, nomes, emails, canonicalization)
+        if not mudancas:
+            queue.put(("log", ("Nenhum nome diferente entre a planilha e o arquivo de origem.", "SUCCESS")))
+            queue.put(("dialog", ("info", "Atualização de Nomes", "Todos os nomes da planilha já estão corretos.")))
+            return
+
+        queue.put(("log", (f"{len(mudancas)} contato(s) com o nome diferente na origem:", "WARNING")))
+        varias_abas = len(aba_mailmerge.shards()) > 1
+        for position, atual, novo in mudancas[:10]:
+            shard, row = locais[position]
+            local = f"'{shard}', linha {row}" if varias_abas else f"Linha {row}"
+            queue.put(("log", (f"  {local}: '{atual}' -> '{novo}'", "INFO")))
+        if len(mudancas) > 10:
+            queue.put(("log", (f"  ... e mais {len(mudancas) - 10}.", "INFO")))
+
+        if is_dry_run:
+            queue.put(("log", (f"MODO SIMULAÇÃO: {len(mudancas)} nome(s) seriam corrigidos.", "SUCCESS")))
+            queue.put(("dialog", ("info", "Simulação Concluída", f"{len(mudancas)} nomes seriam corrigidos.")))
+            return
+        with metrics.span("aguardar confirmação"):
+            confirmed = confirm("Confirmar Atualização",
+                                f"Deseja corrigir o nome de {len(mudancas)} contato(s) na planilha?")
+        if not confirmed:
+            queue.put(("log", ("Atualização de nomes cancelada pelo usuário.", "WARNING")))
+            return
+
+        started = time.perf_counter()
+        # Só a coluna First name é alterada: o índice de destinatários continua válido
+        versao_antes = _version_before_writes(aba_mailmerge)
+        with metrics.span("atualizar células"):
+            intervalos = aba_mailmerge.update_cells([(*locais[position], name_col, novo)
+                                                     for position, _, novo in mudancas])
+        _record_own_writes(aba_mailmerge, mailmerge_url, versao_antes)
+        queue.put(("log", (f"SUCESSO! {len(mudancas)} nome(s) corrigido(s) em {intervalos} intervalo(s), numa única "
+                           f"chamada ({time.perf_counter() - started:.1f}s).", "SUCCESS")))
+        queue.put(("dialog", ("info", "Atualização Concluída", f"{len(mudancas)} nomes foram corrigidos.")))
+
+    except RequestException:
+        status = "erro"
+        session.invalidate(json_path, mailmerge_url)
+        msg = f"Falha de rede durante a {log_prefix.lower()}. Verifique sua conexão com a internet."
+        queue.put(("log", (msg, "ERROR")))
+        queue.put(("dialog", ("error", "Erro de Rede", msg)))
+
+    except Exception as e:
+        status = "erro"
+        session.invalidate(json_path, mailmerge_url)
+        msg = f"{type(e).__name__} - {e}"
+        if isinstance(e, gspread.exceptions.APIError) and e.response.json().get('error', {}).get(
+                'status') == 'PERMISSION_DENIED':
+            queue.put(("log", ("ERRO: Permissão negada para a Conta de Serviço.", "ERROR")))
+            queue.put(("permission_error", service_account_email))
+        else:
+            queue.put(("log", (f"ERRO NA {log_prefix}: {msg}", "ERROR")))
+            queue.put(("dialog", ("error", "Erro na Atualização de Nomes",
+                                  f"Não foi possível atualizar os nomes.\n\nDetalhe: {msg}")))
+    finally:
+        _log_metrics(queue, status)
+        queue.put(("progress_stop", None))
+        queue.put(("buttons_state", "normal"))
+
+
+def _log_metrics(queue: Queue, status: str) -> None:
+    """Encerra as métricas da operação da thread atual e mostra o resumo no log."""
+    recorder = metrics.finish(status)
+    if recorder is not None:
+        queue.put(("log", (recorder.summary(), "DEFAULT")))
+
+
+def _log_partial_sync(appender: ChunkedAppender, queue: Queue) -> None:
+    """Informa quantas linhas chegaram ao destino antes de uma falha no meio da sincronização."""
+    if appender is not None and appender.rows_written:
+        queue.put(("log", (f"{appender.rows_written} linhas já haviam sido adicionadas em "
+                           f"{appender.chunks_written} lote(s) antes da falha.", "WARNING")))
+    if appender is not None:
+        queue.put(("log", ("Clique em SINCRONIZAR novamente para retomar: os lotes já confirmados não serão "
+                           "reenviados.", "WARNING")))
+
+
+_sync_journal: Optional[SyncJournal] = None
+
+
+def _get_sync_journal() -> SyncJournal:
+    global _sync_journal
+    with _singletons_lock:
+        if _sync_journal is None:
+            _sync_journal = SyncJournal()
+    return _sync_journal
+
+
+def _write_journaled(appender: ChunkedAppender, mailmerge_url: str, contacts: ContactBatch, queue: Queue,
+                     on_chunk: Callable[[int, int, float, int], None], label: str = "") -> int:
+    """Escreve os contatos registrando cada lote no diário e retorna quantas linhas foram enviadas.
+
+    Se a última sincronização deste destino tinha os mesmos destinatários e não terminou (ou terminou e está
+    sendo repetida), as linhas que ela pode ter escrito são conferidas no destino e as já presentes são puladas.
+    ``on_chunk`` recebe, além do que o ``ChunkedAppender`` informa, o total que será de fato enviado.
+    """
+    with metrics.span("montar linhas"):
+        rows = contacts.rows()
+    signature = hashlib.sha256("\n".join(map(str, contacts.emails)).encode("utf-8")).hexdigest()
+    run = _get_sync_journal().begin(mailmerge_url, signature, len(rows))
+    positions = list(range(len(rows)))
+    if run.resumed:
+        with metrics.span("conferir diário"):
+            headers = appender.store.read_header()
+            col_index = headers.index('Recipient') + 1 if 'Recipient' in headers else 3
+            # A sincronização anterior começou em ``first_shard`` e pode ter continuado nas abas criadas depois
+            shards = appender.store.shards()
+            first = shards.index(run.first_shard) if run.first_shard in shards else 0
+            start_rows = {shard: 2 for shard in shards[first:]}
+            start_rows[shards[first]] = run.first_row or 2
+            columns = appender.store.read_shards([col_index], start_rows)
+            present = {value.strip() for values in columns.values() for value in values[0]}
+        positions = [i for i in positions if i >= run.check_until or str(rows[i][2]).strip() not in present]
+        queue.put(("log", (f"{label}Retomando a sincronização anterior: {len(rows) - len(positions)} linha(s) já "
+                           f"estavam na planilha e não serão reenviadas.", "WARNING")))
+
+    def source_span(start: int, count: int) -> Tuple[int, int]:
+        # Converte a posição na sequência enviada para as linhas de origem cobertas pelo lote
+        first, last = positions[start], positions[start + count - 1]
+        return first, last + 1 - first
+
+    appender.write((rows[i] for i in positions),
+                   on_chunk=lambda chunk_rows, total_written, elapsed: on_chunk(chunk_rows, total_written, elapsed,
+                                                                              len(positions)),
+                   on_send=lambda start, count: run.batch_sending(*source_span(start, count)),
+                   on_confirm=lambda start, count, updated_range: run.batch_confirmed(
+                       *source_span(start, count), updated_range))
+    run.finish()
+    return len(positions)
+
+
+def _describe_error(error: Exception) -> str:
+    """Resume um erro de um destino para o log, sem abrir diálogos (usado quando há vários destinos)."""
+    if quota.classify(error)[0] == "cota":
+        return "cota da API esgotada mesmo após as novas tentativas"
+    if isinstance(error, RequestException):
+        return "falha de rede ao contatar a API do Google"
+    if isinstance(error, gspread.exceptions.APIError) and error.response.json().get('error', {}).get(
+            'status') == 'PERMISSION_DENIED':
+        return "permissão negada para a Conta de Serviço"
+    return f"{type(error).__name__} - {error}"
+
+
+def _fetch_destination(json_path: str, mailmerge_url: str, canonicalization: Optional[Dict[str, Any]],
+                       recipient_index: Optional[Dict[str, Any]]) -> Tuple[str, HashedMembership, Optional[str]]:
+    """Abre um destino e retorna (título, chaves existentes, detalhe do índice local)."""
+    store = storage.open_store(json_path, mailmerge_url)
+    with metrics.span("ler destino"):
+        keys, detail = _read_existing_keys(store, mailmerge_url, canonicalization, recipient_index)
+    return store.title, keys, detail
+
+
+def _timed_fetch(json_path: str, mailmerge_url: str, canonicalization: Optional[Dict[str, Any]],
+                 recipient_index: Optional[Dict[str, Any]]) -> Tuple[str, HashedMembership, Optional[str], float]:
+    """``_fetch_destination`` acrescido da duração da etapa, para o log da análise."""
+    started = time.perf_counter()
+    return (*_fetch_destination(json_path, mailmerge_url, canonicalization, recipient_index),
+            time.perf_counter() - started)
+
+
+# (URL, título da planilha, posições no lote de contatos novos dos que faltam nela)
+Destination = Tuple[str, str, np.ndarray]
+
+
+def analyze_multi_thread(json_path: str, mailmerge_urls: List[str], source_file: str, possible_name_cols: List[str],
+                         possible_email_cols: List[str], queue: Queue,
+                         canonicalization: Optional[Dict[str, Any]] = None,
+                         recipient_index: Optional[Dict[str, Any]] = None,
+                         source_cache: Optional[Dict[str, Any]] = None,
+                         email_screening: Optional[Dict[str, Any]] = None) -> None:
+    """Analisa os mesmos contatos contra várias planilhas de destino ao mesmo tempo.
+
+    As colunas Recipient dos destinos são baixadas em paralelo enquanto a origem é lida uma única vez.
+    O resultado traz a união dos contatos novos e, para cada destino, as posições dos que faltam nele.
+    Um destino que falha é registrado no log sem interromper os demais.
+    """
+    queue.put(("buttons_state", "disabled"))
+    queue.put(("progress_start", f"Analisando contatos em {len(mailmerge_urls)} planilhas..."))
+    queue.put(("log", (f"Iniciando análise em {len(mailmerge_urls)} planilhas de destino...", "INFO")))
+    metrics.start("análise (vários destinos)")
+    status = "ok"
+    failed = (None, "Falha na análise. Verifique o log.", {"state": "disabled"}, {"state": "disabled"})
+    try:
+        if not all([mailmerge_urls, source_file]):
+            raise ValueError("Selecione as planilhas de destino e o arquivo de origem.")
+        if not json_path and not all(storage.is_local_url(url) for url in mailmerge_urls):
+            raise ValueError("O arquivo de chave JSON é obrigatório para planilhas do Google.")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(mailmerge_urls)) as executor:
+            fetch = metrics.propagate(_fetch_destination)
+            fetches = [(url, executor.submit(fetch, json_path, url, canonicalization, recipient_index))
+                       for url in mailmerge_urls]
+
+            queue.put(("log", ("Lendo arquivo de origem...", "INFO")))
+            sources = SourceSet(source_file, possible_name_cols, possible_email_cols,
+                                cache=_get_source_cache(source_cache))
+            deduper = RecipientDeduper(HashedMembership(), canonicalization)
+            blocos = []
+            for bloco in metrics.timed(sources.chunks(), "ler origem"):
+                with metrics.span("filtrar"):
+                    blocos.append(deduper.filter(bloco))
+            for mapping in sources.mappings:
+                queue.put(("log", (f"Mapeando {mapping}.", "INFO")))
+            for skipped in sources.skipped:
+                queue.put(("log", (f"Aba ignorada: {skipped}.", "WARNING")))
+            if sources.cache_hits:
+                queue.put(("log", (f"{sources.cache_hits} de {len(sources.tasks)} aba(s) lida(s) do cache de origens.",
+                                   "INFO")))
+            origem = pd.concat(blocos, ignore_index=True) if blocos else pd.DataFrame(columns=OUTPUT_COLUMNS)
+            queue.put(("log", (f"Encontrados {sources.rows_read} contatos no arquivo ({len(origem)} únicos).",
+                               "INFO")))
+            screener = _get_email_screener(email_screening)
+            motivos = _screen_reasons(screener, origem)
+            keys = canonicalize_emails(origem['Recipient'], canonicalization)
+
+            checked = []
+            for url, future in fetches:
+                try:
+                    with metrics.span("aguardar destinos"):
+                        title, existentes, detalhe = future.result()
+                except Exception as e:
+                    session.invalidate(json_path, url)
+                    queue.put(("log", (f"Destino ignorado ({url}): {_describe_error(e)}", "ERROR")))
+                    continue
+                faltando = ~existentes.contains_many(keys.to_numpy(dtype=object))
+                checked.append((url, title, faltando, existentes, detalhe))
+        if not checked:
+            raise ValueError("Nenhuma planilha de destino pôde ser consultada.")
+
+        # Contatos sinalizados pela triagem só entram no relatório, e apenas se faltarem em algum destino
+        em_algum = np.logical_or.reduce([faltando for _, _, faltando, _, _ in checked])
+        sinalizado = motivos.notna().to_numpy(dtype=bool)
+        em_algum_sinalizado, em_algum = em_algum & sinalizado, em_algum & ~sinalizado
+        # Uma edição na pré-visualização é recusada se o novo e-mail já estiver em qualquer um dos destinos
+        em_destinos = merge(existentes for _, _, _, existentes, _ in checked)
+        novos = ContactBatch.from_frame(origem[em_algum], em_destinos, canonicalization)
+        novos.flagged = _flagged_batch([_split_flagged(origem[em_algum_sinalizado],
+                                                       motivos[em_algum_sinalizado])[1]], queue)
+        novos.screener = screener
+        destinations: List[Destination] = []
+        for url, title, faltando, existentes, detalhe in checked:
+            positions = np.flatnonzero(faltando[em_algum])
+            destinations.append((url, title, positions))
+            extra = f" (índice local: {detalhe})" if detalhe else ""
+            queue.put(("log", (f"'{title}': {len(existentes)} contatos na planilha, {len(positions)} novos{extra}.",
+                               "INFO")))
+        queue.put(("log", (f"Análise concluída em {time.perf_counter() - started:.1f}s.", "SUCCESS")))
+
+        por_destino = ", ".join(f"{title}: {len(positions)}" for _, title, positions in destinations)
+        analysis_result_text = f"Arquivo: {sources.rows_read} contatos | NOVOS por planilha: {por_destino}"
+        if len(novos.flagged):
+            analysis_result_text += f" | SINALIZADOS: {len(novos.flagged)}"
+        # O intervalo não se aplica aqui (cada destino recebe a sua própria lista); o spinbox só exibe o total
+        spinbox_config = {"state": "disabled", "from_": 1, "to": len(novos), "start_value": 1,
+                          "end_value": len(novos)}
+        sync_button_config = {"state": "normal"} if len(novos) else {"state": "disabled"}
+        if not len(novos):
+            queue.put(("log", ("Nenhum novo contato para adicionar.", "WARNING")))
+        queue.put(("update_multi_analysis",
+                   (destinations, novos, analysis_result_text, spinbox_config, sync_button_config)))
+
+    except Exception as e:
+        status = "erro"
+        msg = f"{type(e).__name__} - {e}"
+        queue.put(("log", (msg, "ERROR")))
+        queue.put(("dialog", ("error", "Erro na Análise", f"Não foi possível completar a análise.\n\nDetalhe: {msg}")))
+        queue.put(("update_analysis", failed))
+    finally:
+        _log_metrics(queue, status)
+        queue.put(("progress_stop", None))
+        queue.put(("buttons_state", "normal"))
+
+
+def sync_multi_thread(json_path: str, destinations: List[Destination], is_dry_run: bool,
+                      contacts: ContactBatch, queue: Queue, sharding: Optional[Dict[str, Any]] = None) -> None:
+    """Sincroniza cada destino com os contatos que faltam nele, com todos os destinos escrevendo em paralelo."""
+    queue.put(("buttons_state", "disabled"))
+    queue.put(("progress_start", "Sincronizando contatos..."))
+    log_prefix = "SIMULAÇÃO" if is_dry_run else "SINCRONIZAÇÃO"
+    queue.put(("log", (f"Iniciando processo de {log_prefix.lower()} em {len(destinations)} planilhas...", "INFO")))
+    metrics.start(f"{log_prefix.lower()} (vários destinos)")
+    status = "ok"
+    try:
+        if contacts is None or contacts.empty:
+            raise ValueError("Nenhum novo parceiro para sincronizar.")
+        pending = [d for d in destinations if len(d[2])]
+        for _, title, _ in (d for d in destinations if not len(d[2])):
+            queue.put(("log", (f"'{title}': nenhum contato novo.", "INFO")))
+        total = sum(len(positions) for _, _, positions in pending)
+
+        if is_dry_run:
+            for _, title, positions in pending:
+                queue.put(("log", (f"MODO SIMULAÇÃO: '{title}': {len(positions)} linhas seriam adicionadas.",
+                                   "SUCCESS")))
+            queue.put(("dialog", ("info", "Simulação Concluída",
+                                  f"{total} linhas seriam adicionadas em {len(pending)} planilhas.")))
+            return
+
+        progress_lock = threading.Lock()
+        # Linhas enviadas e total a enviar; o total diminui quando uma retomada pula linhas já presentes
+        written, to_write = [0], [total]
+
+        def sync_one(destination: Destination) -> Tuple[str, int, Optional[str]]:
+            url, title, positions = destination
+            appender = None
+            discounted = [False]
+
+            def report_chunk(chunk_rows: int, total_written: int, elapsed: float, to_send: int) -> None:
+                with progress_lock:
+                    if not discounted[0]:
+                        to_write[0] -= len(positions) - to_send
+                        discounted[0] = True
+                    written[0] += chunk_rows
+                    done, goal = written[0], to_write[0]
+                queue.put(("log", (f"'{title}': lote de {chunk_rows} linhas enviado em {elapsed:.1f}s "
+                                   f"({total_written}/{to_send}).", "INFO")))
+                queue.put(("progress_update", f"Sincronizando contatos... {done}/{goal}"))
+
+            try:
+                appender = ChunkedAppender(storage.open_store(json_path, url, _shard_limit(sharding)))
+                version_before = _version_before_writes(appender.store)
+                sent = _write_journaled(appender, url, contacts.take(positions), queue, report_chunk, f"'{title}': ")
+                _record_own_writes(appender.store, url, version_before)
+                _log_created_shards(appender.store, queue, f"'{title}': ")
+                return title, sent, None
+            except Exception as e:
+                session.invalidate(json_path, url)
+                return title, appender.rows_written if appender else 0, _describe_error(e)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, len(pending))) as executor:
+            results = list(executor.map(metrics.propagate(sync_one), pending))
+        for title, rows_written, error in results:
+            if error is None:
+                queue.put(("log", (f"SUCESSO! '{title}': {rows_written} novas linhas adicionadas.", "SUCCESS")))
+            else:
+                queue.put(("log", (f"ERRO NA {log_prefix} de '{title}' ({rows_written} linhas já adicionadas): "
+                                   f"{error}", "ERROR")))
+        queue.put(("log", (f"{len(pending)} planilhas processadas em {time.perf_counter() - started:.1f}s.", "INFO")))
+        failures = [title for title, _, error in results if error is not None]
+        # Linhas de fato enviadas: uma retomada pula as que já estavam no destino e uma falha para no meio
+        sent_total = sum(rows_written for _, rows_written, _ in results)
+        if failures:
+            status = "parcial"
+            queue.put(("dialog", ("warning", "Sincronização Incompleta",
+                                  f"{len(pending) - len(failures)} de {len(pending)} planilhas sincronizadas "
+                                  f"({sent_total} linhas adicionadas). Falharam: {', '.join(failures)}. "
+                                  f"Verifique o log.")))
+        else:
+            queue.put(("dialog", ("info", "Sincronização Concluída",
+                                  f"{sent_total} linhas adicionadas em {len(pending)} planilhas.")))
+
+    except Exception as e:
+        status = "erro"
+        msg = f"ERRO NA {log_prefix}: {type(e).__name__} - {e}"
+        queue.put(("log", (msg, "ERROR")))
+        queue.put(("dialog", ("error", f"Erro na {log_prefix}",
+                              f"Não foi possível sincronizar os dados.\n\nDetalhe: {e}")))
+    finally:
+        _log_metrics(queue, status)
+        queue.put(("progress_stop", None))
+        queue.put(("buttons_state", "normal"))
+        if status == "parcial":
+            queue.put(("log", ("Clique em SINCRONIZAR novamente para retomar: o que já chegou a cada planilha não "
+                               "será reenviado.", "WARNING")))
+        else:
+            queue.put(("update_analysis",
+                       (None, "Execute uma nova análise para continuar.", {"state": "disabled"}, {"state": "disabled"})))
+        queue.put(("log", ("Processo finalizado.", "INFO")))
@@ -1,10 +1,13 @@
+from src import startup_profile  # Primeiro import: marca o início da medição da inicialização
 import ttkbootstrap as ttk
 from tkinter import TclError
 from src.gui import AppGUI
 import os
+import multiprocessing
 
 def main():
     """Função principal que inicia o aplicativo."""
+    startup_profile.mark("importações")
     root = ttk.Window()
     root.minsize(900, 720)
 
@@ -21,10 +24,13 @@ def main():
     root.bind("<Escape>", lambda e: root.attributes("-fullscreen", False))
     root.title("Projeto RBCTur")
     root.geometry("1024x768")
+    startup_profile.mark("janela")
 
     AppGUI(root)
 
     root.mainloop()
 
 if __name__ == "__main__":
+    # Necessário para o pool de processos da leitura paralela no executável gerado pelo cx_Freeze
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,120 @@
+from typing import Any, Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def _hash(keys: np.ndarray) -> np.ndarray:
+    return pd.util.hash_array(keys, categorize=False)
+
+
+def _compact(values: np.ndarray) -> np.ndarray:
+    """Usa 32 bits para posições e deslocamentos enquanto couberem (até 4 GB de chaves)."""
+    return values.astype(np.uint32) if not len(values) or values.max() < 2 ** 32 else values.astype(np.int64)
+
+
+class HashedMembership:
+    """Conjunto compacto de chaves (e-mails canônicos) para listas de destinatários muito grandes.
+
+    Em vez de um ``set`` de objetos ``str``, guarda os hashes de 64 bits ordenados e todas as chaves em um
+    único bloco de bytes UTF-8 com seus deslocamentos: 16 bytes por chave além do próprio texto, contra
+    mais de 100 bytes de um ``str`` num ``set``.
+    A consulta de muitas chaves é vetorizada (``searchsorted``); só quando o hash coincide a chave é
+    comparada byte a byte, de modo que uma colisão nunca gera um falso positivo.
+    """
+
+    __slots__ = ("_hashes", "_slots", "_offsets", "_blob")
+
+    def __init__(self, keys: Iterable[Any] = ()) -> None:
+        self._hashes = np.empty(0, dtype=np.uint64)
+        # Posição de cada hash (na ordem dos hashes) no bloco de bytes, que fica na ordem de inserção
+        self._slots = np.empty(0, dtype=np.uint32)
+        self._offsets = np.zeros(1, dtype=np.uint32)
+        self._blob = b""
+        self._add(keys)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __iter__(self) -> Iterator[str]:
+        blob, offsets = self._blob, self._offsets
+        return (blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(self)))
+
+    def __contains__(self, key: Any) -> bool:
+        return bool(self.contains_many([key])[0])
+
+    @property
+    def nbytes(self) -> int:
+        return self._hashes.nbytes + self._slots.nbytes + self._offsets.nbytes + len(self._blob)
+
+    def union(self, keys: Iterable[Any]) -> 'HashedMembership':
+        """Novo conjunto com as chaves deste e as de ``keys`` (este não é alterado)."""
+        merged = HashedMembership()
+        merged._hashes, merged._slots = self._hashes, self._slots
+        merged._offsets, merged._blob = self._offsets, self._blob
+        merged._add(keys)
+        return merged
+
+    def contains_many(self, keys: Iterable[Any]) -> np.ndarray:
+        """Retorna um array booleano dizendo, para cada chave, se ela está no conjunto (vazios nunca estão)."""
+        values = np.asarray(keys if isinstance(keys, (np.ndarray, pd.Series)) else list(keys), dtype=object)
+        return self._contains(values, _hash(values)) if len(values) else np.zeros(0, dtype=bool)
+
+    def _contains(self, values: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(values), dtype=bool)
+        total = len(self._hashes)
+        if not total:
+            return found
+        positions = np.searchsorted(self._hashes, hashes)
+        candidates = np.flatnonzero(self._hashes[np.minimum(positions, total - 1)] == hashes)
+        candidates = candidates[positions[candidates] < total]
+        # Confirmação exata contra a primeira chave com o mesmo hash; as demais (colisões) só se ela diferir
+        slots = self._slots[positions[candidates]]
+        blob = self._blob
+        exact = [isinstance(value, str) and blob[start:end] == value.encode("utf-8")
+                 for value, start, end in zip(values[candidates].tolist(), self._offsets[slots].tolist(),
+                                              self._offsets[slots + 1].tolist())]
+        found[candidates] = exact
+        for i in candidates[~np.asarray(exact, dtype=bool)]:
+            found[i] = self._confirm(values[i], hashes[i], positions[i] + 1)
+        return found
+
+    def _confirm(self, key: Any, key_hash: np.uint64, position: int) -> bool:
+        if not isinstance(key, str):
+            return False
+        encoded = key.encode("utf-8")
+        # Chaves diferentes com o mesmo hash ficam lado a lado no array ordenado
+        while position < len(self._hashes) and self._hashes[position] == key_hash:
+            slot = self._slots[position]
+            if self._blob[self._offsets[slot]:self._offsets[slot + 1]] == encoded:
+                return True
+            position += 1
+        return False
+
+    def _add(self, keys: Iterable[Any]) -> None:
+        values = pd.unique(np.asarray(keys if isinstance(keys, (np.ndarray, pd.Series)) else list(keys),
+                                      dtype=object))
+        values = np.asarray([value for value in values if isinstance(value, str)], dtype=object)
+        if not len(values):
+            return
+        hashes = _hash(values)
+        new = ~self._contains(values, hashes)
+        values, hashes = values[new], hashes[new]
+        encoded = [value.encode("utf-8") for value in values]
+        first_slot = len(self._offsets) - 1
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        self._offsets = _compact(np.concatenate([self._offsets, int(self._offsets[-1]) + np.cumsum(lengths)]))
+        self._blob = self._blob + b"".join(encoded)
+        all_hashes = np.concatenate([self._hashes, hashes])
+        all_slots = np.concatenate([self._slots.astype(np.int64), np.arange(first_slot, first_slot + len(values))])
+        order = np.argsort(all_hashes, kind="stable")
+        self._hashes, self._slots = all_hashes[order], _compact(all_slots[order])
+
+
+def merge(memberships: Iterable[Optional[HashedMembership]]) -> HashedMembership:
+    """União de vários conjuntos (por exemplo, os destinatários de várias planilhas de destino)."""
+    merged = HashedMembership()
+    for membership in memberships:
+        if membership is not None:
+            merged = merged.union(membership) if len(merged) else membership
+    return merged
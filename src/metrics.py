@@ -0,0 +1,165 @@
+"""Métricas de desempenho das operações: fases cronometradas e contadores de chamadas à API.
+
+Cada operação registra num ``Recorder`` ligado à thread que a executa (``start``/``finish``). ``span``,
+``count`` e ``timed`` não fazem nada quando a thread não tem gravador, de modo que o código instrumentado
+funciona também fora das operações. Ao final, o resumo vai para o log e uma linha JSON é acrescentada a
+``logs/metrics.jsonl`` (com rotação), para agregar os números de várias estações de trabalho.
+"""
+import functools
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+METRICS_FILE = os.path.join("logs", "metrics.jsonl")
+MAX_FILE_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 5
+
+_local = threading.local()
+_writer_lock = threading.Lock()
+_writer: Optional[logging.Logger] = None
+
+
+class Recorder:
+    """Acumula a duração de cada fase (somada entre threads) e os contadores de uma operação."""
+
+    def __init__(self, operation: str) -> None:
+        self.operation = operation
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.total_seconds = 0.0
+        self.spans: Dict[str, List[float]] = {}
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, seconds: float) -> None:
+        with self._lock:
+            span = self.spans.setdefault(name, [0.0, 0])
+            span[0] += seconds
+            span[1] += 1
+
+    def count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self) -> str:
+        parts = [f"total {self.total_seconds:.2f}s"]
+        parts.extend(f"{name} {seconds * 1000:.0f} ms" for name, (seconds, _) in self.spans.items())
+        if "api_calls" in self.counters:
+            traffic = f"{int(self.counters['api_calls'])} chamada(s) à API"
+            if self.counters.get("bytes_received") or self.counters.get("bytes_sent"):
+                traffic += (f", {self.counters.get('bytes_received', 0) / 1024:.1f} KB recebidos, "
+                            f"{self.counters.get('bytes_sent', 0) / 1024:.1f} KB enviados")
+            parts.append(traffic)
+        if self.counters.get("api_retries"):
+            parts.append(f"{int(self.counters['api_retries'])} nova(s) tentativa(s) após erro de cota ou de rede")
+        return f"Métricas ({self.operation}): {' | '.join(parts)}"
+
+    def to_record(self, status: str) -> Dict[str, Any]:
+        return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+                "host": socket.gethostname(), "operation": self.operation, "status": status,
+                "total_ms": round(self.total_seconds * 1000, 1),
+                "spans": {name: {"ms": round(seconds * 1000, 1), "count": count}
+                          for name, (seconds, count) in self.spans.items()},
+                "counters": self.counters}
+
+
+def start(operation: str) -> Recorder:
+    """Começa a gravar as métricas de uma operação na thread atual."""
+    recorder = Recorder(operation)
+    _local.recorder = recorder
+    return recorder
+
+
+def current() -> Optional[Recorder]:
+    return getattr(_local, "recorder", None)
+
+
+def finish(status: str = "ok") -> Optional[Recorder]:
+    """Encerra a gravação da thread atual e acrescenta o registro ao arquivo de métricas."""
+    recorder = current()
+    _local.recorder = None
+    if recorder is None:
+        return None
+    recorder.total_seconds = time.perf_counter() - recorder._started
+    _write(recorder.to_record(status))
+    return recorder
+
+
+def propagate(function: Callable[..., Any]) -> Callable[..., Any]:
+    """Faz ``function`` gravar no gravador da thread atual mesmo quando executada por outra (ex.: num pool)."""
+    recorder = current()
+
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        previous = current()
+        _local.recorder = recorder
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _local.recorder = previous
+    return wrapper
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder = current()
+        if recorder is not None:
+            recorder.add_span(name, time.perf_counter() - started)
+
+
+def count(name: str, amount: float = 1) -> None:
+    recorder = current()
+    if recorder is not None:
+        recorder.count(name, amount)
+
+
+def timed(iterable: Iterable[Any], name: str) -> Iterator[Any]:
+    """Percorre ``iterable`` somando em ``name`` apenas o tempo gasto para produzir cada item."""
+    iterator = iter(iterable)
+    while True:
+        with span(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def record(operation: str, spans: Dict[str, float], status: str = "ok") -> str:
+    """Grava uma medição avulsa (por exemplo, da interface) e retorna o seu resumo."""
+    recorder = Recorder(operation)
+    for name, seconds in spans.items():
+        recorder.add_span(name, seconds)
+    recorder.total_seconds = sum(spans.values())
+    _write(recorder.to_record(status))
+    return recorder.summary()
+
+
+def _write(entry: Dict[str, Any]) -> None:
+    global _writer
+    try:
+        with _writer_lock:
+            if _writer is None:
+                os.makedirs(os.path.dirname(METRICS_FILE), exist_ok=True)
+                handler = RotatingFileHandler(METRICS_FILE, maxBytes=MAX_FILE_BYTES, backupCount=BACKUP_COUNT,
+                                              encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                writer = logging.getLogger("sincronizador.metrics")
+                writer.setLevel(logging.INFO)
+                writer.propagate = False
+                writer.addHandler(handler)
+                _writer = writer
+        _writer.info(json.dumps(entry, ensure_ascii=False))
+    except OSError:
+        # Métricas nunca devem interromper a operação (ex.: pasta sem permissão de escrita)
+        pass
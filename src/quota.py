@@ -0,0 +1,192 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src import metrics
+
+READ = "read"
+WRITE = "write"
+
+# O Google Sheets permite 60 leituras e 60 escritas por minuto por usuário; o padrão fica logo abaixo
+DEFAULT_REQUESTS_PER_MINUTE = 55
+# Respostas da API que indicam uma falha passageira do servidor
+TRANSIENT_STATUS = frozenset({500, 502, 503, 504})
+
+
+class StoreQuotaError(Exception):
+    """Erro de cota (equivalente ao HTTP 429) levantado por um destino."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Balde de fichas reposto continuamente: até ``per_minute`` chamadas por minuto, com rajadas do mesmo tamanho.
+
+    Após um erro de cota nenhuma ficha sai até o fim da espera pedida pela API (ou da espera exponencial) e a
+    taxa cai um quarto, até no mínimo a metade; as fichas que já estavam no balde são mantidas. Cada chamada
+    bem-sucedida depois da espera devolve um quarto da taxa configurada.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self.per_minute = float(per_minute)
+        self.rate = self.per_minute / 60.0
+        self.tokens = self.per_minute
+        self.updated = time.monotonic()
+        self.held_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.per_minute, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """Reserva uma ficha e retorna quantos segundos esperar por ela (as reservas são atendidas em ordem)."""
+        self._refill(max(now, self.held_until))
+        self.tokens -= 1
+        wait = max(0.0, self.held_until - now)
+        return wait + (-self.tokens / self.rate if self.tokens < 0 else 0.0)
+
+    def throttle(self, now: float, seconds: float) -> None:
+        self._refill(now)
+        self.rate = max(self.per_minute / 60.0 / 2, self.rate * 0.75)
+        self.held_until = max(self.held_until, now + seconds)
+        # Durante a espera o balde não se enche; o saldo anterior continua valendo depois dela
+        self.updated = max(self.updated, self.held_until)
+
+    def recover(self, now: float) -> None:
+        if now >= self.held_until:
+            self.rate = min(self.per_minute / 60.0, self.rate + self.per_minute / 60.0 / 4)
+
+    def available(self, now: float) -> float:
+        if now < self.held_until:
+            return 0.0
+        self._refill(now)
+        return max(0.0, self.tokens)
+
+
+def _retry_after(response: Any) -> Optional[float]:
+    """Segundos indicados no cabeçalho Retry-After (em segundos ou como data HTTP)."""
+    value = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def classify(error: Exception) -> Tuple[Optional[str], Optional[float]]:
+    """Retorna (tipo, espera sugerida): ``"cota"``, ``"transitório"`` ou None se o erro não se resolve sozinho."""
+    from requests.exceptions import ConnectionError, Timeout
+
+    if isinstance(error, StoreQuotaError):
+        return "cota", error.retry_after
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if status == 429:
+        return "cota", _retry_after(response)
+    if status in TRANSIENT_STATUS:
+        return "transitório", _retry_after(response)
+    if isinstance(error, (ConnectionError, Timeout)):
+        return "transitório", None
+    return None, None
+
+
+class QuotaGovernor:
+    """Limite de chamadas à API compartilhado por todas as threads do processo, com novas tentativas.
+
+    Leituras e escritas têm baldes separados (``read_requests_per_minute``/``write_requests_per_minute``;
+    0 desativa o limite). Erros de cota são repetidos após a espera pedida pela API (Retry-After) ou com espera
+    exponencial, sempre com uma variação aleatória para que as threads não voltem todas ao mesmo tempo. Falhas
+    passageiras do servidor ou da rede só são repetidas em chamadas idempotentes: um ``append`` que pode ter
+    chegado ao destino fica para o diário da sincronização.
+    """
+
+    def __init__(self, options: Optional[Dict[str, Any]] = None, sleep: Callable[[float], None] = time.sleep) -> None:
+        self._lock = threading.Lock()
+        self._sleep = sleep
+        self._random = random.Random()
+        self.buckets: Dict[str, Optional[TokenBucket]] = {}
+        self.configure(options)
+
+    def configure(self, options: Optional[Dict[str, Any]] = None) -> None:
+        options = options or {}
+        with self._lock:
+            for kind in (READ, WRITE):
+                per_minute = float(options.get(f"{kind}_requests_per_minute", DEFAULT_REQUESTS_PER_MINUTE))
+                self.buckets[kind] = TokenBucket(per_minute) if per_minute > 0 else None
+            self.max_retries = int(options.get("max_retries", 6))
+            self.base_delay = float(options.get("base_backoff_seconds", 1.0))
+            self.max_delay = float(options.get("max_backoff_seconds", 64.0))
+
+    def call(self, kind: str, function: Callable[..., Any], *args: Any, idempotent: bool = True,
+             **kwargs: Any) -> Any:
+        """Executa ``function(*args, **kwargs)`` dentro do limite de ``kind`` (READ ou WRITE), repetindo se preciso."""
+        attempt = 0
+        while True:
+            self._acquire(kind)
+            try:
+                result = function(*args, **kwargs)
+            except Exception as error:
+                reason, retry_after = classify(error)
+                if reason is None or (reason != "cota" and not idempotent) or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, retry_after)
+                metrics.count("api_retries")
+                attempt += 1
+                with self._lock:
+                    bucket = self.buckets.get(kind) if reason == "cota" else None
+                    if bucket is not None:
+                        # A espera vale para todas as threads: a próxima reserva de ficha só sai depois dela
+                        bucket.throttle(time.monotonic(), delay)
+                if bucket is None:
+                    with metrics.span("aguardar cota"):
+                        self._sleep(delay)
+                continue
+            with self._lock:
+                bucket = self.buckets.get(kind)
+                if bucket is not None:
+                    bucket.recover(time.monotonic())
+            return result
+
+    def _acquire(self, kind: str) -> None:
+        with self._lock:
+            bucket = self.buckets.get(kind)
+            wait = bucket.reserve(time.monotonic()) if bucket is not None else 0.0
+        if wait > 0:
+            with metrics.span("aguardar cota"):
+                self._sleep(wait)
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        delay = retry_after if retry_after is not None else min(self.max_delay, self.base_delay * 2 ** attempt)
+        # A variação é proporcional à espera, para não multiplicar uma espera curta pedida pela API
+        return delay + self._random.uniform(0, min(self.base_delay, delay) / 2)
+
+    def headroom(self) -> Dict[str, Optional[Tuple[float, float]]]:
+        """Fichas disponíveis agora e o limite por minuto de cada tipo (None quando não há limite)."""
+        now = time.monotonic()
+        with self._lock:
+            return {kind: (bucket.available(now), bucket.per_minute) if bucket is not None else None
+                    for kind, bucket in self.buckets.items()}
+
+    def describe(self) -> str:
+        """Resumo curto da folga de cota, para a barra de status."""
+        labels = {READ: "leituras", WRITE: "escritas"}
+        parts = [f"{labels[kind]} {int(value[0])}/{int(value[1])}" if value is not None
+                 else f"{labels[kind]} sem limite" for kind, value in self.headroom().items()]
+        return f"Cota da API disponível: {' | '.join(parts)} por minuto"
+
+
+governor = QuotaGovernor()
+
+
+def configure(options: Optional[Dict[str, Any]]) -> None:
+    """Aplica ``app_settings.quota`` ao limite compartilhado."""
+    governor.configure(options)
@@ -0,0 +1,152 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.canonical import canonical_key_set
+from src.membership import HashedMembership, merge
+from src.storage import DestinationStore
+
+DEFAULT_INDEX_PATH = os.path.join("cache", "recipient_index.db")
+
+
+class RecipientIndex:
+    """Índice local (SQLite) das chaves canônicas da coluna Recipient de cada aba das planilhas de destino.
+
+    A cada análise só as linhas adicionadas desde a última leitura são baixadas: uma leitura da coluna
+    a partir da última linha conhecida confirma que ela não mudou e traz as novas. Cada aba tem o seu
+    índice, e as abas de uma planilha são lidas juntas numa única chamada.
+
+    Uma edição acima da última linha conhecida não aparece nessa leitura; por isso o índice guarda a marca
+    de alteração da planilha (``DestinationStore.modified_time``) vista na última leitura ou deixada pelas
+    nossas próprias sincronizações (``record_own_writes``). Se a marca mudou por outro motivo, se a planilha
+    foi limpa, se a normalização mudou ou se o índice ficou velho demais, o índice é refeito.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_INDEX_PATH, max_age_hours: float = 24.0) -> None:
+        self.db_path = db_path
+        self.max_age_seconds = max_age_hours * 3600
+        # Uma trava por planilha: destinos diferentes podem ser atualizados em paralelo
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        # Mantém os conjuntos já carregados para que reanálises no mesmo processo nem consultem o disco
+        self._memory: Dict[str, HashedMembership] = {}
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS planilhas (
+                url TEXT PRIMARY KEY, assinatura TEXT NOT NULL, linhas INTEGER NOT NULL,
+                ultimo_valor TEXT NOT NULL, reconstruido_em REAL NOT NULL)""")
+            conn.execute("CREATE TABLE IF NOT EXISTS emails (url TEXT NOT NULL, chave TEXT NOT NULL, "
+                         "PRIMARY KEY (url, chave)) WITHOUT ROWID")
+            conn.execute("CREATE TABLE IF NOT EXISTS versoes (url TEXT PRIMARY KEY, versao TEXT NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def refresh(self, store: DestinationStore, mailmerge_url: str, col_index: int,
+                options: Optional[Dict[str, Any]] = None) -> Tuple[HashedMembership, str]:
+        """Atualiza o índice de cada aba da planilha e retorna (chaves existentes, descrição do que foi feito)."""
+        signature = json.dumps({"col": col_index, "options": options or {}}, sort_keys=True)
+        with self._lock:
+            url_lock = self._url_locks.setdefault(mailmerge_url, threading.Lock())
+        with url_lock:
+            # A marca é lida antes dos dados: uma edição durante a leitura muda a marca e refaz o próximo índice
+            version = store.modified_time()
+            shards = store.shards()
+            # A primeira aba usa a própria URL como chave, como antes da divisão em abas
+            index_keys = {shard: mailmerge_url if i == 0 else f"{mailmerge_url}#{shard}"
+                          for i, shard in enumerate(shards)}
+            with self._connect() as conn:
+                metas = {shard: conn.execute("SELECT assinatura, linhas, ultimo_valor, reconstruido_em FROM planilhas "
+                                             "WHERE url = ?", (key,)).fetchone() for shard, key in index_keys.items()}
+                trusted = conn.execute("SELECT versao FROM versoes WHERE url = ?", (mailmerge_url,)).fetchone()
+            now = time.time()
+            stale = {shard for shard, meta in metas.items()
+                     if meta is None or meta[0] != signature or now - meta[3] > self.max_age_seconds}
+            edited = version is not None and (trusted is None or trusted[0] != version)
+            if edited:
+                stale.update(shards)
+
+            # Uma única leitura para todas as abas; em cada uma, a leitura começa na última linha conhecida,
+            # que serve de verificação de integridade
+            start_rows = {shard: metas[shard][1] + 1 if shard not in stale and metas[shard][1] else 2
+                          for shard in shards}
+            columns = {shard: values[0] for shard, values in store.read_shards([col_index], start_rows).items()}
+            changed = [shard for shard in shards if start_rows[shard] > 2
+                       and (not columns[shard] or columns[shard][0] != metas[shard][2])]
+            if changed:
+                # Abas limpas ou editadas desde a última análise são relidas inteiras
+                columns.update((shard, values[0]) for shard, values in
+                               store.read_shards([col_index], {shard: 2 for shard in changed}).items())
+                stale.update(changed)
+
+            memberships = []
+            new_rows = 0
+            for shard in shards:
+                if shard in stale:
+                    memberships.append(self._rebuild(index_keys[shard], columns[shard], options, signature))
+                else:
+                    values = columns[shard][1:] if start_rows[shard] > 2 else columns[shard]
+                    new_rows += len(values)
+                    memberships.append(self._extend(index_keys[shard], values, metas[shard][1], metas[shard][2],
+                                                    options))
+
+            if version is not None:
+                with self._connect() as conn:
+                    conn.execute("INSERT OR REPLACE INTO versoes (url, versao) VALUES (?, ?)", (mailmerge_url, version))
+
+            details = []
+            if edited and trusted is not None:
+                details.append("planilha alterada desde a última leitura, reconstruído")
+            elif stale:
+                details.append("reconstruído" if len(shards) == 1 else
+                               f"{len(stale)} de {len(shards)} abas reconstruídas")
+            if len(stale) < len(shards):
+                details.append(f"{new_rows} linha(s) nova(s) desde a última análise")
+            return merge(memberships), "; ".join(details)
+
+    def record_own_writes(self, mailmerge_url: str, before: Optional[str], after: Optional[str]) -> None:
+        """Registra que a planilha passou da marca ``before`` para ``after`` só com linhas adicionadas por nós.
+
+        A próxima leitura incremental encontra essas linhas. Se a marca confiável já não era ``before``
+        (alguém alterou a planilha antes), nada muda e o próximo índice é refeito.
+        """
+        if before is None or after is None:
+            return
+        with self._connect() as conn:
+            conn.execute("UPDATE versoes SET versao = ? WHERE url = ? AND versao = ?", (after, mailmerge_url, before))
+
+    def _extend(self, index_key: str, values: List[str], known_rows: int, last_value: str,
+                options: Optional[Dict[str, Any]]) -> HashedMembership:
+        """Acrescenta ao índice de uma aba as linhas adicionadas desde a última leitura."""
+        new_keys = canonical_key_set(values, options)
+        with self._connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO emails (url, chave) VALUES (?, ?)",
+                             ((index_key, k) for k in new_keys))
+            conn.execute("UPDATE planilhas SET linhas = ?, ultimo_valor = ? WHERE url = ?",
+                         (known_rows + len(values), values[-1] if values else last_value, index_key))
+            keys = self._memory.get(index_key)
+            if keys is None:
+                keys = HashedMembership(k for (k,) in conn.execute("SELECT chave FROM emails WHERE url = ?",
+                                                                   (index_key,)))
+        # O conjunto é imutável: quem recebeu o anterior (por exemplo, uma análise em curso) não é afetado
+        if len(new_keys):
+            keys = keys.union(new_keys)
+        self._memory[index_key] = keys
+        return keys
+
+    def _rebuild(self, index_key: str, values: List[str], options: Optional[Dict[str, Any]],
+                 signature: str) -> HashedMembership:
+        keys = canonical_key_set(values, options)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM emails WHERE url = ?", (index_key,))
+            conn.executemany("INSERT INTO emails (url, chave) VALUES (?, ?)", ((index_key, k) for k in keys))
+            conn.execute("INSERT OR REPLACE INTO planilhas (url, assinatura, linhas, ultimo_valor, reconstruido_em) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         (index_key, signature, len(values), values[-1] if values else "", time.time()))
+        self._memory[index_key] = keys
+        return keys
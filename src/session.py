@@ -0,0 +1,84 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Tuple
+
+import gspread
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+
+from src import metrics, quota
+
+SCOPES_SVC = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+# Renova o token com esta antecedência, para que nenhuma operação pague a latência da renovação
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+
+def _count_response(response: Any, *args: Any, **kwargs: Any) -> None:
+    """Gancho da sessão HTTP: contabiliza cada chamada à API e os bytes trafegados na operação atual."""
+    metrics.count("api_calls")
+    metrics.count("bytes_received", len(response.content))
+    body = response.request.body
+    if body:
+        metrics.count("bytes_sent", len(body))
+
+
+class _CachedClient:
+    def __init__(self, json_path: str) -> None:
+        self.credentials = Credentials.from_service_account_file(json_path, scopes=SCOPES_SVC)
+        self.client = gspread.authorize(self.credentials)
+        self.client.http_client.session.hooks["response"].append(_count_response)
+        self.lock = threading.Lock()
+
+    def ensure_fresh(self) -> None:
+        with self.lock:
+            expiry = self.credentials.expiry
+            if expiry is not None and expiry.tzinfo is None:
+                expiry = expiry.replace(tzinfo=timezone.utc)
+            if (not self.credentials.valid or expiry is None
+                    or expiry - datetime.now(timezone.utc) < TOKEN_REFRESH_MARGIN):
+                self.credentials.refresh(Request())
+
+
+_lock = threading.Lock()
+_clients: Dict[Tuple[str, float], _CachedClient] = {}
+_worksheets: Dict[Tuple[str, str], Tuple[gspread.Spreadsheet, gspread.Worksheet]] = {}
+
+
+def _client_key(json_path: str) -> Tuple[str, float]:
+    # A data de modificação entra na chave para que um arquivo de chave substituído gere um novo cliente
+    path = os.path.abspath(json_path)
+    return path, os.path.getmtime(path)
+
+
+def get_client(json_path: str) -> gspread.Client:
+    """Retorna um cliente autenticado compartilhado pelo processo, com o token sempre válido."""
+    key = _client_key(json_path)
+    with metrics.span("autenticação"):
+        with _lock:
+            cached = _clients.get(key)
+            if cached is None:
+                cached = _clients[key] = _CachedClient(json_path)
+        cached.ensure_fresh()
+    return cached.client
+
+
+def get_worksheet(json_path: str, mailmerge_url: str) -> Tuple[gspread.Spreadsheet, gspread.Worksheet]:
+    """Retorna a planilha e sua primeira aba, abrindo-as apenas na primeira chamada."""
+    client = get_client(json_path)
+    key = (os.path.abspath(json_path), mailmerge_url)
+    with _lock:
+        cached = _worksheets.get(key)
+    if cached is None:
+        with metrics.span("abrir planilha"):
+            spreadsheet = quota.governor.call(quota.READ, client.open_by_url, mailmerge_url)
+            cached = (spreadsheet, spreadsheet.get_worksheet(0))
+        with _lock:
+            _worksheets[key] = cached
+    return cached
+
+
+def invalidate(json_path: str, mailmerge_url: str) -> None:
+    """Descarta a planilha em cache (por exemplo, após um erro), forçando uma nova abertura."""
+    with _lock:
+        _worksheets.pop((os.path.abspath(json_path or ''), mailmerge_url), None)
@@ -0,0 +1,191 @@
+import hashlib
+import importlib.util
+import json
+import os
+import pickle
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join("cache", "sources")
+DEFAULT_MAX_MEGABYTES = 500
+HASH_BLOCK_SIZE = 1024 * 1024
+# Muda quando a forma dos dados guardados muda, para que entradas antigas não sejam reaproveitadas
+CACHE_FORMAT = 2
+
+# Parquet quando o pyarrow está instalado; caso contrário, pickle (também evita reinterpretar o Excel)
+_USE_PARQUET = importlib.util.find_spec("pyarrow") is not None
+_DATA_EXTENSION = ".parquet" if _USE_PARQUET else ".pkl"
+
+
+def file_digest(path: str) -> str:
+    """Hash do conteúdo do arquivo (lido em blocos, sem carregá-lo inteiro na memória)."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_values(df: pd.DataFrame) -> pd.DataFrame:
+    """Valores como texto e células vazias como None: a forma única dos contatos, lidos da origem ou do cache.
+
+    O Parquet guarda as colunas como texto; normalizar a leitura direta do mesmo jeito faz com que uma
+    análise com o cache vazio e outra com o cache cheio recebam exatamente os mesmos valores.
+    """
+    values = df.astype(object)
+    return values.astype(str).astype(object).where(values.notna(), None)
+
+
+def _read_pickles(path: str) -> pd.DataFrame:
+    """Lê os blocos gravados um após o outro no mesmo arquivo (entradas antigas têm um único bloco)."""
+    frames = []
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                frames.append(pickle.load(f))
+            except EOFError:
+                break
+    if not frames:
+        raise EOFError(path)
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+class CacheEntryWriter:
+    """Grava uma entrada do cache um bloco por vez, sem juntar a aba inteira na memória.
+
+    Os blocos vão para um arquivo temporário (Parquet via ``ParquetWriter`` ou pickles em sequência), que só
+    é renomeado em ``commit``; ``abort`` descarta a entrada se a leitura não chegou ao fim.
+    """
+
+    def __init__(self, cache: 'SourceCache', key: str, columns: Sequence[str]) -> None:
+        self.cache = cache
+        self.columns = list(columns)
+        os.makedirs(cache.cache_dir, exist_ok=True)
+        self.data_path, self.meta_path = cache._paths(key)
+        self._tmp_suffix = f".{uuid.uuid4().hex}.tmp"
+        self._output: Any = None
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        tmp_path = self.data_path + self._tmp_suffix
+        if _USE_PARQUET:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = pa.schema([(column, pa.string()) for column in self.columns])
+            table = pa.Table.from_pandas(chunk.astype("string"), schema=schema, preserve_index=False)
+            if self._output is None:
+                self._output = pq.ParquetWriter(tmp_path, schema)
+            self._output.write_table(table)
+        else:
+            if self._output is None:
+                self._output = open(tmp_path, 'wb')
+            pickle.dump(chunk, self._output, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def commit(self, rows: int, mapping: str) -> None:
+        if self._output is None:
+            self.write(pd.DataFrame(columns=self.columns, dtype=object))
+        self._output.close()
+        with open(self.meta_path + self._tmp_suffix, 'w', encoding='utf-8') as f:
+            json.dump({"rows": rows, "mapping": mapping}, f, ensure_ascii=False)
+        # Renomeia no fim, para que leitores concorrentes nunca vejam uma entrada pela metade
+        os.replace(self.data_path + self._tmp_suffix, self.data_path)
+        os.replace(self.meta_path + self._tmp_suffix, self.meta_path)
+        self.cache.evict()
+
+    def abort(self) -> None:
+        if self._output is not None:
+            self._output.close()
+        for path in (self.data_path + self._tmp_suffix, self.meta_path + self._tmp_suffix):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class SourceCache:
+    """Cache em disco das colunas de nome e e-mail já extraídas de cada aba dos arquivos de origem.
+
+    A chave combina caminho, tamanho, data de modificação e hash do conteúdo do arquivo, além da aba e das
+    colunas aceitas; qualquer alteração no arquivo gera uma nova entrada. As entradas menos usadas
+    recentemente são apagadas quando o total passa de ``max_megabytes``. O objeto é serializável para
+    que os processos de leitura paralela também consultem e gravem o cache.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_megabytes: float = DEFAULT_MAX_MEGABYTES) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_megabytes * 1024 * 1024)
+
+    def key(self, source_file: str, sheet_name: Optional[str], possible_name_cols: List[str],
+            possible_email_cols: List[str], digest: Optional[str] = None) -> str:
+        """Chave da aba; ``digest`` (de ``file_digest``) evita reler o arquivo para cada uma das suas abas."""
+        stat = os.stat(source_file)
+        identity = json.dumps({"format": CACHE_FORMAT, "path": os.path.abspath(source_file), "size": stat.st_size,
+                               "mtime": stat.st_mtime_ns, "content": digest or file_digest(source_file),
+                               "sheet": sheet_name, "names": possible_name_cols, "emails": possible_email_cols})
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.cache_dir, key)
+        return base + _DATA_EXTENSION, base + ".json"
+
+    def get(self, key: str) -> Optional[Tuple[pd.DataFrame, int, str]]:
+        """Retorna (contatos, linhas lidas, mapeamento de colunas) ou None se a entrada não existir."""
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            df = pd.read_parquet(data_path) if _USE_PARQUET else _read_pickles(data_path)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return None
+        # Atualiza a data de acesso usada na remoção das entradas mais antigas
+        now = time.time()
+        for path in (data_path, meta_path):
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        return normalize_values(df), meta["rows"], meta["mapping"]
+
+    def writer(self, key: str, columns: Sequence[str]) -> CacheEntryWriter:
+        """Abre a gravação em blocos de uma entrada (ver ``CacheEntryWriter``)."""
+        return CacheEntryWriter(self, key, columns)
+
+    def put(self, key: str, df: pd.DataFrame, rows: int, mapping: str) -> None:
+        writer = self.writer(key, df.columns)
+        writer.write(df)
+        writer.commit(rows, mapping)
+
+    def evict(self) -> None:
+        """Apaga as entradas acessadas há mais tempo até o cache caber no limite."""
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        # Agrupa dados e metadados de cada chave para que sejam apagados juntos
+        entries: Dict[str, List[Any]] = {}
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith('.tmp'):
+                # Entrada ainda sendo gravada por outro processo; só é contada depois de publicada
+                continue
+            entry = entries.setdefault(name.split('.', 1)[0], [0.0, 0, []])
+            entry[0] = max(entry[0], stat.st_mtime)
+            entry[1] += stat.st_size
+            entry[2].append(path)
+        total = sum(size for _, size, _ in entries.values())
+        for _, size, paths in sorted(entries.values()):
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
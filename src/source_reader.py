@@ -0,0 +1,331 @@
+import csv
+import os
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from src.source_cache import SourceCache, file_digest, normalize_values
+
+CHUNK_SIZE = 50000
+OUTPUT_COLUMNS = ['First name', 'Recipient']
+SOURCE_EXTENSIONS = ('.xlsx', '.xlsm', '.xls', '.csv')
+# Separador usado quando vários arquivos de origem são informados num único campo
+SOURCE_SEPARATOR = ';'
+
+MISSING_COLUMNS_MESSAGE = ("Colunas de nome/e-mail não encontradas no arquivo de origem. Verifique o arquivo de "
+                           "contatos ou as configurações em config.json.")
+
+
+def _is_csv(source_file: str) -> bool:
+    return source_file.lower().endswith('.csv')
+
+
+def _is_streamable_excel(source_file: str) -> bool:
+    return source_file.lower().endswith(('.xlsx', '.xlsm'))
+
+
+def expand_source_files(source: str) -> List[str]:
+    """Converte o campo de origem (um arquivo, uma pasta ou vários caminhos separados por ';') em arquivos."""
+    files: List[str] = []
+    for entry in (part.strip() for part in source.split(SOURCE_SEPARATOR)):
+        if not entry:
+            continue
+        if os.path.isdir(entry):
+            for folder, _, names in os.walk(entry):
+                # Arquivos '~$...' são travas temporárias criadas pelo Excel
+                files.extend(os.path.join(folder, name) for name in sorted(names)
+                             if name.lower().endswith(SOURCE_EXTENSIONS) and not name.startswith('~$'))
+        else:
+            files.append(entry)
+    return files
+
+
+_REL_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+
+def _xlsx_sheet_paths(archive: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    """Lista (nome da aba, caminho do XML no pacote) na ordem do workbook, lendo apenas workbook.xml e suas relações."""
+    targets: Dict[str, str] = {}
+    for rel in ET.fromstring(archive.read('xl/_rels/workbook.xml.rels')).iterfind('.//{*}Relationship'):
+        target = rel.get('Target', '')
+        targets[rel.get('Id', '')] = target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+    return [(sheet.get('name', ''), targets.get(sheet.get(_REL_ID, ''), ''))
+            for sheet in ET.fromstring(archive.read('xl/workbook.xml')).iterfind('.//{*}sheet')]
+
+
+def _column_number(cell_ref: str) -> int:
+    number = 0
+    for letter in re.match(r'[A-Z]*', cell_ref).group():
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+def _shared_strings(archive: zipfile.ZipFile, indexes: List[int]) -> Dict[int, str]:
+    """Lê a tabela de textos compartilhados só até o maior índice pedido."""
+    wanted, last = set(indexes), max(indexes)
+    found: Dict[int, str] = {}
+    with archive.open('xl/sharedStrings.xml') as stream:
+        position = 0
+        for _, elem in ET.iterparse(stream):
+            if elem.tag.endswith('}si'):
+                if position in wanted:
+                    # Textos com formatação têm vários trechos <r><t>; a leitura fonética (<rPh>) é ignorada
+                    runs = elem.findall('{*}t') + elem.findall('{*}r/{*}t')
+                    found[position] = ''.join(t.text or '' for t in runs)
+                elem.clear()
+                if position >= last:
+                    break
+                position += 1
+    return found
+
+
+def _xlsx_header(source_file: str, sheet_name: Optional[str]) -> List[str]:
+    """Lê a linha 1 da aba percorrendo o XML em fluxo, sem carregar o restante da planilha.
+
+    Assim como o leitor (``ContactSource._xlsx_chunks``, via openpyxl), o cabeçalho é sempre a linha 1: se a
+    planilha começa mais abaixo, o cabeçalho fica vazio em vez de ser tirado da primeira linha preenchida.
+    """
+    with zipfile.ZipFile(source_file) as archive:
+        sheets = _xlsx_sheet_paths(archive)
+        path = next((p for name, p in sheets if name == sheet_name), None) if sheet_name else sheets[0][1]
+        if path is None:
+            raise ValueError(f"Aba '{sheet_name}' não encontrada em {os.path.basename(source_file)}.")
+        cells: Dict[int, Tuple[Optional[str], str]] = {}
+        with archive.open(path) as stream:
+            for _, elem in ET.iterparse(stream):
+                if elem.tag.endswith('}c'):
+                    cell_type = elem.get('t')
+                    value = ''.join(t.text or '' for t in elem.iterfind('.//{*}t')) if cell_type == 'inlineStr' else \
+                        next((v.text or '' for v in elem.iterfind('.//{*}v')), '')
+                    cells[_column_number(elem.get('r', '')) or len(cells) + 1] = (cell_type, value)
+                elif elem.tag.endswith('}row'):
+                    if elem.get('r', '1') != '1':
+                        cells = {}
+                    break
+        shared = [int(value) for cell_type, value in cells.values() if cell_type == 's' and value]
+        strings = _shared_strings(archive, shared) if shared else {}
+    if not cells:
+        return []
+    header = [f"Unnamed: {i}" for i in range(max(cells))]
+    for column, (cell_type, value) in cells.items():
+        header[column - 1] = strings.get(int(value), '') if cell_type == 's' and value else value
+    return header
+
+
+def list_sheets(source_file: str) -> List[Optional[str]]:
+    """Retorna as abas do arquivo (``[None]`` para CSV)."""
+    if _is_csv(source_file):
+        return [None]
+    if _is_streamable_excel(source_file):
+        with zipfile.ZipFile(source_file) as archive:
+            return [name for name, _ in _xlsx_sheet_paths(archive)]
+    return list(pd.ExcelFile(source_file).sheet_names)
+
+
+def read_header(source_file: str, sheet_name: Optional[str] = None) -> List[str]:
+    """Retorna os nomes das colunas do arquivo de origem (da aba informada ou da primeira).
+
+    Para CSV e XLSX apenas a primeira linha é lida, então o custo não depende do tamanho do arquivo.
+    """
+    if _is_csv(source_file):
+        with open(source_file, 'r', encoding='utf-8-sig', newline='') as f:
+            return next(csv.reader(f), [])
+    if _is_streamable_excel(source_file):
+        return _xlsx_header(source_file, sheet_name)
+    # Formatos antigos (.xls) não permitem leitura parcial
+    return list(pd.read_excel(source_file, sheet_name=sheet_name or 0, nrows=0).columns)
+
+
+def source_label(source_file: str, sheet_name: Optional[str]) -> str:
+    name = os.path.basename(source_file)
+    return f"{name} [{sheet_name}]" if sheet_name else name
+
+
+class ContactSource:
+    """Leitor em fluxo de um arquivo de contatos que entrega apenas as colunas de nome e e-mail.
+
+    Os dados são entregues em blocos de até ``chunk_size`` linhas, já com as colunas renomeadas
+    para ``First name`` e ``Recipient``, de modo que o pico de memória não depende do tamanho do arquivo.
+    Os valores vêm como texto e as células vazias como None (``normalize_values``), como no cache de origens.
+    """
+
+    def __init__(self, source_file: str, possible_name_cols: List[str], possible_email_cols: List[str],
+                 chunk_size: int = CHUNK_SIZE, sheet_name: Optional[str] = None) -> None:
+        self.source_file = source_file
+        self.sheet_name = sheet_name
+        self.chunk_size = chunk_size
+        self.rows_read = 0
+        header = read_header(source_file, sheet_name)
+        self.name_col: Optional[str] = next((c for c in possible_name_cols if c in header), None)
+        self.email_col: Optional[str] = next((c for c in possible_email_cols if c in header), None)
+        if not all([self.name_col, self.email_col]):
+            raise ValueError(MISSING_COLUMNS_MESSAGE)
+
+    def chunks(self) -> Iterator[pd.DataFrame]:
+        if _is_csv(self.source_file):
+            chunks = self._csv_chunks()
+        elif _is_streamable_excel(self.source_file):
+            chunks = self._xlsx_chunks()
+        else:
+            chunks = self._excel_chunks()
+        for chunk in chunks:
+            self.rows_read += len(chunk)
+            yield normalize_values(chunk)
+
+    def _csv_chunks(self) -> Iterator[pd.DataFrame]:
+        reader = pd.read_csv(self.source_file, usecols=[self.name_col, self.email_col], dtype=object,
+                             chunksize=self.chunk_size)
+        for chunk in reader:
+            yield chunk[[self.name_col, self.email_col]].set_axis(OUTPUT_COLUMNS, axis=1)
+
+    def _xlsx_chunks(self) -> Iterator[pd.DataFrame]:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(self.source_file, read_only=True, data_only=True)
+        try:
+            worksheet = workbook[self.sheet_name] if self.sheet_name else workbook.worksheets[0]
+            rows = worksheet.iter_rows(values_only=True)
+            header = list(next(rows, ()))
+            name_idx, email_idx = header.index(self.name_col), header.index(self.email_col)
+            names: List[object] = []
+            emails: List[object] = []
+            for row in rows:
+                if all(cell is None for cell in row):
+                    continue
+                names.append(row[name_idx] if name_idx < len(row) else None)
+                emails.append(row[email_idx] if email_idx < len(row) else None)
+                if len(names) >= self.chunk_size:
+                    yield pd.DataFrame({'First name': names, 'Recipient': emails}, dtype=object)
+                    names, emails = [], []
+            if names:
+                yield pd.DataFrame({'First name': names, 'Recipient': emails}, dtype=object)
+        finally:
+            workbook.close()
+
+    def _excel_chunks(self) -> Iterator[pd.DataFrame]:
+        # Formatos antigos (.xls) não têm leitor em fluxo; lê apenas as duas colunas de uma vez
+        df = pd.read_excel(self.source_file, sheet_name=self.sheet_name or 0,
+                           usecols=[self.name_col, self.email_col], dtype=object)
+        yield df[[self.name_col, self.email_col]].set_axis(OUTPUT_COLUMNS, axis=1)
+
+
+# (rótulo, contatos ou None, linhas lidas, mapeamento de colunas ou motivo da falha, veio do cache)
+SheetResult = Tuple[str, Optional[pd.DataFrame], int, str, bool]
+
+
+def _mapping(source: ContactSource) -> str:
+    return f"'{source.name_col}' -> First name, '{source.email_col}' -> Recipient"
+
+
+def read_sheet(task: Tuple[str, Optional[str], List[str], List[str], Optional[SourceCache], Optional[str]]
+               ) -> SheetResult:
+    """Lê uma aba inteira (executado nos processos de trabalho), consultando antes o cache de origens.
+
+    O último item da tarefa é o hash do arquivo, calculado uma única vez para todas as suas abas.
+    """
+    source_file, sheet_name, possible_name_cols, possible_email_cols, cache, digest = task
+    label = source_label(source_file, sheet_name)
+    key = cache.key(source_file, sheet_name, possible_name_cols, possible_email_cols, digest) if cache else None
+    cached = cache.get(key) if cache else None
+    if cached is not None:
+        df, rows, mapping = cached
+        return label, df, rows, mapping, True
+    try:
+        source = ContactSource(source_file, possible_name_cols, possible_email_cols, sheet_name=sheet_name)
+        chunks = list(source.chunks())
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=OUTPUT_COLUMNS)
+        if cache:
+            cache.put(key, df, source.rows_read, _mapping(source))
+        return label, df, source.rows_read, _mapping(source), False
+    except ValueError as e:
+        reason = "colunas de nome/e-mail não encontradas" if str(e) == MISSING_COLUMNS_MESSAGE else str(e)
+        return label, None, 0, reason, False
+
+
+class SourceSet:
+    """Conjunto de origens de uma análise: todas as abas de todos os arquivos informados.
+
+    Com uma única aba a leitura é feita em fluxo no próprio processo; com várias, as abas são lidas
+    em paralelo num pool de processos e os resultados chegam na ordem dos arquivos. Com um ``cache``,
+    abas de arquivos que não mudaram desde a última leitura não são interpretadas de novo.
+    """
+
+    def __init__(self, source: str, possible_name_cols: List[str], possible_email_cols: List[str],
+                 max_workers: Optional[int] = None, cache: Optional[SourceCache] = None) -> None:
+        self.possible_name_cols = possible_name_cols
+        self.possible_email_cols = possible_email_cols
+        self.max_workers = max_workers
+        self.cache = cache
+        self.files = expand_source_files(source)
+        if not self.files:
+            raise ValueError("Nenhum arquivo de contatos (.xlsx, .xls, .csv) encontrado na origem informada.")
+        self.tasks = [(f, sheet) for f in self.files for sheet in list_sheets(f)]
+        self.rows_read = 0
+        self.mappings: List[str] = []
+        self.skipped: List[str] = []
+        self.cache_hits = 0
+        self._digests: Dict[str, str] = {}
+
+    def _digest(self, source_file: str) -> Optional[str]:
+        """Hash do conteúdo do arquivo para as chaves do cache, calculado uma vez por arquivo."""
+        if not self.cache:
+            return None
+        if source_file not in self._digests:
+            self._digests[source_file] = file_digest(source_file)
+        return self._digests[source_file]
+
+    def chunks(self) -> Iterator[pd.DataFrame]:
+        if len(self.tasks) == 1:
+            yield from self._single_sheet_chunks(*self.tasks[0])
+            return
+
+        tasks = [(f, sheet, self.possible_name_cols, self.possible_email_cols, self.cache, self._digest(f))
+                 for f, sheet in self.tasks]
+        workers = min(len(tasks), self.max_workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for label, df, rows, detail, from_cache in executor.map(read_sheet, tasks):
+                if df is None:
+                    self.skipped.append(f"{label}: {detail}")
+                    continue
+                self.mappings.append(f"{label}: {detail}")
+                self.rows_read += rows
+                self.cache_hits += from_cache
+                yield df
+        if not self.mappings:
+            raise ValueError(MISSING_COLUMNS_MESSAGE)
+
+    def _single_sheet_chunks(self, source_file: str, sheet_name: Optional[str]) -> Iterator[pd.DataFrame]:
+        label = source_label(source_file, sheet_name)
+        key = self.cache.key(source_file, sheet_name, self.possible_name_cols, self.possible_email_cols,
+                             self._digest(source_file)) if self.cache else None
+        cached = self.cache.get(key) if self.cache else None
+        if cached is not None:
+            df, rows, mapping = cached
+            self.mappings.append(f"{label}: {mapping}")
+            self.rows_read += rows
+            self.cache_hits += 1
+            for start in range(0, len(df), CHUNK_SIZE):
+                yield df.iloc[start:start + CHUNK_SIZE]
+            return
+
+        source = ContactSource(source_file, self.possible_name_cols, self.possible_email_cols, sheet_name=sheet_name)
+        self.mappings.append(f"{label}: {_mapping(source)}")
+        # Cada bloco vai para o cache assim que é lido; a entrada só é publicada se a leitura chegar ao fim
+        writer = self.cache.writer(key, OUTPUT_COLUMNS) if self.cache else None
+        try:
+            for chunk in source.chunks():
+                self.rows_read += len(chunk)
+                if writer:
+                    writer.write(chunk)
+                yield chunk
+        except BaseException:
+            if writer:
+                writer.abort()
+            raise
+        if writer:
+            writer.commit(source.rows_read, _mapping(source))
@@ -0,0 +1,30 @@
+"""Medição das fases de inicialização do aplicativo (até a primeira pintura da janela).
+
+Deve ser o primeiro módulo importado por ``main.py``, pois o instante da importação marca o início da contagem.
+"""
+import time
+from typing import List, Tuple
+
+_started = time.perf_counter()
+_marks: List[Tuple[str, float]] = []
+
+
+def mark(phase: str) -> None:
+    """Registra o fim de uma fase da inicialização."""
+    _marks.append((phase, time.perf_counter()))
+
+
+def phases() -> List[Tuple[str, float]]:
+    """Retorna a duração, em milissegundos, de cada fase registrada."""
+    result = []
+    previous = _started
+    for phase, instant in _marks:
+        result.append((phase, (instant - previous) * 1000))
+        previous = instant
+    return result
+
+
+def report() -> str:
+    parts = [f"{phase} {ms:.0f} ms" for phase, ms in phases()]
+    total = (_marks[-1][1] - _started) * 1000 if _marks else 0.0
+    return f"Inicialização: {' | '.join(parts)} (total {total:.0f} ms)"
@@ -0,0 +1,421 @@
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Any, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from src import metrics, quota
+from src.quota import READ, WRITE, StoreQuotaError
+
+DEFAULT_HEADERS = ['First name', 'Last name', 'Recipient', 'Description', 'Email Sent']
+# Coluna usada para contar as linhas: a sincronização sempre preenche o Recipient (ver ContactBatch.rows)
+COUNT_COLUMN = DEFAULT_HEADERS.index('Recipient') + 1
+LOCAL_URL_PREFIX = "sqlite://"
+# Abas criadas quando a última atinge o limite de linhas: "Página1 (2)", "Página1 (3)"...
+SHARD_TITLE_FORMAT = "{base} ({number})"
+
+
+class DestinationStore:
+    """Interface da planilha de destino: a primeira aba do MailMerge e as abas que a continuam (shards).
+
+    As linhas seguem o modelo do Google Sheets: a linha 1 é o cabeçalho e os dados começam na linha 2.
+    Com ``max_rows_per_shard`` definido, quando a última aba atinge esse número de linhas a sincronização
+    continua numa nova aba com o mesmo cabeçalho, o que mantém cada aba pequena o bastante para abrir
+    rápido e longe do limite de células da planilha. As abas são identificadas pelo título.
+    Toda chamada à API passa pelo limite de cota compartilhado (``src.quota.governor``).
+    """
+
+    title: str = ""
+
+    def __init__(self, max_rows_per_shard: Optional[int] = None) -> None:
+        self.max_rows_per_shard = max_rows_per_shard
+        self.quota = quota.governor
+        # Abas criadas por esta instância ao atingir o limite de linhas
+        self.created_shards: List[str] = []
+        self._shards: Optional[List[str]] = None
+        self._last_shard_rows: Optional[int] = None
+
+    def read_header(self) -> List[str]:
+        """Retorna os valores da linha de cabeçalho (o mesmo em todas as abas)."""
+        raise NotImplementedError
+
+    def modified_time(self) -> Optional[str]:
+        """Marca da última alteração da planilha, feita por qualquer pessoa (None se não for possível obtê-la).
+
+        Só é comparada por igualdade: serve para saber se algo mudou desde a última leitura.
+        """
+        raise NotImplementedError
+
+    def shards(self) -> List[str]:
+        """Títulos das abas com dados, na ordem em que foram preenchidas (a primeira aba vem antes)."""
+        if self._shards is None:
+            self._shards = self._list_shards()
+        return self._shards
+
+    def read_shards(self, col_indexes: List[int], start_rows: Dict[str, int]) -> Dict[str, List[List[str]]]:
+        """Lê as colunas de várias abas numa única chamada.
+
+        ``start_rows`` diz a linha inicial de cada aba (2 deixa o cabeçalho de fora); as colunas têm índice a partir
+        de 1 e, como no Google Sheets, células vazias no final de cada coluna não são retornadas.
+        """
+        raise NotImplementedError
+
+    def append_rows(self, rows: List[List[Any]]) -> str:
+        """Adiciona as linhas ao final da última aba e retorna o intervalo escrito (ex.: 'Página1!A10:C20').
+
+        Se a aba atingir ``max_rows_per_shard``, o restante vai para uma nova aba; o intervalo retornado é o
+        da primeira parte.
+        """
+        ranges = []
+        while rows:
+            shard = self.shards()[-1]
+            room = len(rows)
+            if self.max_rows_per_shard:
+                if self._last_shard_rows is None:
+                    self._last_shard_rows = self._count_rows(shard)
+                if self._last_shard_rows >= self.max_rows_per_shard:
+                    shard = self._add_shard()
+                    self._last_shard_rows = 0
+                room = self.max_rows_per_shard - self._last_shard_rows
+            part, rows = rows[:room], rows[room:]
+            ranges.append(self._append(shard, part))
+            if self._last_shard_rows is not None:
+                self._last_shard_rows += len(part)
+        return ranges[0] if ranges else ""
+
+    def update_cells(self, cells: List[Tuple[str, int, int, Any]]) -> int:
+        """Escreve os valores ``(aba, linha, coluna, valor)`` numa única chamada em lote.
+
+        Células vizinhas da mesma coluna viram um só intervalo; retorna quantos intervalos foram escritos.
+        """
+        raise NotImplementedError
+
+    def clear_data(self) -> None:
+        """Apaga todas as linhas de dados, mantendo o cabeçalho da primeira aba e removendo as abas extras."""
+        raise NotImplementedError
+
+    def row_count(self) -> int:
+        """Retorna o número de registros (linhas de dados de todas as abas, sem os cabeçalhos).
+
+        Cada aba conta até a última linha com e-mail (``COUNT_COLUMN``), numa única leitura dessa coluna: uma
+        linha cujo nome foi apagado à mão continua contando.
+        """
+        columns = self.read_shards([COUNT_COLUMN], {shard: 2 for shard in self.shards()})
+        return sum(len(values[0]) for values in columns.values())
+
+    def _add_shard(self) -> str:
+        """Cria a próxima aba, com o cabeçalho da primeira, e retorna o título."""
+        shards = self.shards()
+        numbers = [shard_number(shards[0], shard) or 1 for shard in shards]
+        title = SHARD_TITLE_FORMAT.format(base=shards[0], number=max(numbers) + 1)
+        self._create_shard(title, self.read_header())
+        shards.append(title)
+        self.created_shards.append(title)
+        return title
+
+    def _list_shards(self) -> List[str]:
+        raise NotImplementedError
+
+    def _count_rows(self, shard: str) -> int:
+        """Número de linhas de dados de uma aba, pela coluna de e-mail (ver ``row_count``)."""
+        return len(self.read_shards([COUNT_COLUMN], {shard: 2})[shard][0])
+
+    def _append(self, shard: str, rows: List[List[Any]]) -> str:
+        raise NotImplementedError
+
+    def _create_shard(self, title: str, header: List[str]) -> None:
+        raise NotImplementedError
+
+
+class GSpreadStore(DestinationStore):
+    """Destino real: primeira aba de uma planilha do Google Sheets acessada via gspread."""
+
+    def __init__(self, json_path: str, mailmerge_url: str, max_rows_per_shard: Optional[int] = None) -> None:
+        from src import session
+
+        super().__init__(max_rows_per_shard)
+        self.spreadsheet, self.worksheet = session.get_worksheet(json_path, mailmerge_url)
+        self.title = self.spreadsheet.title
+        self._worksheets: Dict[str, Any] = {self.worksheet.title: self.worksheet}
+
+    def read_header(self) -> List[str]:
+        return self.quota.call(READ, self.worksheet.row_values, 1)
+
+    def modified_time(self) -> Optional[str]:
+        from gspread.exceptions import APIError
+
+        try:
+            # modifiedTime da API do Drive; muda com qualquer edição, inclusive as feitas à mão na planilha
+            return self.quota.call(READ, self.spreadsheet.get_lastUpdateTime)
+        except APIError:
+            # API do Drive desativada no projeto ou sem permissão: o índice local volta a depender da idade
+            return None
+
+    def read_shards(self, col_indexes: List[int], start_rows: Dict[str, int]) -> Dict[str, List[List[str]]]:
+        from gspread.utils import rowcol_to_a1
+
+        letters = [rowcol_to_a1(1, col)[:-1] for col in col_indexes]
+        ranges = [a1_range(shard, f"{letter}{start_row}:{letter}")
+                  for shard, start_row in start_rows.items() for letter in letters]
+        if not ranges:
+            return {}
+        response = self.quota.call(READ, self.spreadsheet.values_batch_get, ranges,
+                                   params={"majorDimension": "COLUMNS"})
+        columns = [[str(v) for v in value_range["values"][0]] if value_range.get("values") else []
+                   for value_range in response.get("valueRanges", [])]
+        return {shard: columns[i * len(letters):(i + 1) * len(letters)] for i, shard in enumerate(start_rows)}
+
+    def update_cells(self, cells: List[Tuple[str, int, int, Any]]) -> int:
+        from gspread.utils import rowcol_to_a1
+
+        ranges = [{"range": a1_range(shard, f"{rowcol_to_a1(first_row, col)}:"
+                                            f"{rowcol_to_a1(first_row + len(values) - 1, col)}"),
+                   "values": [[value] for value in values]}
+                  for shard, first_row, col, values in coalesce_cells(cells)]
+        if ranges:
+            self.quota.call(WRITE, self.spreadsheet.values_batch_update,
+                            {"valueInputOption": "USER_ENTERED", "data": ranges})
+        return len(ranges)
+
+    def clear_data(self) -> None:
+        from gspread.utils import rowcol_to_a1
+
+        extra = [self._worksheets[title] for title in self.shards()[1:]]
+        if extra:
+            self.quota.call(WRITE, self.spreadsheet.batch_update,
+                            {"requests": [{"deleteSheet": {"sheetId": ws.id}} for ws in extra]}, idempotent=False)
+        # Intervalo sem linha final: vai até o fim da aba, por maior que ela tenha ficado desde a abertura
+        last_col_letter = rowcol_to_a1(1, self.worksheet.col_count)[:-1]
+        self.quota.call(WRITE, self.worksheet.batch_clear, [f"A2:{last_col_letter}"])
+        self._shards, self._last_shard_rows = None, None
+
+    def _list_shards(self) -> List[str]:
+        base = self.worksheet.title
+        self._worksheets = {ws.title: ws for ws in self.quota.call(READ, self.spreadsheet.worksheets)}
+        return order_shards(base, self._worksheets)
+
+    def _append(self, shard: str, rows: List[List[Any]]) -> str:
+        # Um append repetido após uma falha de rede poderia duplicar linhas: só erros de cota são repetidos aqui
+        response = self.quota.call(WRITE, self._worksheets[shard].append_rows, rows,
+                                   value_input_option="USER_ENTERED", idempotent=False)
+        return response.get("updates", {}).get("updatedRange", "")
+
+    def _create_shard(self, title: str, header: List[str]) -> None:
+        # A nova aba já nasce com o tamanho do limite, para que os lotes não precisem expandi-la
+        worksheet = self.quota.call(WRITE, self.spreadsheet.add_worksheet, title,
+                                    rows=(self.max_rows_per_shard or 1000) + 1,
+                                    cols=max(len(header), self.worksheet.col_count), idempotent=False)
+        self.quota.call(WRITE, worksheet.update, values=[header], range_name="A1",
+                        value_input_option="USER_ENTERED")
+        self._worksheets[title] = worksheet
+
+
+class LocalStore(DestinationStore):
+    """Destino local em SQLite, usado para testes de carga e regressão sem consumir a cota da API.
+
+    A URL tem o formato ``sqlite:///caminho/arquivo.db`` e aceita os parâmetros opcionais
+    ``latency_ms`` (atraso injetado em cada chamada), ``quota_error_rate`` (probabilidade de
+    um erro de cota por chamada), ``retry_after`` (segundos sugeridos no erro) e ``seed``.
+    Cada alteração nas tabelas, inclusive as feitas à mão, incrementa um contador (``modified_time``) por meio
+    de gatilhos do SQLite.
+    """
+
+    _init_lock = threading.Lock()
+
+    def __init__(self, mailmerge_url: str, max_rows_per_shard: Optional[int] = None) -> None:
+        super().__init__(max_rows_per_shard)
+        parsed = urlparse(mailmerge_url)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        self.db_path = parsed.netloc + parsed.path if parsed.netloc else parsed.path
+        if os.name == "nt" and self.db_path.startswith("/") and ":" in self.db_path[:3]:
+            self.db_path = self.db_path[1:]
+        if not self.db_path:
+            raise ValueError("URL local inválida. Use o formato 'sqlite:///caminho/arquivo.db'.")
+        self.latency = float(params.get("latency_ms", 0)) / 1000.0
+        self.quota_error_rate = float(params.get("quota_error_rate", 0))
+        self.retry_after = float(params.get("retry_after", 1))
+        self._random = random.Random(params.get("seed"))
+        self.title = os.path.splitext(os.path.basename(self.db_path))[0]
+
+        with self._init_lock, self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS linhas (num INTEGER PRIMARY KEY, valores TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS versao (id INTEGER PRIMARY KEY CHECK (id = 1), "
+                         "valor INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO versao (id, valor) VALUES (1, 0)")
+            for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                         "AND (name = 'linhas' OR name LIKE 'linhas\\_%' ESCAPE '\\')").fetchall():
+                self._track_changes(conn, table)
+            if conn.execute("SELECT COUNT(*) FROM linhas").fetchone()[0] == 0:
+                conn.execute("INSERT INTO linhas (num, valores) VALUES (1, ?)", (json.dumps(DEFAULT_HEADERS),))
+
+    @staticmethod
+    def _track_changes(conn: sqlite3.Connection, table: str) -> None:
+        for operation in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_{operation.lower()} AFTER {operation} ON {table} "
+                         f"BEGIN UPDATE versao SET valor = valor + 1; END")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _simulate_api_call(self, kind: str = READ) -> None:
+        # O erro simulado acontece antes de qualquer alteração, então qualquer chamada pode ser repetida
+        self.quota.call(kind, self._api_call)
+
+    def _api_call(self) -> None:
+        metrics.count("api_calls")
+        if self.latency:
+            time.sleep(self.latency)
+        if self.quota_error_rate and self._random.random() < self.quota_error_rate:
+            raise StoreQuotaError("Quota exceeded (429) simulado pelo destino local.", retry_after=self.retry_after)
+
+    def read_header(self) -> List[str]:
+        self._simulate_api_call()
+        with self._connect() as conn:
+            row = conn.execute("SELECT valores FROM linhas WHERE num = 1").fetchone()
+        return json.loads(row[0]) if row else []
+
+    def modified_time(self) -> Optional[str]:
+        self._simulate_api_call()
+        with self._connect() as conn:
+            return str(conn.execute("SELECT valor FROM versao").fetchone()[0])
+
+    def _table(self, shard: str) -> str:
+        # A primeira aba é a tabela "linhas"; a aba N é "linhas_N"
+        number = shard_number(self.title, shard)
+        return f"linhas_{number}" if number else "linhas"
+
+    def read_shards(self, col_indexes: List[int], start_rows: Dict[str, int]) -> Dict[str, List[List[str]]]:
+        self._simulate_api_call()
+        result = {}
+        with self._connect() as conn:
+            for shard, start_row in start_rows.items():
+                rows = [json.loads(v) for (v,) in conn.execute(
+                    f"SELECT valores FROM {self._table(shard)} WHERE num >= ? ORDER BY num", (start_row,))]
+                columns = []
+                for col in col_indexes:
+                    values = [str(row[col - 1]) if col <= len(row) and row[col - 1] is not None else ''
+                              for row in rows]
+                    while values and values[-1] == '':
+                        values.pop()
+                    columns.append(values)
+                result[shard] = columns
+        return result
+
+    def update_cells(self, cells: List[Tuple[str, int, int, Any]]) -> int:
+        ranges = coalesce_cells(cells)
+        if not ranges:
+            return 0
+        self._simulate_api_call(WRITE)
+        with self._connect() as conn:
+            for shard, row_num, col, value in cells:
+                table = self._table(shard)
+                row = conn.execute(f"SELECT valores FROM {table} WHERE num = ?", (row_num,)).fetchone()
+                values = json.loads(row[0]) if row else []
+                values.extend([''] * (col - len(values)))
+                values[col - 1] = value
+                conn.execute(f"INSERT OR REPLACE INTO {table} (num, valores) VALUES (?, ?)",
+                             (row_num, json.dumps(values, ensure_ascii=False)))
+        return len(ranges)
+
+    def clear_data(self) -> None:
+        self._simulate_api_call(WRITE)
+        with self._connect() as conn:
+            for shard in self.shards()[1:]:
+                conn.execute(f"DROP TABLE {self._table(shard)}")
+            conn.execute("DELETE FROM linhas WHERE num > 1")
+        self._shards, self._last_shard_rows = None, None
+
+    def row_count(self) -> int:
+        self._simulate_api_call()
+        with self._connect() as conn:
+            return sum(self._filled_rows(conn, shard) for shard in self.shards())
+
+    def _list_shards(self) -> List[str]:
+        self._simulate_api_call()
+        with self._connect() as conn:
+            tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                                       "AND name LIKE 'linhas\\_%' ESCAPE '\\'")]
+        titles = [SHARD_TITLE_FORMAT.format(base=self.title, number=name.rsplit('_', 1)[1])
+                  for name in tables if name.rsplit('_', 1)[1].isdigit()]
+        return order_shards(self.title, titles)
+
+    def _count_rows(self, shard: str) -> int:
+        self._simulate_api_call()
+        with self._connect() as conn:
+            return self._filled_rows(conn, shard)
+
+    def _filled_rows(self, conn: sqlite3.Connection, shard: str) -> int:
+        # Como no Google Sheets, conta até a última linha preenchida da coluna de contagem
+        return conn.execute(
+            f"SELECT COALESCE(MAX(num), 1) - 1 FROM {self._table(shard)} "
+            "WHERE num > 1 AND COALESCE(json_extract(valores, ?), '') != ''",
+            (f"$[{COUNT_COLUMN - 1}]",)).fetchone()[0]
+
+    def _append(self, shard: str, rows: List[List[Any]]) -> str:
+        self._simulate_api_call(WRITE)
+        with self._connect() as conn:
+            last = conn.execute(f"SELECT COALESCE(MAX(num), 0) FROM {self._table(shard)}").fetchone()[0]
+            conn.executemany(f"INSERT INTO {self._table(shard)} (num, valores) VALUES (?, ?)",
+                             ((last + i, json.dumps(row, ensure_ascii=False)) for i, row in enumerate(rows, 1)))
+        width = max((len(row) for row in rows), default=1)
+        return a1_range(shard, f"A{last + 1}:{chr(ord('A') + width - 1)}{last + len(rows)}")
+
+    def _create_shard(self, title: str, header: List[str]) -> None:
+        self._simulate_api_call(WRITE)
+        with self._connect() as conn:
+            conn.execute(f"CREATE TABLE {self._table(title)} (num INTEGER PRIMARY KEY, valores TEXT NOT NULL)")
+            self._track_changes(conn, self._table(title))
+            conn.execute(f"INSERT INTO {self._table(title)} (num, valores) VALUES (1, ?)",
+                         (json.dumps(header, ensure_ascii=False),))
+
+
+def coalesce_cells(cells: List[Tuple[str, int, int, Any]]) -> List[Tuple[str, int, int, List[Any]]]:
+    """Agrupa células vizinhas da mesma aba e coluna em intervalos ``(aba, primeira linha, coluna, valores)``."""
+    by_col: Dict[Tuple[str, int], Dict[int, Any]] = {}
+    for shard, row_num, col, value in cells:
+        by_col.setdefault((shard, col), {})[row_num] = value
+    ranges: List[Tuple[str, int, int, List[Any]]] = []
+    for (shard, col), values in by_col.items():
+        for row_num in sorted(values):
+            last = ranges[-1] if ranges else None
+            if last and last[0] == shard and last[2] == col and last[1] + len(last[3]) == row_num:
+                last[3].append(values[row_num])
+            else:
+                ranges.append((shard, row_num, col, [values[row_num]]))
+    return ranges
+
+
+def a1_range(shard: str, cells: str) -> str:
+    """Intervalo A1 com o nome da aba entre aspas (ex.: "'Página1 (2)'!A2:C10")."""
+    return "'{}'!{}".format(shard.replace("'", "''"), cells)
+
+
+def shard_number(base: str, title: str) -> Optional[int]:
+    """Número da aba extra ``title`` criada a partir da aba ``base``, ou None se não for uma delas."""
+    match = re.fullmatch(re.escape(base) + r" \((\d+)\)", title)
+    return int(match.group(1)) if match else None
+
+
+def order_shards(base: str, titles: Iterable[str]) -> List[str]:
+    """A aba ``base`` seguida das abas extras encontradas em ``titles``, pela numeração."""
+    numbered = sorted((shard_number(base, title), title) for title in titles if shard_number(base, title))
+    return [base] + [title for number, title in numbered if number > 1]
+
+
+def is_local_url(mailmerge_url: str) -> bool:
+    return bool(mailmerge_url) and mailmerge_url.startswith(LOCAL_URL_PREFIX)
+
+
+def open_store(json_path: str, mailmerge_url: str, max_rows_per_shard: Optional[int] = None) -> DestinationStore:
+    """Abre o destino adequado para a URL informada (Google Sheets ou SQLite local).
+
+    ``max_rows_per_shard`` só importa para quem escreve: a partir desse número de linhas a sincronização
+    continua numa nova aba.
+    """
+    if is_local_url(mailmerge_url):
+        return LocalStore(mailmerge_url, max_rows_per_shard)
+    return GSpreadStore(json_path, mailmerge_url, max_rows_per_shard)
@@ -0,0 +1,146 @@
+import os
+import re
+import sqlite3
+import time
+from typing import Optional
+
+DEFAULT_JOURNAL_PATH = os.path.join("cache", "sync_journal.db")
+
+STATE_RUNNING = "em andamento"
+STATE_DONE = "concluída"
+BATCH_SENDING = "enviando"
+BATCH_CONFIRMED = "confirmado"
+
+
+def range_end_row(updated_range: str) -> Optional[int]:
+    """Última linha de um intervalo A1 retornado pela API (ex.: 'Página1!A10:C20' -> 20)."""
+    match = re.search(r'(\d+)$', updated_range.rsplit('!', 1)[-1]) if updated_range else None
+    return int(match.group(1)) if match else None
+
+
+def range_start_row(updated_range: str) -> Optional[int]:
+    match = re.search(r'[A-Z]+(\d+)', updated_range.rsplit('!', 1)[-1]) if updated_range else None
+    return int(match.group(1)) if match else None
+
+
+def range_sheet(updated_range: str) -> Optional[str]:
+    """Aba de um intervalo A1 (ex.: "'Página1 (2)'!A10:C20" -> 'Página1 (2)')."""
+    if not updated_range or '!' not in updated_range:
+        return None
+    sheet = updated_range.rsplit('!', 1)[0]
+    if sheet.startswith("'") and sheet.endswith("'"):
+        sheet = sheet[1:-1].replace("''", "'")
+    return sheet
+
+
+class JournalRun:
+    """Uma sincronização registrada no diário: cada lote é gravado antes do envio e confirmado depois.
+
+    ``check_until``, ``first_row`` e ``first_shard`` só são definidos ao retomar uma sincronização com as
+    mesmas linhas: as linhas de origem até ``check_until`` podem já estar no destino a partir da linha
+    ``first_row`` da aba ``first_shard`` (ou nas abas criadas depois dela) e devem ser conferidas antes do reenvio.
+    """
+
+    def __init__(self, journal: 'SyncJournal', run_id: int, total: int, confirmed: int,
+                 check_until: int = 0, first_row: Optional[int] = None, first_shard: Optional[str] = None) -> None:
+        self.journal = journal
+        self.run_id = run_id
+        self.total = total
+        self.confirmed = confirmed
+        self.check_until = check_until
+        self.first_row = first_row
+        self.first_shard = first_shard
+
+    @property
+    def resumed(self) -> bool:
+        return self.check_until > 0
+
+    def batch_sending(self, start: int, count: int) -> None:
+        """Registra, antes do envio, o lote com as linhas de origem ``start`` até ``start + count``."""
+        with self.journal._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO lotes (sincronizacao, inicio, quantidade, estado, intervalo, "
+                         "registrado_em) VALUES (?, ?, ?, ?, '', ?)",
+                         (self.run_id, start, count, BATCH_SENDING, time.time()))
+
+    def batch_confirmed(self, start: int, count: int, updated_range: str) -> None:
+        """Registra que o lote chegou ao destino, com o intervalo informado pela API."""
+        self.confirmed = max(self.confirmed, start + count)
+        with self.journal._connect() as conn:
+            conn.execute("UPDATE lotes SET estado = ?, intervalo = ?, registrado_em = ? "
+                         "WHERE sincronizacao = ? AND inicio = ?",
+                         (BATCH_CONFIRMED, updated_range, time.time(), self.run_id, start))
+            first_row = range_start_row(updated_range)
+            conn.execute("UPDATE sincronizacoes SET confirmadas = ?, atualizada_em = ?, "
+                         "primeira_aba = CASE WHEN primeira_linha IS NULL THEN ? ELSE primeira_aba END, "
+                         "primeira_linha = COALESCE(primeira_linha, ?) WHERE id = ?",
+                         (self.confirmed, time.time(), range_sheet(updated_range), first_row, self.run_id))
+
+    def finish(self) -> None:
+        """Marca a sincronização como concluída; os lotes deixam de ser necessários."""
+        with self.journal._connect() as conn:
+            conn.execute("DELETE FROM lotes WHERE sincronizacao = ?", (self.run_id,))
+            conn.execute("UPDATE sincronizacoes SET estado = ?, confirmadas = total, atualizada_em = ? WHERE id = ?",
+                         (STATE_DONE, time.time(), self.run_id))
+
+
+class SyncJournal:
+    """Diário local (SQLite) das sincronizações, para retomar uma sincronização interrompida sem duplicar linhas.
+
+    Cada planilha de destino guarda apenas a sincronização mais recente. Se a próxima tiver exatamente
+    as mesmas linhas (mesma assinatura), ela continua a anterior; caso contrário, começa do zero.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_JOURNAL_PATH) -> None:
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS sincronizacoes (
+                id INTEGER PRIMARY KEY, url TEXT NOT NULL, assinatura TEXT NOT NULL, total INTEGER NOT NULL,
+                confirmadas INTEGER NOT NULL, primeira_linha INTEGER, primeira_aba TEXT, estado TEXT NOT NULL,
+                iniciada_em REAL NOT NULL, atualizada_em REAL NOT NULL)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS lotes (
+                sincronizacao INTEGER NOT NULL, inicio INTEGER NOT NULL, quantidade INTEGER NOT NULL,
+                estado TEXT NOT NULL, intervalo TEXT NOT NULL, registrado_em REAL NOT NULL,
+                PRIMARY KEY (sincronizacao, inicio))""")
+            # Diários criados antes da divisão do destino em abas não têm a coluna da aba inicial
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(sincronizacoes)")]
+            if "primeira_aba" not in columns:
+                try:
+                    conn.execute("ALTER TABLE sincronizacoes ADD COLUMN primeira_aba TEXT")
+                except sqlite3.OperationalError:
+                    # Outro processo acabou de acrescentar a coluna
+                    pass
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def begin(self, mailmerge_url: str, signature: str, total: int) -> JournalRun:
+        """Abre a sincronização das linhas com a ``signature`` informada, retomando a anterior se for a mesma."""
+        with self._connect() as conn:
+            previous = conn.execute("SELECT id, assinatura, total, confirmadas, primeira_linha, estado, primeira_aba "
+                                    "FROM sincronizacoes WHERE url = ? ORDER BY id DESC LIMIT 1",
+                                    (mailmerge_url,)).fetchone()
+            if previous is not None and previous[1] == signature:
+                run_id, _, run_total, confirmed, first_row, state, first_shard = previous
+                if state == STATE_DONE:
+                    check_until = run_total
+                else:
+                    # Lotes ainda "enviando" podem ou não ter chegado ao destino: entram na conferência
+                    check_until = conn.execute("SELECT COALESCE(MAX(inicio + quantidade), 0) FROM lotes "
+                                               "WHERE sincronizacao = ?", (run_id,)).fetchone()[0]
+                conn.execute("UPDATE sincronizacoes SET estado = ?, atualizada_em = ? WHERE id = ?",
+                             (STATE_RUNNING, time.time(), run_id))
+                return JournalRun(self, run_id, run_total, confirmed, max(check_until, confirmed), first_row,
+                                  first_shard)
+
+            old_ids = [(run_id,) for (run_id,) in conn.execute("SELECT id FROM sincronizacoes WHERE url = ?",
+                                                               (mailmerge_url,))]
+            conn.executemany("DELETE FROM lotes WHERE sincronizacao = ?", old_ids)
+            conn.execute("DELETE FROM sincronizacoes WHERE url = ?", (mailmerge_url,))
+            now = time.time()
+            cursor = conn.execute("INSERT INTO sincronizacoes (url, assinatura, total, confirmadas, estado, "
+                                  "iniciada_em, atualizada_em) VALUES (?, ?, ?, 0, ?, ?, ?)",
+                                  (mailmerge_url, signature, total, STATE_RUNNING, now, now))
+            return JournalRun(self, cursor.lastrowid, total, 0)
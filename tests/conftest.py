@@ -0,0 +1,43 @@
+"""Fixtures comuns: destinos locais (``sqlite://``) e diário/índice/cota isolados em cada teste."""
+import functools
+from queue import Queue
+from typing import Any, List, Tuple
+
+import pytest
+
+from src import logic, quota
+from src.recipient_index import RecipientIndex
+from src.sync_journal import SyncJournal
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    # Diário e índice num diretório temporário, e sem limite de cota para os testes não esperarem
+    monkeypatch.setattr(logic, "SyncJournal", functools.partial(SyncJournal, str(tmp_path / "sync_journal.db")))
+    monkeypatch.setattr(logic, "_sync_journal", None)
+    monkeypatch.setattr(logic, "_recipient_index", None)
+    quota.configure({"read_requests_per_minute": 0, "write_requests_per_minute": 0})
+    yield
+    quota.configure(None)
+
+
+@pytest.fixture
+def store_url(tmp_path) -> str:
+    return f"sqlite:///{tmp_path / 'destino.db'}"
+
+
+@pytest.fixture
+def index(tmp_path) -> RecipientIndex:
+    return RecipientIndex(str(tmp_path / "recipient_index.db"))
+
+
+def drain(queue: Queue) -> List[Tuple[str, Any]]:
+    """Todas as mensagens deixadas na fila por uma função ``*_thread``."""
+    messages = []
+    while not queue.empty():
+        messages.append(queue.get())
+    return messages
+
+
+def logs(queue: Queue, level: str = None) -> List[str]:
+    return [data[0] for kind, data in drain(queue) if kind == "log" and (level is None or data[1] == level)]
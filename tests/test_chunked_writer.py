@@ -0,0 +1,33 @@
+from src.chunked_writer import ChunkedAppender
+
+
+class _RecordingStore:
+    """Destino em memória que registra o tamanho de cada envio."""
+
+    def __init__(self):
+        self.sizes = []
+
+    def append_rows(self, rows):
+        self.sizes.append(len(rows))
+        return f"A{len(self.sizes)}"
+
+
+def test_new_chunk_size_applies_to_the_next_chunk(monkeypatch):
+    store = _RecordingStore()
+    appender = ChunkedAppender(store, initial_size=100, min_size=10, max_size=1000)
+    # Cada envio "demora" o dobro do alvo: o lote seguinte deve ter a metade do tamanho
+    monkeypatch.setattr(appender, "_send", lambda chunk: (2 * appender.target_seconds, store.append_rows(chunk)))
+    rows = [["n", "", f"e{i}@x.com"] for i in range(300)]
+    assert appender.write(rows) == 300
+    assert store.sizes[:3] == [100, 50, 25]
+    assert sum(store.sizes) == 300
+
+
+def test_growing_chunk_is_completed_from_the_remaining_rows(monkeypatch):
+    store = _RecordingStore()
+    appender = ChunkedAppender(store, initial_size=50, min_size=10, max_size=1000)
+    monkeypatch.setattr(appender, "_send", lambda chunk: (appender.target_seconds / 4, store.append_rows(chunk)))
+    sent = []
+    appender.write(([str(i)] for i in range(400)), on_confirm=lambda start, count, _: sent.append((start, count)))
+    assert store.sizes == [50, 100, 200, 50]
+    assert sent == [(0, 50), (50, 100), (150, 200), (350, 50)]
@@ -0,0 +1,12 @@
+import pytest
+
+from src.contacts import ContactBatch
+
+
+def test_position_of_in_a_subset():
+    batch = ContactBatch([f"n{i}" for i in range(10)], [f"e{i}@x.com" for i in range(10)])
+    subset = batch.take([7, 2, 5])
+    assert [subset.position_of(row_id) for row_id in (7, 2, 5)] == [0, 1, 2]
+    assert batch.slice(3, 6).position_of(4) == 1
+    with pytest.raises(KeyError):
+        subset.position_of(3)
@@ -0,0 +1,32 @@
+import numpy as np
+
+from src import membership
+from src.membership import HashedMembership, merge
+
+
+def test_contains_many_matches_a_set():
+    keys = [f"pessoa{i}@exemplo.com" for i in range(1000)]
+    members = HashedMembership(keys[::2])
+    assert members.contains_many(keys).tolist() == [i % 2 == 0 for i in range(1000)]
+    assert len(members) == 500
+    assert set(members) == set(keys[::2])
+
+
+def test_empty_and_non_string_keys_are_never_members():
+    members = HashedMembership(["a@x.com", None, float("nan")])
+    assert len(members) == 1
+    assert members.contains_many([None, "", "a@x.com"]).tolist() == [False, False, True]
+
+
+def test_hash_collisions_never_give_false_positives(monkeypatch):
+    # Todas as chaves com o mesmo hash: a resposta depende só da comparação dos bytes
+    monkeypatch.setattr(membership, "_hash", lambda keys: np.zeros(len(keys), dtype=np.uint64))
+    members = HashedMembership(["a@x.com", "b@x.com", "c@x.com"])
+    assert len(members) == 3
+    assert members.contains_many(["c@x.com", "d@x.com", "b@x.com", "a@x.com"]).tolist() == [True, False, True, True]
+    assert "d@x.com" not in members
+
+    # Chaves repetidas numa união não são acrescentadas de novo, mesmo com hashes iguais
+    merged = merge([members, HashedMembership(["c@x.com", "d@x.com"])])
+    assert len(merged) == 4
+    assert set(merged) == {"a@x.com", "b@x.com", "c@x.com", "d@x.com"}
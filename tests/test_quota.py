@@ -0,0 +1,38 @@
+import pytest
+
+from src.quota import QuotaGovernor, StoreQuotaError, TokenBucket, WRITE
+
+
+def test_throttle_holds_only_for_the_hint_and_keeps_tokens():
+    bucket = TokenBucket(60)
+    bucket.throttle(100.0, 0.2)
+    # O saldo é mantido: a próxima ficha sai assim que a espera pedida termina
+    assert bucket.reserve(100.0) == pytest.approx(0.2)
+    assert bucket.rate >= 0.5
+
+
+def test_rate_recovers_after_the_hold():
+    bucket = TokenBucket(60)
+    for _ in range(3):
+        bucket.throttle(100.0, 0.2)
+    assert bucket.rate == 0.5
+    bucket.recover(100.1)
+    assert bucket.rate == 0.5
+    bucket.recover(100.3)
+    bucket.recover(100.3)
+    assert bucket.rate == 1.0
+
+
+def test_quota_errors_are_retried_with_the_short_hint():
+    waits = []
+    governor = QuotaGovernor({"write_requests_per_minute": 55}, sleep=waits.append)
+    failures = iter([True, True, False])
+
+    def call():
+        if next(failures):
+            raise StoreQuotaError("429", retry_after=0.2)
+        return "ok"
+
+    assert governor.call(WRITE, call) == "ok"
+    # Cada espera fica perto da sugerida pela API (mais a variação), sem esvaziar o balde
+    assert len(waits) == 2 and all(0.2 <= wait < 0.5 for wait in waits)
@@ -0,0 +1,76 @@
+from src import storage
+
+RECIPIENT_COL = 3
+
+
+def _rows(emails):
+    return [["nome", "", email] for email in emails]
+
+
+def _own_append(index, store, url, emails):
+    # O que a sincronização faz: registra a marca da planilha antes e depois das próprias escritas
+    before = store.modified_time()
+    store.append_rows(_rows(emails))
+    index.record_own_writes(url, before, store.modified_time())
+
+
+def test_own_writes_are_read_incrementally(index, store_url):
+    store = storage.open_store("", store_url)
+    store.append_rows(_rows(["a@x.com", "b@x.com"]))
+    keys, details = index.refresh(store, store_url, RECIPIENT_COL)
+    assert set(keys) == {"a@x.com", "b@x.com"}
+
+    _own_append(index, store, store_url, ["c@x.com"])
+    keys, details = index.refresh(store, store_url, RECIPIENT_COL)
+    assert set(keys) == {"a@x.com", "b@x.com", "c@x.com"}
+    assert details == "1 linha(s) nova(s) desde a última análise"
+
+
+def test_edit_by_someone_else_rebuilds_the_index(index, store_url):
+    store = storage.open_store("", store_url)
+    store.append_rows(_rows(["a@x.com", "b@x.com", "c@x.com"]))
+    index.refresh(store, store_url, RECIPIENT_COL)
+
+    # Edição à mão acima da última linha conhecida: a leitura incremental não a veria
+    store.update_cells([(store.title, 2, RECIPIENT_COL, "novo@x.com")])
+    keys, details = index.refresh(store, store_url, RECIPIENT_COL)
+    assert set(keys) == {"novo@x.com", "b@x.com", "c@x.com"}
+    assert "planilha alterada desde a última leitura" in details
+
+
+def test_write_by_someone_else_between_own_writes_rebuilds(index, store_url):
+    store = storage.open_store("", store_url)
+    store.append_rows(_rows(["a@x.com"]))
+    index.refresh(store, store_url, RECIPIENT_COL)
+
+    store.update_cells([(store.title, 2, RECIPIENT_COL, "editado@x.com")])
+    # A marca confiável já não é a anterior às nossas escritas, então ela não é atualizada
+    _own_append(index, store, store_url, ["b@x.com"])
+    keys, details = index.refresh(store, store_url, RECIPIENT_COL)
+    assert set(keys) == {"editado@x.com", "b@x.com"}
+    assert "planilha alterada desde a última leitura" in details
+
+
+def test_cleared_sheet_is_rebuilt(index, store_url):
+    store = storage.open_store("", store_url)
+    store.append_rows(_rows(["a@x.com", "b@x.com"]))
+    index.refresh(store, store_url, RECIPIENT_COL)
+
+    before = store.modified_time()
+    store.clear_data()
+    store.append_rows(_rows(["c@x.com"]))
+    index.record_own_writes(store_url, before, store.modified_time())
+    keys, _ = index.refresh(store, store_url, RECIPIENT_COL)
+    assert set(keys) == {"c@x.com"}
+
+
+def test_each_shard_is_indexed(index, store_url):
+    store = storage.open_store("", store_url, max_rows_per_shard=2)
+    store.append_rows(_rows(["a@x.com", "b@x.com", "c@x.com"]))
+    keys, _ = index.refresh(store, store_url, RECIPIENT_COL)
+    assert set(keys) == {"a@x.com", "b@x.com", "c@x.com"}
+
+    _own_append(index, store, store_url, ["d@x.com", "e@x.com"])
+    keys, details = index.refresh(store, store_url, RECIPIENT_COL)
+    assert len(store.shards()) == 3
+    assert set(keys) == {"a@x.com", "b@x.com", "c@x.com", "d@x.com", "e@x.com"}
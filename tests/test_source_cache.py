@@ -0,0 +1,35 @@
+import os
+
+import pandas as pd
+
+from src.source_cache import SourceCache
+from src.source_reader import SourceSet
+
+
+def _read(path, cache):
+    sources = SourceSet(str(path), ["Nome"], ["Email"], cache=cache)
+    return pd.concat(list(sources.chunks()), ignore_index=True), sources.cache_hits
+
+
+def test_cached_read_matches_fresh_read(tmp_path):
+    source = tmp_path / "contatos.csv"
+    pd.DataFrame({"Nome": ["Ana", None, "7"], "Email": ["a@x.com", "b@x.com", None]}).to_csv(source, index=False)
+    cache = SourceCache(str(tmp_path / "cache"))
+
+    fresh, hits = _read(source, cache)
+    cached, cached_hits = _read(source, cache)
+    assert (hits, cached_hits) == (0, 1)
+    assert cached.equals(fresh)
+    assert fresh.values.tolist() == [["Ana", "a@x.com"], [None, "b@x.com"], ["7", None]]
+
+
+def test_evict_leaves_entries_being_written(tmp_path):
+    cache = SourceCache(str(tmp_path / "cache"), max_megabytes=0)
+    writer = cache.writer("em-andamento", ["First name", "Recipient"])
+    writer.write(pd.DataFrame({"First name": ["a"], "Recipient": ["a@x.com"]}))
+    # Outro processo publica uma entrada e limpa o cache enquanto esta ainda está sendo gravada
+    cache.put("outra", pd.DataFrame({"First name": ["b"], "Recipient": ["b@x.com"]}), 1, "")
+    assert [name for name in os.listdir(cache.cache_dir) if name.endswith(".tmp")]
+    # A publicação não falha por falta do temporário (a entrada pode ser removida em seguida, pelo limite zero)
+    writer.commit(1, "")
+    assert not [name for name in os.listdir(cache.cache_dir) if name.endswith(".tmp")]
@@ -0,0 +1,14 @@
+import pandas as pd
+
+from src.source_reader import SourceSet, list_sheets, read_header
+
+
+def test_uppercase_csv_extension_from_a_folder(tmp_path):
+    pd.DataFrame({"Nome": ["Ana"], "Email": ["a@x.com"]}).to_csv(tmp_path / "CONTATOS.CSV", index=False)
+    path = str(tmp_path / "CONTATOS.CSV")
+    assert list_sheets(path) == [None]
+    assert read_header(path) == ["Nome", "Email"]
+
+    sources = SourceSet(str(tmp_path), ["Nome"], ["Email"])
+    assert sources.files == [path]
+    assert pd.concat(list(sources.chunks())).values.tolist() == [["Ana", "a@x.com"]]
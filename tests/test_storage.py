@@ -0,0 +1,42 @@
+from src import storage
+
+
+def _rows(start, count):
+    return [[f"n{i}", "", f"e{i}@x.com"] for i in range(start, start + count)]
+
+
+def test_append_rolls_over_to_new_shards(store_url):
+    store = storage.open_store("", store_url, max_rows_per_shard=100)
+    first_range = store.append_rows(_rows(0, 250))
+
+    base = store.title
+    assert store.shards() == [base, f"{base} (2)", f"{base} (3)"]
+    assert store.created_shards == [f"{base} (2)", f"{base} (3)"]
+    assert first_range == storage.a1_range(base, "A2:C101")
+    assert store.row_count() == 250
+
+    # Uma nova instância encontra as abas existentes e continua na última, sem criar outra antes do limite
+    reopened = storage.open_store("", store_url, max_rows_per_shard=100)
+    reopened.append_rows(_rows(250, 40))
+    assert reopened.shards() == store.shards()
+    columns = reopened.read_shards([3], {shard: 2 for shard in reopened.shards()})
+    assert [len(values[0]) for values in columns.values()] == [100, 100, 90]
+
+
+def test_clear_data_removes_extra_shards(store_url):
+    store = storage.open_store("", store_url, max_rows_per_shard=10)
+    store.append_rows(_rows(0, 25))
+    store.clear_data()
+
+    reopened = storage.open_store("", store_url, max_rows_per_shard=10)
+    assert reopened.shards() == [reopened.title]
+    assert reopened.row_count() == 0
+    assert reopened.read_header() == storage.DEFAULT_HEADERS
+
+
+def test_row_count_uses_the_recipient_column(store_url):
+    store = storage.open_store("", store_url)
+    # Nome apagado à mão: a linha ainda tem e-mail e continua contando; linhas sem e-mail no final não contam
+    store.append_rows([["a", "", "a@x.com"], ["", "", "b@x.com"], ["c", "", "", "", "", "fora"]])
+    assert store.row_count() == 2
+    assert storage.DestinationStore.row_count(store) == 2
@@ -0,0 +1,142 @@
+import functools
+import sqlite3
+import threading
+from queue import Queue
+
+import numpy as np
+import pytest
+
+from src import logic, storage
+from src.chunked_writer import ChunkedAppender
+from src.contacts import ContactBatch
+from src.sync_journal import SyncJournal
+from tests.conftest import drain, logs
+
+
+def _batch(count):
+    return ContactBatch([f"n{i}" for i in range(count)], [f"e{i}@x.com" for i in range(count)])
+
+
+@pytest.fixture
+def fixed_chunks(monkeypatch):
+    # Lotes de 50 linhas, para que a falha aconteça sempre no mesmo ponto
+    monkeypatch.setattr(logic, "ChunkedAppender",
+                        functools.partial(ChunkedAppender, initial_size=50, min_size=50, max_size=50))
+
+
+@pytest.fixture
+def fail_third_append(monkeypatch):
+    """A terceira escrita no destino falha; ``failure.clear()`` restabelece a conexão."""
+    original = storage.LocalStore._append
+    calls = []
+    failure = threading.Event()
+    failure.set()
+
+    def append(self, shard, rows):
+        calls.append(len(rows))
+        if failure.is_set() and len(calls) == 3:
+            raise RuntimeError("conexão perdida")
+        return original(self, shard, rows)
+
+    monkeypatch.setattr(storage.LocalStore, "_append", append)
+    return failure
+
+
+def _recipients(url):
+    store = storage.open_store("", url)
+    columns = store.read_shards([3], {shard: 2 for shard in store.shards()})
+    return [value for values in columns.values() for value in values[0]]
+
+
+def test_interrupted_sync_resumes_without_duplicates(store_url, fixed_chunks, fail_third_append):
+    batch = _batch(300)
+    queue = Queue()
+    logic.sync_data_thread("", store_url, False, batch, queue)
+    assert any("antes da falha" in message for message in logs(queue, "WARNING"))
+    assert len(_recipients(store_url)) == 100
+
+    fail_third_append.clear()
+    queue = Queue()
+    logic.sync_data_thread("", store_url, False, batch, queue)
+    messages = drain(queue)
+    assert any(kind == "log" and "100 linha(s) já estavam na planilha" in data[0] for kind, data in messages)
+    # O progresso conta só as linhas de fato enviadas na retomada
+    assert [data for kind, data in messages if kind == "progress_update"][-1].endswith("200/200")
+    assert _recipients(store_url) == batch.emails
+
+
+def test_resume_continues_across_shards(store_url, fixed_chunks, fail_third_append):
+    batch = _batch(300)
+    # Com abas de 80 linhas, o segundo lote é dividido entre duas abas e a falha acontece no meio dele
+    sharding = {"enabled": True, "max_rows_per_shard": 80}
+    logic.sync_data_thread("", store_url, False, batch, Queue(), sharding)
+
+    fail_third_append.clear()
+    logic.sync_data_thread("", store_url, False, batch, Queue(), sharding)
+    assert sorted(_recipients(store_url)) == sorted(batch.emails)
+    assert len(storage.open_store("", store_url).shards()) == 4
+
+
+def test_repeating_a_finished_sync_sends_nothing(store_url):
+    batch = _batch(20)
+    logic.sync_data_thread("", store_url, False, batch, Queue())
+    queue = Queue()
+    logic.sync_data_thread("", store_url, False, batch, queue)
+    assert any("SUCESSO! 0 novas linhas" in message for message in logs(queue))
+    assert _recipients(store_url) == batch.emails
+
+
+def _run_concurrently(target, count=16):
+    errors = []
+    barrier = threading.Barrier(count)
+
+    def run():
+        try:
+            barrier.wait()
+            target()
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def test_journal_can_be_opened_concurrently(tmp_path):
+    path = str(tmp_path / "novo.db")
+    assert _run_concurrently(lambda: SyncJournal(path)) == []
+
+
+def test_old_journal_is_migrated_concurrently(tmp_path):
+    path = str(tmp_path / "antigo.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("""CREATE TABLE sincronizacoes (
+            id INTEGER PRIMARY KEY, url TEXT NOT NULL, assinatura TEXT NOT NULL, total INTEGER NOT NULL,
+            confirmadas INTEGER NOT NULL, primeira_linha INTEGER, estado TEXT NOT NULL,
+            iniciada_em REAL NOT NULL, atualizada_em REAL NOT NULL)""")
+    assert _run_concurrently(lambda: SyncJournal(path)) == []
+    with sqlite3.connect(path) as conn:
+        assert "primeira_aba" in [row[1] for row in conn.execute("PRAGMA table_info(sincronizacoes)")]
+
+
+def test_sync_journal_singleton_is_shared_by_threads():
+    journals = []
+    assert _run_concurrently(lambda: journals.append(logic._get_sync_journal())) == []
+    assert len({id(journal) for journal in journals}) == 1
+
+
+def test_multi_sync_reports_rows_actually_sent(tmp_path, fixed_chunks, fail_third_append):
+    batch = _batch(300)
+    first, second = f"sqlite:///{tmp_path / 'a.db'}", f"sqlite:///{tmp_path / 'b.db'}"
+    logic.sync_multi_thread("", [(first, "a", np.arange(300))], False, batch, Queue())
+
+    fail_third_append.clear()
+    queue = Queue()
+    logic.sync_multi_thread("", [(first, "a", np.arange(300)), (second, "b", np.arange(100))], False, batch, queue)
+    dialogs = [data for kind, data in drain(queue) if kind == "dialog"]
+    # 'a' retoma e envia só as 200 que faltavam; 'b' recebe as suas 100
+    assert dialogs == [("info", "Sincronização Concluída", "300 linhas adicionadas em 2 planilhas.")]
+    assert _recipients(first) == batch.emails